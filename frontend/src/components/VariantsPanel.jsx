@@ -7,7 +7,7 @@ import { BgColorPicker } from './BgColorPicker'
 import { ViewToggle } from './ViewToggle'
 import { ExportDropdown } from './ExportDropdown'
 import { PalettePicker } from './PalettePicker'
-import { detectBgColor, downloadBlob, remapToShinyPalette } from '../utils'
+import { detectBgColor, downloadBlob, postDownload, remapToShinyPalette } from '../utils'
 import './VariantsPanel.css'
 
 const API = '/api'
@@ -163,6 +163,11 @@ function ExtractMode({ nColors, outputBg, outputBgMode, setOutputBg, setOutputBg
 
   const hasDimMismatch = dimMismatches.size > 0
 
+  // The artifact was built with the old settings; downloads re-upload until the next extract
+  useEffect(() => {
+    setResults(prev => prev?.artifact_id ? { ...prev, artifact_id: null } : prev)
+  }, [nColors, outputBg, sprites])
+
   // Slot mismatch (computed from extraction results)
   const slotMatches = useMemo(() => {
     if (!results) return {}
@@ -230,13 +235,18 @@ function ExtractMode({ nColors, outputBg, outputBgMode, setOutputBg, setOutputBg
   }
 
   const handleDownloadAll = async () => {
-    const fd = new FormData()
-    sprites.forEach(s => fd.append('files', s.file))
-    fd.append('n_colors', nColors)
-    fd.append('input_bg_colors', JSON.stringify(sprites.map(s => s.inputBg)))
-    fd.append('output_bg_color', outputBg)
-    fd.append('reference_index', refIndex)
-    const res = await fetch(`${API}/items/extract-variants/download`, { method: 'POST', body: fd })
+    const settings = {
+      n_colors:        nColors,
+      input_bg_colors: JSON.stringify(sprites.map(s => s.inputBg)),
+      output_bg_color: outputBg,
+      reference_index: refIndex,
+    }
+    const res = await postDownload(`${API}/items/extract-variants/download`, results?.artifact_id, () => {
+      const fd = new FormData()
+      sprites.forEach(s => fd.append('files', s.file))
+      Object.entries(settings).forEach(([k, v]) => fd.append(k, v))
+      return fd
+    }, settings)
     if (!res.ok) return
     downloadBlob(await res.blob(), 'variant_palettes.zip')
   }
@@ -406,18 +406,24 @@ function ProgressPanel({ status, jobId, onReset }) {
   const ok        = status.results.filter(r => r.status === 'ok').length
   const conflicts = status.results.filter(r => r.status === 'conflict').length
   const errors    = status.results.filter(r => r.status === 'error').length
-  const isDone    = status.status === 'done'
+  // cancelled / interrupted / error jobs stop early but keep the files written so far
+  const isDone    = status.status !== 'running'
+  const isPartial = isDone && status.status !== 'done'
 
   return (
     <div className="progress-panel">
       <div className="progress-header">
         <span className="section-label">
-          {isDone ? 'done' : `processing — ${status.done} / ${status.total}`}
+          {!isDone
+            ? `processing — ${status.done} / ${status.total}`
+            : isPartial
+              ? `${status.status} — ${status.done} / ${status.total}${status.reason ? ` (${status.reason})` : ''}`
+              : 'done'}
         </span>
         {isDone && (
           <div className="progress-header-actions">
             <button className="btn-primary-sm" onClick={() => { window.location.href = `${API}/pipeline/download/${jobId}` }}>
-              <Download size={12}/> download results.zip
+              <Download size={12}/> {isPartial ? 'download partial results.zip' : 'download results.zip'}
             </button>
             <button className="progress-reset-btn" onClick={onReset} title="new job">
               <X size={12}/>
@@ -436,6 +442,11 @@ function ProgressPanel({ status, jobId, onReset }) {
           <span className="progress-stat stat--ok"><Check size={11}/> {ok} ok</span>
           {conflicts > 0 && <span className="progress-stat stat--conflict"><AlertTriangle size={11}/> {conflicts} conflict</span>}
           {errors    > 0 && <span className="progress-stat stat--error"><X size={11}/> {errors} error</span>}
+          {status.deduplicated > 0 && (
+            <span className="progress-stat" title={`${(status.compute_saved_ms / 1000).toFixed(1)}s of compute saved`}>
+              {status.deduplicated} duplicate{status.deduplicated === 1 ? '' : 's'} reused
+            </span>
+          )}
         </div>
       )}
       {isDone && (
@@ -454,6 +465,7 @@ function ProgressPanel({ status, jobId, onReset }) {
               </span>
               <span className="pres-file">{r.file}</span>
               {r.notes && <span className="pres-notes">{r.notes}</span>}
+              {r.deduplicated_from && <span className="pres-notes">= {r.deduplicated_from}</span>}
             </div>
           ))}
         </div>
@@ -593,7 +605,6 @@ export function BatchTab() {
 
   const fileInputRef   = useRef()
   const folderInputRef = useRef()
-  const pollRef        = useRef(null)
   const previewTimer   = useRef(null)
 
   useEffect(() => {
@@ -601,19 +612,31 @@ export function BatchTab() {
     fetch(`${API}/presets`).then(r => r.json()).then(setPresets).catch(() => {})
   }, [])
 
+  // Progress arrives as one SSE event per finished file; EventSource reconnects
+  // with Last-Event-ID, so a dropped connection resumes after the last file seen.
   useEffect(() => {
     if (!jobId || !running) return
-    pollRef.current = setInterval(async () => {
+    let seen = 0
+    const events = new EventSource(`${API}/pipeline/events/${jobId}`)
+    events.addEventListener('file', e => {
+      const { index, done, total, ...result } = JSON.parse(e.data)
+      seen = index + 1
+      setJobStatus(prev => ({ ...prev, done, total, results: [...prev.results.slice(0, index), result] }))
+    })
+    events.addEventListener('end', async e => {
+      events.close()
+      setJobStatus(prev => ({ ...prev, ...JSON.parse(e.data) }))
+      setRunning(false)
+      // dedup totals are only in the status; since= keeps it to what the stream did not send
       try {
-        const s = await fetch(`${API}/pipeline/status/${jobId}`).then(r => r.json())
-        setJobStatus(s)
-        if (s.status === 'done' || s.status === 'error') {
-          setRunning(false)
-          clearInterval(pollRef.current)
-        }
+        const s = await fetch(`${API}/pipeline/status/${jobId}?since=${seen}`).then(r => r.json())
+        setJobStatus(prev => ({ ...prev, ...s, results: [...prev.results, ...s.results] }))
       } catch { /* ignore */ }
-    }, 700)
-    return () => clearInterval(pollRef.current)
+    })
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED) setRunning(false)   // job gone
+    }
+    return () => events.close()
   }, [jobId, running])
 
   // Debounced preview
@@ -643,6 +666,10 @@ export function BatchTab() {
         if (res.ok) {
           const data = await res.json()
           setPreviewData(data.previews)
+        } else if (res.status === 400) {
+          // step list rejected before running — show why instead of an empty strip
+          const { detail } = await res.json().catch(() => ({}))
+          setPreviewData([{ type: 'error', label: 'invalid pipeline', image: null, palette: null, error: detail || 'invalid steps' }])
         } else {
           setPreviewData(null)
         }
@@ -701,6 +728,7 @@ export function BatchTab() {
       const res = await fetch(`${API}/pipeline/run`, { method: 'POST', body: fd })
       if (!res.ok) throw new Error(await res.text())
       const { job_id } = await res.json()
+      setJobStatus({ status: 'running', total: files.length, done: 0, current_file: '', results: [] })
       setJobId(job_id)
     } catch (e) {
       setRunError(e.message)
@@ -7,7 +7,7 @@ import { ResultCard } from '../components/ResultCard'
 import { PaletteStrip } from '../components/PaletteStrip'
 import { PalettePicker } from '../components/PalettePicker'
 import { useFetch } from '../hooks/useFetch'
-import { downloadBlob, detectBgColor } from '../utils'
+import { downloadBlob, detectBgColor, postDownload } from '../utils'
 import { X, RefreshCw, Layers, Info } from 'lucide-react'
 import { BgColorPicker } from '../components/BgColorPicker'
 import { Modal } from '../components/Modal'
@@ -97,6 +97,7 @@ export function ConvertTab() {
   const [file, setFile]         = useState(null)
   const [originalB64, setOriginalB64] = useState(null)
   const [results, setResults]   = useState([])
+  const [artifactId, setArtifactId] = useState(null)
   const [selected, setSelected] = useState(null)
   const [viewMode, setViewMode] = useState('grid')
 
@@ -143,6 +144,7 @@ export function ConvertTab() {
     })
     if (data) {
       setOriginalB64(data.original)
+      setArtifactId(data.artifact_id ?? null)
       const filtered = data.results.filter(r => selectedPalettes.has(r.palette_name))
       setResults(filtered)
       setSelected(filtered.findIndex(r => r.best))
@@ -150,7 +152,7 @@ export function ConvertTab() {
   }
 
   const handleFile = (f) => {
-    setFile(f); setResults([]); setSelected(null); setOriginalB64(null)
+    setFile(f); setResults([]); setSelected(null); setOriginalB64(null); setArtifactId(null)
     const reader = new FileReader()
     reader.onload = e => {
       const b64 = e.target.result.split(',')[1]
@@ -180,11 +182,14 @@ export function ConvertTab() {
   }
 
   const handleDownloadAll = async () => {
-    const fd = new FormData()
-    fd.append('file', file)
-    if (bgColor) fd.append('bg_color', bgColor)
-    fd.append('palette_names', JSON.stringify(results.map(r => r.palette_name)))
-    const res = await fetch(`${API}/convert/download-all`, { method: 'POST', body: fd })
+    const paletteNames = JSON.stringify(results.map(r => r.palette_name))
+    const res = await postDownload(`${API}/convert/download-all`, artifactId, () => {
+      const fd = new FormData()
+      fd.append('file', file)
+      if (bgColor) fd.append('bg_color', bgColor)
+      fd.append('palette_names', paletteNames)
+      return fd
+    }, { palette_names: paletteNames, ...(bgColor ? { bg_color: bgColor } : {}) })
     if (!res.ok) return
     downloadBlob(await res.blob(), `${file.name.replace(/\.[^.]+$/, '')}_all_palettes.zip`)
   }
@@ -8,7 +8,7 @@ import { useFetch } from '../hooks/useFetch'
 import { Info, Download, Save, Check, X, Palette, RefreshCw } from 'lucide-react'
 import { ColorSwatch } from '../components/ColorSwatch'
 import { Modal } from '../components/Modal'
-import { detectBgColor, downloadBlob } from '../utils'
+import { detectBgColor, downloadBlob, postDownload } from '../utils'
 
 const API = '/api'
 const GBA_TRANSPARENT = '#73C5A4'
@@ -131,13 +131,15 @@ function ResultSection({ label, result, preview, outputName, isPreferred, file,
     localStorage.setItem(CS_KEY, colorSpace)
     setDownloading(true)
     try {
-      const fd = new FormData()
-      fd.append('file', file)
-      fd.append('n_colors', nColors)
-      fd.append('bg_color', bgColor)
-      fd.append('color_space', colorSpace)
-      fd.append('name', outputName)
-      const res = await fetch(`${API}/extract/download-zip`, { method: 'POST', body: fd })
+      const res = await postDownload(`${API}/extract/download-zip`, result.artifact_id, () => {
+        const fd = new FormData()
+        fd.append('file', file)
+        fd.append('n_colors', nColors)
+        fd.append('bg_color', bgColor)
+        fd.append('color_space', colorSpace)
+        fd.append('name', outputName)
+        return fd
+      }, { name: outputName })
       if (!res.ok) return
       downloadBlob(await res.blob(), `${outputName}.zip`)
     } finally { setDownloading(false) }
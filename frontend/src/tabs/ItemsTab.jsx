@@ -4,7 +4,7 @@ import { BgColorCell } from '../components/BgColorCell'
 import { BgColorPicker } from '../components/BgColorPicker'
 import { GroupSection } from '../components/GroupSection'
 import { VariantsPanel } from '../components/VariantsPanel'
-import { downloadBlob, detectBgColor } from '../utils'
+import { downloadBlob, detectBgColor, postDownload } from '../utils'
 import { X, Download, Info } from 'lucide-react'
 import { ViewToggle } from '../components/ViewToggle'
 import { Modal } from '../components/Modal'
@@ -211,6 +211,11 @@ export function ItemsTab() {
     if (results) scheduleAutoExtract(results.groups)
   }, [sharedThreshold])
 
+  // The artifact was built with the old settings; downloads re-upload until the next extract
+  useEffect(() => {
+    setResults(prev => prev?.artifact_id ? { ...prev, artifact_id: null } : prev)
+  }, [nColors, outputBg, sharedThreshold, sprites])
+
   // ---------------------------------------------------------------------------
   // File import
   // ---------------------------------------------------------------------------
@@ -266,7 +271,7 @@ export function ItemsTab() {
         return g
       }).filter(g => g.results.length > 0)
       scheduleAutoExtract(newGroups)
-      return { ...prev, groups: newGroups }
+      return { ...prev, groups: newGroups, artifact_id: null }
     })
   }, [scheduleAutoExtract])
 
@@ -280,7 +285,7 @@ export function ItemsTab() {
         return g
       }).filter(g => g.group_id !== fromGroupId)
       scheduleAutoExtract(newGroups)
-      return { ...prev, groups: newGroups }
+      return { ...prev, groups: newGroups, artifact_id: null }
     })
   }, [scheduleAutoExtract])
 
@@ -293,15 +298,20 @@ export function ItemsTab() {
       ? buildAssignments(currentGroups)
       : Object.fromEntries(sprites.map(s => [s.name, 'all']))
 
-    const fd = new FormData()
-    sprites.forEach(s => fd.append('files', s.file))
-    fd.append('n_colors', nColors)
-    fd.append('input_bg_colors', JSON.stringify(sprites.map(s => s.inputBg)))
-    fd.append('output_bg_color', outputBg)
-    fd.append('shared_threshold', sharedThreshold)
-    fd.append('group_assignments', JSON.stringify(assignments))
-    fd.append('group_names', JSON.stringify(groupNames))
-    const res = await fetch(`${API}/items/download-all`, { method: 'POST', body: fd })
+    const settings = {
+      n_colors:          nColors,
+      input_bg_colors:   JSON.stringify(sprites.map(s => s.inputBg)),
+      output_bg_color:   outputBg,
+      shared_threshold:  sharedThreshold,
+      group_assignments: JSON.stringify(assignments),
+      group_names:       JSON.stringify(groupNames),
+    }
+    const res = await postDownload(`${API}/items/download-all`, results?.artifact_id, () => {
+      const fd = new FormData()
+      sprites.forEach(s => fd.append('files', s.file))
+      Object.entries(settings).forEach(([k, v]) => fd.append(k, v))
+      return fd
+    }, settings)
     if (!res.ok) return
     downloadBlob(await res.blob(), 'item_palettes.zip')
   }
@@ -316,23 +326,26 @@ export function ItemsTab() {
 
     setDownloadingGroup(gid)
     try {
-      const fd = new FormData()
-      groupSprites.forEach(s => fd.append('files', s.file))
-      fd.append('n_colors', nColors)
-      fd.append('input_bg_colors', JSON.stringify(groupSprites.map(s => s.inputBg)))
-      fd.append('output_bg_color', outputBg)
-      fd.append('shared_threshold', sharedThreshold)
-      fd.append('group_assignments', JSON.stringify(
-        Object.fromEntries(groupSprites.map(s => [s.name, gid]))
-      ))
-      fd.append('group_name', label)
-      const res = await fetch(`${API}/items/download-group`, { method: 'POST', body: fd })
+      const settings = {
+        n_colors:          nColors,
+        input_bg_colors:   JSON.stringify(groupSprites.map(s => s.inputBg)),
+        output_bg_color:   outputBg,
+        shared_threshold:  sharedThreshold,
+        group_assignments: JSON.stringify(Object.fromEntries(groupSprites.map(s => [s.name, gid]))),
+        group_name:        label,
+      }
+      const res = await postDownload(`${API}/items/download-group`, results?.artifact_id, () => {
+        const fd = new FormData()
+        groupSprites.forEach(s => fd.append('files', s.file))
+        Object.entries(settings).forEach(([k, v]) => fd.append(k, v))
+        return fd
+      }, { ...settings, group_id: gid })
       if (!res.ok) return
       downloadBlob(await res.blob(), `${label}.zip`)
     } finally {
       setDownloadingGroup(null)
     }
-  }, [sprites, nColors, outputBg, sharedThreshold, groupNames])
+  }, [sprites, nColors, outputBg, sharedThreshold, groupNames, results])
 
   // ---------------------------------------------------------------------------
   // Render
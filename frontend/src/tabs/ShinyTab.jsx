@@ -6,7 +6,7 @@ import { PaletteStrip } from '../components/PaletteStrip'
 import { PalettePicker } from '../components/PalettePicker'
 import { Modal } from '../components/Modal'
 import { ExportDropdown } from '../components/ExportDropdown'
-import { remapToShinyPalette, detectBgColor, downloadBlob } from '../utils'
+import { remapToShinyPalette, detectBgColor, downloadBlob, postDownload } from '../utils'
 import { Download, Info } from 'lucide-react'
 
 const API = '/api'
@@ -254,6 +254,11 @@ function ExtractMatchedMode() {
     remapToShinyPalette(normalB64, result.normal.colors, result.shiny.colors).then(setShinyPreview)
   }, [result, normalB64])
 
+  // The artifact was extracted with the old settings; the download re-uploads until the next extract
+  useEffect(() => {
+    setResult(prev => prev?.artifact_id ? { ...prev, artifact_id: null } : prev)
+  }, [nColors, bgColor])
+
   const handleNormalFile = async (f) => {
     setNormalFile(f); setResult(null); setNormalPreview(null); setShinyPreview(null)
     const b64 = await fileToB64(f)
@@ -285,10 +290,12 @@ function ExtractMatchedMode() {
     if (!normalFile || !shinyFile || !outputName.trim()) return
     setDownloading(true)
     try {
-      const fd = new FormData()
-      fd.append('normal_file', normalFile); fd.append('shiny_file', shinyFile)
-      fd.append('n_colors', nColors); fd.append('bg_color', bgColor)
-      const res = await fetch(`${API}/shiny/extract-matched/download`, { method: 'POST', body: fd })
+      const res = await postDownload(`${API}/shiny/extract-matched/download`, result?.artifact_id, () => {
+        const fd = new FormData()
+        fd.append('normal_file', normalFile); fd.append('shiny_file', shinyFile)
+        fd.append('n_colors', nColors); fd.append('bg_color', bgColor)
+        return fd
+      }, { n_colors: nColors, bg_color: bgColor })
       if (!res.ok) return
       downloadBlob(await res.blob(), `${outputName.trim()}.zip`)
     } finally { setDownloading(false) }
@@ -34,6 +34,23 @@ export function downloadBlob(blob, filename) {
   a.click()
 }
 
+/**
+ * POST a download request. With an artifact id from the preview response only
+ * the id (plus `extra` fields) is sent; if the server no longer has the
+ * artifact (404), or it was made with other settings (409), the request is
+ * retried with the full form from buildForm().
+ */
+export async function postDownload(url, artifactId, buildForm, extra = {}) {
+  if (artifactId) {
+    const fd = new FormData()
+    fd.append('artifact_id', artifactId)
+    Object.entries(extra).forEach(([k, v]) => fd.append(k, v))
+    const res = await fetch(url, { method: 'POST', body: fd })
+    if (res.status !== 404 && res.status !== 409) return res   // expired / made with other settings
+  }
+  return fetch(url, { method: 'POST', body: buildForm() })
+}
+
 export function hexToRgb(hex) {
   const h = hex.replace('#', '')
   return [parseInt(h.slice(0,2),16), parseInt(h.slice(2,4),16), parseInt(h.slice(4,6),16)]
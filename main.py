@@ -7,9 +7,12 @@ Usage:
     python main.py          # default port 8080 (auto-finds free port)
     python main.py --port 9000
     python main.py --no-browser
+    python main.py --pipeline-workers 4
+    python main.py --compute-workers 4
 """
 
 import argparse
+import multiprocessing
 import os
 import shutil
 import socket
@@ -82,8 +85,23 @@ def main() -> None:
         "--reload", action="store_true",
         help="Enable auto-reload (dev mode, not available when frozen)",
     )
+    parser.add_argument(
+        "--pipeline-workers", type=int, default=None,
+        help="Worker processes per pipeline job (default: one per CPU, 1 = no pool)",
+    )
+    parser.add_argument(
+        "--compute-workers", type=int, default=None,
+        help="Threads for CPU-heavy request work (default: one per CPU, max 8)",
+    )
     args = parser.parse_args()
 
+    if args.pipeline_workers is not None:
+        # Read by server/api/pipeline.py; also inherited by the --reload subprocess
+        os.environ["PORYPAL_PIPELINE_WORKERS"] = str(max(1, args.pipeline_workers))
+    if args.compute_workers is not None:
+        # Read by server/compute.py
+        os.environ["PORYPAL_COMPUTE_WORKERS"] = str(max(1, args.compute_workers))
+
     reload = args.reload and not getattr(sys, "frozen", False)
 
     # Resolve port
@@ -128,4 +146,5 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()   # pipeline worker processes in frozen builds
     main()
\ No newline at end of file
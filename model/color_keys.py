@@ -0,0 +1,67 @@
+"""
+model/color_keys.py
+
+Packed 24-bit RGB keys (0xRRGGBB as uint32). Pure numpy, no Qt.
+
+Sprites rarely use more than a few dozen distinct colors, so anything that maps
+colors to palette slots can resolve each *unique* color once and gather the
+answer back onto the pixels, instead of doing the work per pixel.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+# Above this many pixels, unique keys are found with 2**24 presence/index
+# tables (linear time, ~80 MB transient) instead of a sort.
+_DENSE_UNIQUE_THRESHOLD = 1 << 20
+
+
+def pack_rgb(rgb: np.ndarray) -> np.ndarray:
+    """Pack (..., 3) uint8 RGB into (...) uint32 keys."""
+    rgb = np.asarray(rgb)
+    return (
+        (rgb[..., 0].astype(np.uint32) << 16)
+        | (rgb[..., 1].astype(np.uint32) << 8)
+        | rgb[..., 2].astype(np.uint32)
+    )
+
+
+def unpack_rgb(keys: np.ndarray) -> np.ndarray:
+    """Unpack (N,) uint32 keys into (N, 3) uint8 RGB."""
+    keys = np.asarray(keys, dtype=np.uint32)
+    return np.stack(
+        [(keys >> 16) & 0xFF, (keys >> 8) & 0xFF, keys & 0xFF], axis=-1
+    ).astype(np.uint8)
+
+
+def unique_keys(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return (unique, inverse) for a flat array of packed keys.
+
+    unique is sorted ascending; unique[inverse] == keys.
+    """
+    keys = np.asarray(keys, dtype=np.uint32).ravel()
+    if keys.size > _DENSE_UNIQUE_THRESHOLD:
+        present = np.zeros(1 << 24, dtype=bool)
+        present[keys] = True
+        uniq = np.flatnonzero(present).astype(np.uint32)
+        position = np.empty(1 << 24, dtype=np.int32)
+        position[uniq] = np.arange(len(uniq), dtype=np.int32)
+        return uniq, position[keys]
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return uniq, inverse.ravel()
+
+
+def unique_rgb(rgb: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Deduplicate (..., 3) uint8 RGB.
+
+    Returns:
+        colors:  (U, 3) uint8 distinct colors, ordered by packed key.
+        inverse: (...)  index into colors for every input pixel.
+    """
+    rgb = np.asarray(rgb)
+    uniq, inverse = unique_keys(pack_rgb(rgb))
+    return unpack_rgb(uniq), inverse.reshape(rgb.shape[:-1])
@@ -0,0 +1,205 @@
+"""
+model/extract_cache.py
+
+Content-addressed cache of PaletteExtractor.extract() results. Pure Python,
+no Qt.
+
+Entries are keyed on the sha256 of the decoded pixels (mode, size, pixel data
+and, for paletted images, the embedded palette) together with every parameter
+that changes the result: n_colors, bg_color, color_space, kmeans_mode and the
+extractor's random_state and mini-batch settings (batch_size, tol,
+max_memory_bytes). The palette name is not part of the key, so the same
+sprite uploaded again under another filename hits.
+
+Two tiers:
+  memory — bounded LRU (maxsize entries)
+  disk   — optional, one small JSON file per entry under disk_dir; survives
+           restarts. Enabled by PORYPAL_EXTRACT_CACHE_DIR (e.g. "extract_cache"
+           in the user-data directory) and pruned, least recently used first,
+           to PORYPAL_EXTRACT_CACHE_ENTRIES files (default 20000).
+
+hits / disk_hits / misses are counted for /api/health.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from model.palette import Color
+
+
+DISK_DIR_ENV = "PORYPAL_EXTRACT_CACHE_DIR"
+DISK_MAXSIZE_ENV = "PORYPAL_EXTRACT_CACHE_ENTRIES"
+DEFAULT_MAXSIZE = 512
+DEFAULT_DISK_MAXSIZE = 20000
+
+
+def pixel_digest(img: Image.Image) -> str:
+    """sha256 over what extraction reads from *img*: mode, size, pixels and palette."""
+    h = hashlib.sha256()
+    h.update(f"{img.mode}:{img.width}x{img.height}:".encode())
+    h.update(img.tobytes())
+    if img.mode == "P":
+        h.update(bytes(img.getpalette() or []))
+        h.update(repr(img.info.get("transparency")).encode())
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """Thread-safe two-tier cache of (colors, method) per extraction key."""
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        disk_dir: str | Path | None = None,
+        disk_maxsize: int = DEFAULT_DISK_MAXSIZE,
+    ):
+        self.maxsize      = maxsize
+        self.disk_dir     = Path(disk_dir) if disk_dir else None
+        self.disk_maxsize = disk_maxsize
+        self.hits      = 0
+        self.disk_hits = 0
+        self.misses    = 0
+        self._entries: OrderedDict[str, tuple[list[Color], str]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Disk writes left before the next prune(); the first write prunes what
+        # earlier runs left behind, then every disk_maxsize // 10 writes.
+        self._writes_to_prune = 1
+        self._pruning = False
+
+    @classmethod
+    def from_env(cls) -> "ExtractionCache":
+        raw = os.environ.get(DISK_MAXSIZE_ENV, "").strip()
+        try:
+            disk_maxsize = int(raw) if raw else DEFAULT_DISK_MAXSIZE
+        except ValueError:
+            logging.warning(f"Ignoring invalid {DISK_MAXSIZE_ENV}={raw!r}")
+            disk_maxsize = DEFAULT_DISK_MAXSIZE
+        return cls(disk_dir=os.environ.get(DISK_DIR_ENV, "").strip() or None, disk_maxsize=disk_maxsize)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(img: Image.Image, **params) -> str:
+        """Digest of the pixels plus the extraction parameters (sorted by name)."""
+        fields = ";".join(f"{k}={params[k]!r}" for k in sorted(params))
+        return hashlib.sha256(f"{pixel_digest(img)};{fields}".encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[list[Color], str] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[0]), entry[1]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return list(entry[0]), entry[1]
+
+    def put(self, key: str, colors: list[Color], method: str) -> None:
+        entry = (list(colors), method)
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def prune(self) -> int:
+        """Drop the least recently used disk entries beyond disk_maxsize. Returns how many."""
+        if self.disk_dir is None or not self.disk_dir.exists():
+            return 0
+        entries = []
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:     # removed meanwhile
+                continue
+        pruned = 0
+        for _mtime, path in sorted(entries)[:max(0, len(entries) - self.disk_maxsize)]:
+            try:
+                path.unlink()
+                pruned += 1
+            except OSError:
+                continue
+        if pruned:
+            logging.info(f"Pruned {pruned} extraction cache entr{'y' if pruned == 1 else 'ies'}")
+        return pruned
+
+    def clear(self) -> None:
+        """Drop the memory tier and reset the counters (the disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries":   len(self._entries),
+                "maxsize":   self.maxsize,
+                "hits":      self.hits,
+                "disk_hits": self.disk_hits,
+                "misses":    self.misses,
+                "disk_dir":  str(self.disk_dir) if self.disk_dir else None,
+                "disk_maxsize": self.disk_maxsize,
+            }
+
+    # ---------- Internals ----------
+
+    def _remember(self, key: str, entry: tuple[list[Color], str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> tuple[list[Color], str] | None:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+        try:
+            raw = json.loads(path.read_text())
+            os.utime(path)   # recency for prune()
+            return [Color.from_hex(h) for h in raw["colors"]], raw["method"]
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable extraction cache entry {path.name}: {e}")
+            return None
+
+    def _write_disk(self, key: str, entry: tuple[list[Color], str]) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"colors": [c.to_hex() for c in entry[0]], "method": entry[1]}))
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.warning(f"Could not write extraction cache entry: {e}")
+            return
+        with self._lock:
+            self._writes_to_prune -= 1
+            if self._writes_to_prune > 0 or self._pruning:
+                return
+            self._writes_to_prune = max(1, self.disk_maxsize // 10)
+            self._pruning = True
+        try:
+            self.prune()
+        finally:
+            with self._lock:
+                self._pruning = False
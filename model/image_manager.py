@@ -9,20 +9,48 @@ The conversion pipeline:
   3. For each palette: remap every pixel to the nearest Color using Oklab distance
      — pixels matching the bg color are mapped directly to slot 0 (transparent)
   4. Save as indexed 4-bit PNG (GBA-compatible)
+
+Conversion engines (ImageManager(engine=...)):
+  'lut'     (default) — match each unique color once via a cached per-palette LUT
+  'unique'            — match each unique color once, no cache
+  'dense'             — match every pixel independently (reference implementation)
+All three produce identical images.
+
+With more than one palette, the non-dense engines score every palette in a
+single stacked pass (colors_used / used_indices for all palettes at once) and
+only render a palette's PIL image when its ConversionResult.image is accessed.
+
+convert(image, palettes, bg_color) is the reentrant entry point: it keeps no
+state between calls, so concurrent requests and worker threads can share it.
+convert_many(images, palettes) does N images × M palettes at once: the unique
+colors of every image are pooled and matched against the stacked palettes in
+one pass. choose_best() applies the best-palette tie-break rules
+(conflict_mode) shared by the pipeline and the batch routes.
+ImageManager wraps it for callers that load once and convert / save several
+times (the desktop flow); server routes call convert() directly.
 """
 
 from __future__ import annotations
 import logging
 from pathlib import Path
+from typing import Callable
 
 import numpy as np
 from PIL import Image
 
+from model.color_keys import unique_keys, pack_rgb, unpack_rgb
+from model.image_source import ImageSource, is_path_source, open_image
 from model.palette import Color, Palette
 from model.palette_extractor import rgb_to_oklab
+from model.palette_lut import (
+    PaletteLUT, colors_to_oklab, get_palette_lut, nearest_slots_stacked, stack_palettes,
+)
 
 
 SUPPORTED_FORMATS = {".png", ".jpg", ".jpeg", ".gif", ".bmp"}
+SUPPORTED_PIL_FORMATS = {"PNG", "JPEG", "GIF", "BMP"}   # same set, by decoder name
+CONVERSION_ENGINES = ("lut", "unique", "dense")
+CONFLICT_MODES = ("auto_first", "flag")
 
 
 def detect_background_color(img: Image.Image) -> Color | None:
@@ -78,122 +106,423 @@ def build_background_mask(img: Image.Image, background_color: Color | None) -> n
     return bg_mask
 
 
+def _indexed_image(index_map: np.ndarray, palette: Palette, size: tuple[int, int]) -> Image.Image:
+    """Build the mode "P" output: slot 0 = palette's transparent color, then its opaque colors."""
+    transparent = palette.transparent_color
+    opaque = palette.opaque_colors or palette.colors
+
+    pal_data = list(transparent.to_tuple()) if transparent else [0, 0, 0]
+    for c in opaque:
+        pal_data += list(c.to_tuple())
+    pal_data += [0] * (768 - len(pal_data))
+    out = Image.frombytes("P", size, index_map.astype(np.uint8).tobytes())
+    out.putpalette(pal_data)
+    out.info["transparency"] = 0
+    return out
+
+
 class ConversionResult:
-    """Holds one palette's conversion of the loaded image."""
+    """
+    Holds one palette's conversion of the loaded image.
 
-    def __init__(self, image: Image.Image, palette: Palette, colors_used: int, used_indices: set = None):
-        self.image = image          # PIL Image (mode "P", indexed)
+    The indexed image may be rendered lazily: pass render instead of image and
+    it is built on first access of .image.
+    """
+
+    def __init__(
+        self,
+        image: Image.Image | None,
+        palette: Palette,
+        colors_used: int,
+        used_indices: set = None,
+        render: Callable[[], Image.Image] | None = None,
+    ):
+        self._image = image         # PIL Image (mode "P", indexed)
+        self._render = render
         self.palette = palette
         self.colors_used = colors_used
         self.used_indices = used_indices or set()  # palette indices actually present in the image
 
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None and self._render is not None:
+            self._image = self._render()
+            self._render = None
+        return self._image
+
+    @property
+    def is_rendered(self) -> bool:
+        return self._image is not None
+
+    def render_image(self) -> Image.Image:
+        """The indexed image, without keeping a lazily rendered one on the result."""
+        if self._image is None and self._render is not None:
+            return self._render()
+        return self._image
+
     @property
     def label(self) -> str:
         return f"{self.palette.name} ({self.colors_used} colors used)"
 
 
+def parse_bg_color(bg_color: str | Color | None) -> Color | None:
+    """'#RRGGBB' (or 'RRGGBB') → Color; Colors and None pass through."""
+    if bg_color is None or isinstance(bg_color, Color):
+        return bg_color
+    h = bg_color.lstrip('#')
+    return Color(int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16))
+
+
+def load_rgba(source: ImageSource) -> Image.Image:
+    """
+    Open *source* as RGBA, rejecting unsupported formats.
+    Paths are checked by suffix, in-memory sources by decoder format.
+    """
+    path = Path(source) if is_path_source(source) else None
+    if path is not None and path.suffix.lower() not in SUPPORTED_FORMATS:
+        raise ValueError(
+            f"Unsupported format '{path.suffix}'. Supported: {', '.join(SUPPORTED_FORMATS)}"
+        )
+
+    img = open_image(source)
+    if path is None and img.format is not None and img.format not in SUPPORTED_PIL_FORMATS:
+        raise ValueError(
+            f"Unsupported format '{img.format}'. Supported: {', '.join(SUPPORTED_PIL_FORMATS)}"
+        )
+    return img if img.mode == "RGBA" else img.convert("RGBA")
+
+
+def convert(
+    image: ImageSource,
+    palettes: list[Palette],
+    bg_color: str | Color | None = None,
+    engine: str = "lut",
+    palettes_lab: np.ndarray | None = None,
+) -> list[ConversionResult]:
+    """
+    Convert *image* against every palette, one ConversionResult per palette.
+
+    bg_color: hex string or Color treated as transparent; detected from the
+              image (alpha first, then most common edge pixel) when omitted.
+    palettes_lab: stack_palettes() of the palettes' opaque colors, for callers
+              converting many images against the same palettes (see score_palettes).
+
+    Pure function of its arguments — the only shared state is the per-palette
+    LUT cache, which is thread-safe — so it is safe to call concurrently.
+    """
+    if engine not in CONVERSION_ENGINES:
+        raise ValueError(f"engine must be one of {CONVERSION_ENGINES}, got {engine!r}")
+    rgba = load_rgba(image)
+    background = parse_bg_color(bg_color)
+    if background is None:
+        background = detect_background_color(rgba)
+
+    if engine != "dense":
+        return score_palettes(rgba, palettes, background, engine, palettes_lab)
+
+    pixels = np.array(rgba)
+    bg_mask = build_background_mask(rgba, background)
+    return [
+        convert_to_palette(rgba, palette, background, engine, pixels, bg_mask)
+        for palette in palettes
+    ]
+
+
+def convert_many(
+    images: list[ImageSource],
+    palettes: list[Palette],
+    bg_colors: list[str | Color | None] | None = None,
+) -> list[list[ConversionResult]]:
+    """
+    Convert N images against M palettes; result[i][j] is image i × palette j.
+
+    The unique colors of all images are pooled and matched against all
+    palettes in one stacked Oklab pass, so each distinct color is matched once
+    per palette no matter how many images share it. Results render lazily,
+    exactly like score_palettes().
+
+    bg_colors: one entry per image (None = detect), or None to detect for all.
+    """
+    if bg_colors is not None and len(bg_colors) != len(images):
+        raise ValueError(f"Expected {len(images)} bg colors, got {len(bg_colors)}")
+    if not images or not palettes:
+        return [[] for _ in images]
+
+    prepared = []
+    for i, image in enumerate(images):
+        rgba = load_rgba(image)
+        background = parse_bg_color(bg_colors[i]) if bg_colors is not None else None
+        if background is None:
+            background = detect_background_color(rgba)
+        pixels = np.array(rgba)
+        keys, inverse = unique_keys(pack_rgb(pixels[:, :, :3]))
+        prepared.append((pixels.shape[:2], build_background_mask(rgba, background), keys, inverse))
+
+    pooled, pooled_inverse = np.unique(
+        np.concatenate([keys for _, _, keys, _ in prepared]), return_inverse=True,
+    )
+    color_lists = [p.opaque_colors or p.colors for p in palettes]
+    slot_table = nearest_slots_stacked(
+        colors_to_oklab(unpack_rgb(pooled)), stack_palettes(color_lists)
+    )                                                                 # (M, pooled)
+
+    results, offset = [], 0
+    for (h, w), bg_mask, keys, inverse in prepared:
+        local = pooled_inverse[offset:offset + len(keys)]
+        offset += len(keys)
+        results.append(_scored_results(slot_table[:, local], inverse, bg_mask, (w, h), palettes))
+    return results
+
+
+def colors_used_matrix(results: list[list[ConversionResult]]) -> np.ndarray:
+    """(N, M) int array of colors_used from convert_many() output."""
+    return np.array([[r.colors_used for r in row] for row in results], dtype=np.int64).reshape(len(results), -1)
+
+
+def choose_best(
+    results: list[ConversionResult],
+    conflict_mode: str = "auto_first",
+) -> tuple[ConversionResult, list[str], str]:
+    """
+    Pick the palette that keeps the most colors. Returns (chosen, tied, notes).
+
+    Ties on colors_used go to the palette name that sorts first; tied lists
+    every tied palette name (sorted, empty without a tie). With
+    conflict_mode='flag' a tie also produces a "conflict: ..." note.
+    """
+    if not results:
+        raise ValueError("Conversion produced no results")
+    if conflict_mode not in CONFLICT_MODES:
+        raise ValueError(f"conflict_mode must be one of {CONFLICT_MODES}, got {conflict_mode!r}")
+
+    max_colors = max(r.colors_used for r in results)
+    best       = sorted((r for r in results if r.colors_used == max_colors), key=lambda r: r.palette.name)
+    tied       = [r.palette.name for r in best] if len(best) > 1 else []
+    notes      = ""
+    if tied and conflict_mode == "flag":
+        notes = f"conflict: {len(best)} palettes tied ({', '.join(tied)})"
+    return best[0], tied, notes
+
+
+def best_indices(results: list[ConversionResult]) -> list[int]:
+    """Indices of results with the highest colors_used count."""
+    if not results:
+        return []
+    max_colors = max(r.colors_used for r in results)
+    return [i for i, r in enumerate(results) if r.colors_used == max_colors]
+
+
+def score_palettes(
+    rgba: Image.Image,
+    palettes: list[Palette],
+    background: Color | None,
+    engine: str = "lut",
+    palettes_lab: np.ndarray | None = None,
+) -> list[ConversionResult]:
+    """
+    Score an RGBA image against every palette in one vectorized pass.
+
+    The image is reduced to its unique colors and converted to Oklab once;
+    all palettes are stacked and matched together. A single palette goes
+    through the cached per-palette LUT instead ('lut' engine), which pays
+    off across images rather than across palettes.
+
+    palettes_lab: the stacked Oklab palettes, if already computed; otherwise
+    they are stacked here on every call.
+
+    Returned results carry colors_used / used_indices immediately; their
+    PIL images are only rendered when .image is accessed.
+    """
+    if not palettes:
+        return []
+
+    pixels = np.array(rgba)
+    h, w = pixels.shape[:2]
+    bg_mask = build_background_mask(rgba, background)
+    keys, inverse = unique_keys(pack_rgb(pixels[:, :, :3]))
+
+    color_lists = [p.opaque_colors or p.colors for p in palettes]
+    if len(palettes) == 1 and engine == "lut":
+        slot_table = get_palette_lut(color_lists[0]).lookup(keys)[np.newaxis, :]
+    else:
+        if palettes_lab is None:
+            palettes_lab = stack_palettes(color_lists)
+        slot_table = nearest_slots_stacked(colors_to_oklab(unpack_rgb(keys)), palettes_lab)   # (P, U)
+    return _scored_results(slot_table, inverse, bg_mask, (w, h), palettes)
+
+
+def _scored_results(
+    slot_table: np.ndarray,
+    inverse: np.ndarray,
+    bg_mask: np.ndarray,
+    size: tuple[int, int],
+    palettes: list[Palette],
+) -> list[ConversionResult]:
+    """Lazily-rendered results from a (P, U) slot table over one image's unique colors."""
+    color_lists = [p.opaque_colors or p.colors for p in palettes]
+
+    # Unique colors that occur on at least one non-background pixel
+    fg_colors = np.unique(inverse[~bg_mask.ravel()])
+    n_slots = max(len(colors) for colors in color_lists)
+    occupancy = np.zeros((len(palettes), n_slots + 1), dtype=bool)
+    if len(fg_colors):
+        rows = np.arange(len(palettes))[:, np.newaxis]
+        occupancy[rows, slot_table[:, fg_colors] + 1] = True
+    occupancy[:, 0] = bool(bg_mask.any())
+
+    results = []
+    for i, palette in enumerate(palettes):
+        used = set(np.flatnonzero(occupancy[i]).tolist())
+        render = _index_renderer(slot_table[i], inverse, bg_mask, size, palette)
+        results.append(ConversionResult(
+            image=None, palette=palette, colors_used=len(used),
+            used_indices=used, render=render,
+        ))
+    return results
+
+
+def _index_renderer(
+    slots: np.ndarray,
+    inverse: np.ndarray,
+    bg_mask: np.ndarray,
+    size: tuple[int, int],
+    palette: Palette,
+) -> Callable[[], Image.Image]:
+    def render() -> Image.Image:
+        index_map = (slots + 1)[inverse].reshape(bg_mask.shape)
+        index_map[bg_mask] = 0
+        return _indexed_image(index_map, palette, size)
+    return render
+
+
+def convert_to_palette(
+    img: Image.Image,
+    palette: Palette,
+    background: Color | None,
+    engine: str = "lut",
+    pixels: np.ndarray | None = None,
+    bg_mask: np.ndarray | None = None,
+    pixel_keys: tuple[np.ndarray, np.ndarray] | None = None,
+) -> ConversionResult:
+    """
+    Remap every pixel of an RGBA image to the nearest palette color in Oklab space.
+    Pixels matching *background* → slot 0 (transparent), skipped from Oklab matching.
+
+    pixels / bg_mask / pixel_keys may be passed in when converting the same
+    image against several palettes.
+    """
+    if pixels is None:
+        pixels = np.array(img)  # (H, W, 4)
+    h, w = pixels.shape[:2]
+
+    opaque = palette.opaque_colors or palette.colors
+
+    if bg_mask is None:
+        bg_mask = build_background_mask(img, background)
+
+    if engine == "dense":
+        nearest_idx = _nearest_dense(pixels[:, :, :3], opaque)
+    else:
+        if pixel_keys is None:
+            pixel_keys = unique_keys(pack_rgb(pixels[:, :, :3]))
+        keys, inverse = pixel_keys
+        if engine == "lut":
+            slots = get_palette_lut(opaque).lookup(keys)
+        else:
+            slots = PaletteLUT(opaque).nearest(unpack_rgb(keys))
+        nearest_idx = slots[inverse].reshape(h, w)
+
+    # Index 0 = transparent slot, opaque colors start at 1
+    index_map = nearest_idx + 1
+    index_map[bg_mask] = 0  # bg pixels → slot 0, no Oklab matching
+
+    used = set(np.unique(index_map).tolist())
+    out = _indexed_image(index_map, palette, (w, h))
+
+    return ConversionResult(image=out, palette=palette, colors_used=len(used), used_indices=used)
+
+
+def _nearest_dense(rgb: np.ndarray, opaque: list[Color]) -> np.ndarray:
+    """Reference per-pixel matcher: builds the full (H*W, N, 3) difference tensor."""
+    h, w = rgb.shape[:2]
+
+    # Convert palette opaque colors to Oklab
+    palette_rgb = np.array([c.to_tuple() for c in opaque], dtype=np.uint8)  # (N, 3)
+    palette_lab = rgb_to_oklab(palette_rgb)                                   # (N, 3)
+
+    # Convert all image pixels to Oklab
+    flat_lab = rgb_to_oklab(rgb.reshape(-1, 3).astype(np.uint8))  # (H*W, 3)
+
+    # Nearest neighbor in Oklab space
+    diff = flat_lab[:, np.newaxis, :] - palette_lab[np.newaxis, :, :]  # (H*W, N, 3)
+    dist_sq = (diff ** 2).sum(axis=2)                                   # (H*W, N)
+    return dist_sq.argmin(axis=1).reshape(h, w)                        # (H, W)
+
+
 class ImageManager:
-    """Handles image loading, conversion, and saving. No Qt dependency."""
+    """
+    Stateful wrapper around convert(): remembers the loaded image, its
+    transparent color and the last results. Not safe to share between
+    concurrent callers — use convert() for that.
+    """
 
-    def __init__(self):
+    def __init__(self, engine: str = "lut"):
+        if engine not in CONVERSION_ENGINES:
+            raise ValueError(f"engine must be one of {CONVERSION_ENGINES}, got {engine!r}")
+        self.engine = engine
         self._current_image_path: Path | None = None
         self._original_rgba: Image.Image | None = None
         self._transparent_color: Color | None = None
-        self._conversion_cache: dict[tuple, Color] = {}
         self.results: list[ConversionResult] = []
 
     # ---------- Load ----------
 
-    def load_image(self, image_path: str | Path, bg_color: str | None = None) -> Image.Image:
+    def load_image(self, image_path: ImageSource, bg_color: str | None = None) -> Image.Image:
         """
         Load image and return PIL RGBA.
+        image_path: a file path, or encoded bytes / a PIL image / a uint8 pixel array.
+                    In-memory sources are checked by decoder format instead of suffix
+                    and leave current_image_path unset.
         bg_color: optional hex string (e.g. '#73C5A4') to override transparent color detection.
         """
-        path = Path(image_path)
-        if path.suffix.lower() not in SUPPORTED_FORMATS:
-            raise ValueError(
-                f"Unsupported format '{path.suffix}'. Supported: {', '.join(SUPPORTED_FORMATS)}"
-            )
-
-        img = Image.open(path).convert("RGBA")
+        path = Path(image_path) if is_path_source(image_path) else None
+        img = load_rgba(image_path)
         self._current_image_path = path
         self._original_rgba = img
-        self._conversion_cache.clear()
 
         if bg_color:
-            h = bg_color.lstrip('#')
-            self._transparent_color = Color(int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16))
+            self._transparent_color = parse_bg_color(bg_color)
             logging.debug(f"Transparent color (explicit): {bg_color}")
         else:
-            self._transparent_color = self._detect_transparent_color(img)
+            self._transparent_color = detect_background_color(img)
 
-        logging.debug(f"Loaded {path.name} ({img.width}×{img.height})")
+        logging.debug(f"Loaded {path.name if path else 'image'} ({img.width}×{img.height})")
         return img
 
-    def _detect_transparent_color(self, img: Image.Image) -> Color | None:
-        """
-        Find the background/transparent color.
-        Priority: alpha channel first, then most common edge pixel.
-        """
-        return detect_background_color(img)
-
     # ---------- Convert ----------
 
     def process_all_palettes(self, palettes: list[Palette]) -> list[ConversionResult]:
         """Convert the loaded image against every palette."""
         if self._original_rgba is None:
             raise ValueError("No image loaded — call load_image() first")
-
-        self.results = [
-            self._convert_to_palette(self._original_rgba, palette)
-            for palette in palettes
-        ]
+        self.results = convert(self._original_rgba, palettes, self._transparent_color, self.engine)
         return self.results
 
-    def _convert_to_palette(self, img: Image.Image, palette: Palette) -> ConversionResult:
-        """
-        Remap every pixel to the nearest palette color in Oklab space.
-        Pixels matching the image's bg color → slot 0 (transparent), skipped from Oklab matching.
-        """
-        pixels = np.array(img)  # (H, W, 4)
-        h, w = pixels.shape[:2]
-
-        transparent = palette.transparent_color
-        opaque = palette.opaque_colors or palette.colors
-
-        rgb = pixels[:, :, :3]   # (H, W, 3)
-
-        bg_mask = build_background_mask(img, self._transparent_color)
-
-        # Convert palette opaque colors to Oklab
-        palette_rgb = np.array([c.to_tuple() for c in opaque], dtype=np.uint8)  # (N, 3)
-        palette_lab = rgb_to_oklab(palette_rgb)                                   # (N, 3)
-
-        # Convert all image pixels to Oklab
-        flat_lab = rgb_to_oklab(rgb.reshape(-1, 3).astype(np.uint8))  # (H*W, 3)
-
-        # Nearest neighbor in Oklab space
-        diff = flat_lab[:, np.newaxis, :] - palette_lab[np.newaxis, :, :]  # (H*W, N, 3)
-        dist_sq = (diff ** 2).sum(axis=2)                                   # (H*W, N)
-        nearest_idx = dist_sq.argmin(axis=1).reshape(h, w)                 # (H, W)
-
-        # Index 0 = transparent slot, opaque colors start at 1
-        index_map = nearest_idx + 1
-        index_map[bg_mask] = 0  # bg pixels → slot 0, no Oklab matching
-
-        used = set(np.unique(index_map).tolist())
-
-        # Build PIL indexed image
-        out = Image.new("P", (w, h))
-        pal_data = list(transparent.to_tuple()) if transparent else [0, 0, 0]
-        for c in opaque:
-            pal_data += list(c.to_tuple())
-        pal_data += [0] * (768 - len(pal_data))
-        out.putpalette(pal_data)
-        out.putdata(index_map.flatten().tolist())
-        out.info["transparency"] = 0
-
-        return ConversionResult(image=out, palette=palette, colors_used=len(used), used_indices=used)
+    def score_palettes(self, palettes: list[Palette]) -> list[ConversionResult]:
+        """Score the loaded image against every palette; see score_palettes()."""
+        if self._original_rgba is None:
+            raise ValueError("No image loaded — call load_image() first")
+        return score_palettes(self._original_rgba, palettes, self._transparent_color, self.engine)
+
+    @staticmethod
+    def score_matrix(
+        images: list[ImageSource],
+        palettes: list[Palette],
+        bg_colors: list[str | Color | None] | None = None,
+    ) -> tuple[np.ndarray, list[list[ConversionResult]]]:
+        """(N, M) colors_used matrix plus the results; see convert_many(). Leaves the loaded image alone."""
+        results = convert_many(images, palettes, bg_colors)
+        return colors_used_matrix(results), results
 
     # ---------- Save ----------
 
@@ -213,7 +542,7 @@ class ImageManager:
     def auto_output_path(self, result: ConversionResult) -> Path:
         """Generate <original_stem>_<palette_stem>.png next to the source image."""
         if not self._current_image_path:
-            raise ValueError("No image loaded")
+            raise ValueError("No image loaded from disk")
         stem = self._current_image_path.stem
         pal_stem = Path(result.palette.name).stem
         return self._current_image_path.parent / f"{stem}_{pal_stem}.png"
@@ -227,10 +556,7 @@ class ImageManager:
 
     def get_best_indices(self) -> list[int]:
         """Indices of results with the highest colors_used count."""
-        if not self.results:
-            return []
-        max_colors = max(r.colors_used for r in self.results)
-        return [i for i, r in enumerate(self.results) if r.colors_used == max_colors]
+        return best_indices(self.results)
 
     @property
     def current_image_path(self) -> Path | None:
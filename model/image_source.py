@@ -0,0 +1,66 @@
+"""
+model/image_source.py
+
+Open images from wherever the caller already has them. Pure Pillow — no Qt.
+
+PaletteExtractor.extract() and ImageManager.load_image() accept any of:
+  str / Path          — a file on disk (the original behaviour)
+  bytes / bytearray   — encoded image data, e.g. an upload body
+  PIL.Image.Image     — an already-decoded image
+  np.ndarray          — (H, W), (H, W, 3) or (H, W, 4) uint8 pixels
+
+so server routes can hand over what they received instead of round-tripping
+it through a temporary file.
+"""
+
+from __future__ import annotations
+import io
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+
+ImageSource = Union[str, Path, bytes, bytearray, memoryview, Image.Image, np.ndarray]
+
+
+def is_path_source(source: ImageSource) -> bool:
+    return isinstance(source, (str, Path))
+
+
+def open_image(source: ImageSource) -> Image.Image:
+    """
+    Return a PIL image for *source* without converting its mode, so paletted
+    images keep their embedded palette.
+
+    Raises FileNotFoundError for a missing path and ValueError for anything
+    that is not an image source.
+    """
+    if is_path_source(source):
+        path = Path(source)
+        if not path.exists():
+            raise FileNotFoundError(f"Image not found: {path}")
+        return Image.open(path)
+
+    if isinstance(source, Image.Image):
+        return source
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(bytes(source)))
+
+    if isinstance(source, np.ndarray):
+        if source.dtype != np.uint8 or source.ndim not in (2, 3):
+            raise ValueError(
+                f"Pixel arrays must be (H, W[, C]) uint8, got {source.dtype} {source.shape}"
+            )
+        if source.ndim == 3 and source.shape[2] not in (3, 4):
+            raise ValueError(f"Pixel arrays must have 3 or 4 channels, got {source.shape[2]}")
+        return Image.fromarray(np.ascontiguousarray(source))
+
+    raise ValueError(f"Unsupported image source: {type(source).__name__}")
+
+
+def source_stem(source: ImageSource, default: str = "image") -> str:
+    """Filename stem for path sources, *default* for in-memory ones."""
+    return Path(source).stem if is_path_source(source) else default
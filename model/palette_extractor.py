@@ -8,10 +8,21 @@ Supports two color spaces for clustering:
 
 Oklab matrix coefficients are loaded from oklab_weights.json (same directory).
 
+sRGB → Oklab avoids repeated work in two ways:
+  - a 256-entry linear-light table replaces the per-pixel gamma decode
+  - rgb_to_oklab_unique() converts only the distinct colors of a sprite and
+    gathers the result back onto its pixels
+
 Usage:
     extractor = PaletteExtractor()
     palette = extractor.extract("my_sprite.png", n_colors=15, bg_color="#73C5A4")
     palette.to_jasc_pal(Path("palettes/my_sprite.pal"))
+
+    # uploads and decoded images work too (see model/image_source.py)
+    palette, method = extractor.extract(upload_bytes, name="my_sprite")
+
+    # repeat extractions of the same pixels and parameters from a cache
+    extractor = PaletteExtractor(cache=ExtractionCache())
 """
 
 from __future__ import annotations
@@ -22,6 +33,9 @@ from pathlib import Path
 import numpy as np
 from PIL import Image
 
+from model.color_keys import pack_rgb, unique_keys, unique_rgb, unpack_rgb
+from model.extract_cache import ExtractionCache
+from model.image_source import ImageSource, open_image, source_stem
 from model.palette import Color, Palette
 
 
@@ -57,6 +71,11 @@ def _linear_to_srgb(c: np.ndarray) -> np.ndarray:
     return np.where(c <= 0.0031308, 12.92 * c, 1.055 * c ** (1.0 / 2.4) - 0.055)
 
 
+# Linear-light value for every 8-bit channel value. Same float32 maths as
+# _srgb_to_linear, so a table gather is bit-identical to the per-pixel decode.
+_SRGB_TO_LINEAR_TABLE = _srgb_to_linear(np.arange(256, dtype=np.float32) / 255.0)
+
+
 # ---------------------------------------------------------------------------
 # Oklab conversion (vectorized numpy, weights from JSON)
 # ---------------------------------------------------------------------------
@@ -66,13 +85,44 @@ def rgb_to_oklab(pixels: np.ndarray) -> np.ndarray:
     Convert (N, 3) uint8 RGB → (N, 3) float32 Oklab.
     L in ~[0, 1], a/b in ~[-0.5, 0.5].
     """
-    lin = _srgb_to_linear(pixels.astype(np.float32) / 255.0)
+    if len(pixels) == 1:
+        # BLAS uses a matrix-vector path for a single row whose last bit can
+        # differ from the batched result; keep every row on the batched path.
+        return rgb_to_oklab(np.repeat(pixels, 2, axis=0))[:1]
+
+    if pixels.dtype == np.uint8:
+        lin = _SRGB_TO_LINEAR_TABLE[pixels]
+    else:
+        lin = _srgb_to_linear(pixels.astype(np.float32) / 255.0)
 
     lms = np.cbrt(np.maximum(lin @ _W["rgb_to_lms"].T, 0))
 
     return (lms @ _W["lms_to_oklab"].T).astype(np.float32)
 
 
+# Reducing to unique colors only beats the table path on large images whose
+# pixels repeat heavily (tilesheets); a strided sample decides which applies.
+UNIQUE_REDUCE_MIN_PIXELS = 1 << 20
+UNIQUE_REDUCE_SAMPLE = 4096
+
+
+def rgb_to_oklab_unique(pixels: np.ndarray) -> np.ndarray:
+    """
+    rgb_to_oklab on the distinct colors only, gathered back onto the pixels.
+
+    Same contract and bits as rgb_to_oklab. Falls back to it when the image is
+    small or a sample shows mostly distinct colors, so it is never the slower path.
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if len(pixels) <= UNIQUE_REDUCE_MIN_PIXELS:
+        return rgb_to_oklab(pixels)
+    sample = pack_rgb(pixels[:: max(1, len(pixels) // UNIQUE_REDUCE_SAMPLE)])
+    if len(np.unique(sample)) * 8 > len(sample):
+        return rgb_to_oklab(pixels)
+    keys, inverse = unique_keys(pack_rgb(pixels))
+    return np.take(rgb_to_oklab(unpack_rgb(keys)), inverse, axis=0)
+
+
 def oklab_to_rgb(lab: np.ndarray) -> np.ndarray:
     """
     Convert (N, 3) float32 Oklab → (N, 3) uint8 RGB.
@@ -162,6 +212,219 @@ def _kmeans(
     return best_centers, best_labels  # type: ignore[return-value]
 
 
+def _kmeans_histogram(
+    colors: np.ndarray,
+    counts: np.ndarray,
+    inverse: np.ndarray,
+    n_clusters: int,
+    n_init: int = 3,
+    max_iter: int = 100,
+    random_state: int = 42,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted k-means over the unique colors of a sprite.
+
+    Equivalent to _kmeans(colors[inverse], ...) but every distance is computed
+    per unique color, so the work scales with U (distinct colors) instead of N
+    (pixels).
+
+    k-means++ seeding replays _kmeans exactly: the same RNG calls are made with
+    the same per-pixel probabilities (gathered from the per-color distances via
+    inverse), so identical inputs and seeds pick identical seeds. Lloyd
+    assignments are identical too. Centroids are count-weighted means taken in
+    float64, whereas _kmeans averages member pixels in float32, so a centroid
+    may differ from _kmeans in its last float32 bits. After rounding back to
+    8-bit RGB the palettes match in practice; an exact inertia tie between
+    restarts could in principle resolve to a different restart.
+
+    Args:
+        colors:       (U, D) float32 unique data points.
+        counts:       (U,)   number of pixels per unique point.
+        inverse:      (N,)   index into colors for every original pixel.
+        n_clusters:   Number of clusters k.
+        n_init:       Number of independent restarts; best inertia wins.
+        max_iter:     Maximum iterations per run.
+        random_state: Seed for reproducibility.
+
+    Returns:
+        centers: (k, D) float32 cluster centroids.
+        labels:  (U,)  int32  cluster index per unique color.
+    """
+    rng = np.random.default_rng(random_state)
+    N = len(inverse)
+    weights = counts.astype(np.float64)
+
+    best_inertia = np.inf
+    best_centers: np.ndarray | None = None
+    best_labels:  np.ndarray | None = None
+
+    for _ in range(n_init):
+        # --- k-means++ init (per-pixel draws, per-color distances) ---
+        chosen = [int(inverse[int(rng.integers(N))])]
+
+        for _ in range(1, n_clusters):
+            dists_u = np.min(
+                np.sum((colors[:, None, :] - colors[chosen][None, :, :]) ** 2, axis=2),
+                axis=1,
+            )
+            dists = dists_u[inverse]
+            probs = dists / dists.sum()
+            chosen.append(int(inverse[int(rng.choice(N, p=probs))]))
+
+        centers = colors[chosen].copy()
+
+        # --- Lloyd iterations ---
+        labels = np.full(len(colors), -1, dtype=np.int32)
+        for _ in range(max_iter):
+            dists_sq = np.sum(
+                (colors[:, None, :] - centers[None, :, :]) ** 2, axis=2
+            )
+            new_labels = np.argmin(dists_sq, axis=1).astype(np.int32)
+
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+            # Weighted update step
+            totals = np.bincount(labels, weights=weights, minlength=n_clusters)
+            for d in range(colors.shape[1]):
+                sums = np.bincount(labels, weights=weights * colors[:, d], minlength=n_clusters)
+                filled = totals > 0
+                centers[filled, d] = (sums[filled] / totals[filled]).astype(np.float32)
+            # Empty cluster: leave centroid unchanged (rare with k-means++)
+
+        inertia = float(np.sum(weights * np.sum((colors - centers[labels]) ** 2, axis=1)))
+        if inertia < best_inertia:
+            best_inertia = inertia
+            best_centers = centers.copy()
+            best_labels  = labels.copy()
+
+    return best_centers, best_labels  # type: ignore[return-value]
+
+
+def _assign_chunked(
+    points: np.ndarray,
+    centers: np.ndarray,
+    max_bytes: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Nearest center per point, in row chunks so the (rows, k, D) float32 difference
+    tensor never exceeds max_bytes. Returns (labels int32, squared distance).
+    """
+    k, d = centers.shape
+    chunk = max(1, max_bytes // max(1, k * d * 4))
+    labels = np.empty(len(points), dtype=np.int32)
+    dist_sq = np.empty(len(points), dtype=np.float32)
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        block_dists = np.sum((block[:, None, :] - centers[None, :, :]) ** 2, axis=2)
+        block_labels = np.argmin(block_dists, axis=1)
+        labels[start:start + chunk] = block_labels
+        dist_sq[start:start + chunk] = block_dists[np.arange(len(block)), block_labels]
+    return labels, dist_sq
+
+
+def _kmeans_minibatch(
+    points: np.ndarray,
+    weights: np.ndarray,
+    n_clusters: int,
+    batch_size: int = 1024,
+    n_init: int = 3,
+    max_iter: int = 100,
+    tol: float = 1e-4,
+    max_bytes: int = 64 << 20,
+    random_state: int = 42,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Mini-batch k-means (Sculley 2010) over weighted points, for sheets too large
+    for full Lloyd iterations.
+
+    Each iteration draws batch_size points (probability ∝ weight), assigns them
+    to the nearest center and moves every center towards its batch mean with a
+    per-center learning rate of batch weight / total weight seen. Stops once the
+    largest squared centroid shift falls below tol × the data variance, or
+    after max_iter batches.
+
+    No temporary array exceeds max_bytes: seeding runs on a weighted sample and
+    all full-data assignments are chunked.
+
+    Args:
+        points:       (U, D) float32 data points (usually unique colors).
+        weights:      (U,)   pixel count per point.
+        n_clusters:   Number of clusters k.
+        batch_size:   Points drawn per iteration.
+        n_init:       Independent restarts; lowest full-data inertia wins.
+        max_iter:     Maximum mini-batch iterations per run.
+        tol:          Convergence threshold on centroid shift, relative to variance.
+        max_bytes:    Ceiling for any (rows, k, D) distance tensor.
+        random_state: Seed for reproducibility.
+
+    Returns:
+        centers: (k, D) float32 cluster centroids.
+        labels:  (U,)  int32  cluster index per point.
+    """
+    rng = np.random.default_rng(random_state)
+    U = len(points)
+    w = weights.astype(np.float64)
+    p = w / w.sum()
+
+    mean = np.average(points, axis=0, weights=w)
+    variance = float(np.average(np.sum((points - mean) ** 2, axis=1), weights=w))
+    threshold = tol * variance
+
+    # Seeding sample: big enough to represent the data, small enough to stay
+    # under the memory ceiling during k-means++
+    seed_rows = max(n_clusters, min(U, 10 * batch_size, max_bytes // max(1, n_clusters * points.shape[1] * 4)))
+
+    best_inertia = np.inf
+    best_centers: np.ndarray | None = None
+
+    for _ in range(n_init):
+        # --- k-means++ init on a weighted sample ---
+        sample = points[rng.choice(U, size=seed_rows, p=p)] if seed_rows < U else points
+        sample_w = np.ones(len(sample)) if seed_rows < U else w
+        chosen = [int(rng.choice(len(sample), p=sample_w / sample_w.sum()))]
+        closest = np.sum((sample - sample[chosen[0]]) ** 2, axis=1)
+        for _ in range(1, n_clusters):
+            scores = closest * sample_w
+            if scores.sum() <= 0:
+                break
+            nxt = int(rng.choice(len(sample), p=scores / scores.sum()))
+            chosen.append(nxt)
+            closest = np.minimum(closest, np.sum((sample - sample[nxt]) ** 2, axis=1))
+        # Fewer distinct points than clusters in the sample: repeat seeds
+        centers = sample[np.resize(chosen, n_clusters)].astype(np.float32)
+
+        # --- Mini-batch updates ---
+        seen = np.zeros(n_clusters, dtype=np.float64)
+        for _ in range(max_iter):
+            batch = rng.choice(U, size=min(batch_size, U), p=p)
+            batch_pts = points[batch]
+            batch_labels, _ = _assign_chunked(batch_pts, centers, max_bytes)
+
+            old = centers.copy()
+            counts = np.bincount(batch_labels, minlength=n_clusters).astype(np.float64)
+            filled = counts > 0
+            seen += counts
+            for d in range(points.shape[1]):
+                sums = np.bincount(batch_labels, weights=batch_pts[:, d], minlength=n_clusters)
+                eta = counts[filled] / seen[filled]
+                batch_mean = sums[filled] / counts[filled]
+                centers[filled, d] = ((1 - eta) * centers[filled, d] + eta * batch_mean).astype(np.float32)
+
+            if float(np.max(np.sum((centers - old) ** 2, axis=1))) <= threshold:
+                break
+
+        _, dist_sq = _assign_chunked(points, centers, max_bytes)
+        inertia = float(np.sum(w * dist_sq))
+        if inertia < best_inertia:
+            best_inertia = inertia
+            best_centers = centers.copy()
+
+    labels, _ = _assign_chunked(points, best_centers, max_bytes)  # type: ignore[arg-type]
+    return best_centers, labels  # type: ignore[return-value]
+
+
 # ---------------------------------------------------------------------------
 # Extractor
 # ---------------------------------------------------------------------------
@@ -177,59 +440,128 @@ class PaletteExtractor:
     color_space controls the space in which distance is measured:
       'oklab'  — perceptually uniform (default, recommended)
       'rgb'    — raw sRGB euclidean distance
+
+    kmeans_mode controls how pixels are clustered:
+      'histogram' — weighted k-means over unique colors (default, see _kmeans_histogram)
+      'pixels'    — k-means over every opaque pixel
+      'minibatch' — mini-batch k-means over unique colors, for large sheets
+                    (see _kmeans_minibatch; batch_size / tol / max_memory_bytes)
+
+    cache: optional ExtractionCache (model/extract_cache.py). Results are then
+    reused for identical pixels and parameters, whatever the source or name.
     """
 
     VALID_COLOR_SPACES = ("oklab", "rgb")
+    VALID_KMEANS_MODES = ("histogram", "pixels", "minibatch")
 
-    def __init__(self, random_state: int = 42):
+    def __init__(
+        self,
+        random_state: int = 42,
+        kmeans_mode: str = "histogram",
+        batch_size: int = 1024,
+        tol: float = 1e-4,
+        max_memory_bytes: int = 64 << 20,
+        cache: ExtractionCache | None = None,
+    ):
+        if kmeans_mode not in self.VALID_KMEANS_MODES:
+            raise ValueError(
+                f"kmeans_mode must be one of {self.VALID_KMEANS_MODES}, got {kmeans_mode!r}"
+            )
         self.random_state = random_state
+        self.kmeans_mode = kmeans_mode
+        self.batch_size = batch_size
+        self.tol = tol
+        self.max_memory_bytes = max_memory_bytes
+        self.cache = cache
 
     def extract(
         self,
-        image_path: str | Path,
+        image_path: ImageSource,
         n_colors: int = 15,
         bg_color: str = "#73C5A4",
         color_space: str = "oklab",
         name: str | None = None,
+        kmeans_mode: str | None = None,
     ) -> tuple[Palette, str]:
         """
         Extract a palette from image_path.
 
         Args:
-            image_path:   Path to any image Pillow can open.
+            image_path:   Path to any image Pillow can open, or the image itself as
+                          encoded bytes, a PIL image or a uint8 pixel array.
             n_colors:     Number of sprite colors to cluster (NOT including transparent).
                           Final palette size = n_colors + 1. Max 15 for GBA (16 total).
             bg_color:     Hex string for the transparent color forced into slot 0.
             color_space:  'oklab' (default) or 'rgb'.
-            name:         Palette name. Defaults to the image filename stem.
+            name:         Palette name. Defaults to the image filename stem
+                          ('image' for in-memory sources).
+            kmeans_mode:  'histogram', 'pixels' or 'minibatch'. Defaults to the extractor's kmeans_mode.
 
         Returns:
             A tuple of (Palette, method) where method is 'embedded' or 'kmeans'.
             Palette has (n_colors + 1) entries, index 0 = bg_color.
         """
-        path = Path(image_path)
-        if not path.exists():
-            raise FileNotFoundError(f"Image not found: {path}")
+        name = name or source_stem(image_path)
+        img  = open_image(image_path)
 
         if color_space not in self.VALID_COLOR_SPACES:
             raise ValueError(
                 f"color_space must be one of {self.VALID_COLOR_SPACES}, got {color_space!r}"
             )
 
+        kmeans_mode = kmeans_mode or self.kmeans_mode
+        if kmeans_mode not in self.VALID_KMEANS_MODES:
+            raise ValueError(
+                f"kmeans_mode must be one of {self.VALID_KMEANS_MODES}, got {kmeans_mode!r}"
+            )
+
         max_sprite_colors = Palette.MAX_COLORS - 1  # 15
         if n_colors < 1 or n_colors > max_sprite_colors:
             raise ValueError(f"n_colors must be 1–{max_sprite_colors}, got {n_colors}")
 
         transparent_color = self._parse_hex(bg_color)
-        transparent_rgb   = np.array(
+
+        if self.cache is None:
+            return self._extract_image(img, n_colors, transparent_color, color_space, name, kmeans_mode)
+
+        params = {
+            "n_colors":     n_colors,
+            "bg_color":     transparent_color.to_hex(),
+            "color_space":  color_space,
+            "kmeans_mode":  kmeans_mode,
+            "random_state": self.random_state,
+        }
+        if kmeans_mode == "minibatch":
+            params.update(batch_size=self.batch_size, tol=self.tol, max_memory_bytes=self.max_memory_bytes)
+        key    = self.cache.make_key(img, **params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            colors, method = cached
+            logging.info(f"Extracted {len(colors)} colors from '{name}' (cached)")
+            return Palette(name=name, colors=colors), method
+
+        palette, method = self._extract_image(img, n_colors, transparent_color, color_space, name, kmeans_mode)
+        self.cache.put(key, palette.colors, method)
+        return palette, method
+
+    def _extract_image(
+        self,
+        img: Image.Image,
+        n_colors: int,
+        transparent_color: Color,
+        color_space: str,
+        name: str,
+        kmeans_mode: str,
+    ) -> tuple[Palette, str]:
+        """The uncached body of extract(); arguments are already validated."""
+        bg_color        = transparent_color.to_hex()
+        transparent_rgb = np.array(
             [transparent_color.r, transparent_color.g, transparent_color.b],
             dtype=np.float32,
         )
 
-        img = Image.open(path)
-
         # --- Fast path: embedded 4bpp palette (≤16 colors) ---
-        embedded = self._extract_embedded_palette(img, transparent_color, name or path.stem)
+        embedded = self._extract_embedded_palette(img, transparent_color, name)
         if embedded is not None:
             return embedded, "embedded"
 
@@ -249,22 +581,57 @@ class PaletteExtractor:
 
         if len(sprite_pixels_rgb) == 0:
             logging.warning("Image has no sprite pixels — returning palette with transparent only")
-            return Palette(name=name or path.stem, colors=[transparent_color]), "kmeans"
-
-        # Convert to clustering space
-        if color_space == "oklab":
-            cluster_pixels = rgb_to_oklab(sprite_pixels_rgb)
+            return Palette(name=name, colors=[transparent_color]), "kmeans"
+
+        if kmeans_mode in ("histogram", "minibatch"):
+            # Cluster the distinct colors, weighted by how many pixels use each
+            unique_rgb_colors, inverse = unique_rgb(sprite_pixels_rgb)
+            counts = np.bincount(inverse, minlength=len(unique_rgb_colors))
+            unique_colors   = len(unique_rgb_colors)
+            actual_clusters = min(n_colors, unique_colors)
+
+            if color_space == "oklab":
+                cluster_points = rgb_to_oklab(unique_rgb_colors)
+            else:
+                cluster_points = unique_rgb_colors.astype(np.float32)
+
+            if kmeans_mode == "minibatch":
+                centers, labels = _kmeans_minibatch(
+                    cluster_points,
+                    counts,
+                    n_clusters=actual_clusters,
+                    batch_size=self.batch_size,
+                    tol=self.tol,
+                    max_bytes=self.max_memory_bytes,
+                    random_state=self.random_state,
+                )
+            else:
+                centers, labels = _kmeans_histogram(
+                    cluster_points,
+                    counts,
+                    inverse,
+                    n_clusters=actual_clusters,
+                    random_state=self.random_state,
+                )
+            cluster_sizes = np.bincount(
+                labels, weights=counts, minlength=actual_clusters
+            ).astype(np.int64)
         else:
-            cluster_pixels = sprite_pixels_rgb.astype(np.float32)
-
-        unique_colors   = len(np.unique(sprite_pixels_rgb, axis=0))
-        actual_clusters = min(n_colors, unique_colors)
-
-        centers, labels = _kmeans(
-            cluster_pixels,
-            n_clusters=actual_clusters,
-            random_state=self.random_state,
-        )
+            # Convert to clustering space
+            if color_space == "oklab":
+                cluster_pixels = rgb_to_oklab_unique(sprite_pixels_rgb)
+            else:
+                cluster_pixels = sprite_pixels_rgb.astype(np.float32)
+
+            unique_colors   = len(np.unique(sprite_pixels_rgb, axis=0))
+            actual_clusters = min(n_colors, unique_colors)
+
+            centers, labels = _kmeans(
+                cluster_pixels,
+                n_clusters=actual_clusters,
+                random_state=self.random_state,
+            )
+            cluster_sizes = np.bincount(labels, minlength=actual_clusters)
 
         # Convert centroids back to uint8 RGB
         if color_space == "oklab":
@@ -273,7 +640,6 @@ class PaletteExtractor:
             centers_rgb = np.clip(centers, 0, 255).astype(np.uint8)
 
         # Sort by cluster size (most-used color first)
-        cluster_sizes = np.bincount(labels, minlength=actual_clusters)
         order         = np.argsort(-cluster_sizes)
         sorted_centers = centers_rgb[order]
 
@@ -281,10 +647,10 @@ class PaletteExtractor:
             Color(int(c[0]), int(c[1]), int(c[2])) for c in sorted_centers
         ]
 
-        palette = Palette(name=name or path.stem, colors=colors)
+        palette = Palette(name=name, colors=colors)
         logging.info(
-            f"Extracted {len(colors)} colors from '{path.name}' via k-means "
-            f"(space={color_space}, transparent={bg_color}, "
+            f"Extracted {len(colors)} colors from '{name}' via k-means "
+            f"(space={color_space}, mode={kmeans_mode}, transparent={bg_color}, "
             f"{len(sprite_pixels_rgb)} sprite pixels, {actual_clusters} clusters)"
         )
         return palette, "kmeans"
@@ -344,13 +710,17 @@ class PaletteExtractor:
         n_colors: int = 15,
         bg_color: str = "#73C5A4",
         color_space: str = "oklab",
+        kmeans_mode: str | None = None,
     ) -> list[tuple[Palette, str]]:
         """Extract palettes from a list of images. Returns one (Palette, method) per image."""
         results = []
         for path in image_paths:
             try:
                 results.append(
-                    self.extract(path, n_colors=n_colors, bg_color=bg_color, color_space=color_space)
+                    self.extract(
+                        path, n_colors=n_colors, bg_color=bg_color,
+                        color_space=color_space, kmeans_mode=kmeans_mode,
+                    )
                 )
             except Exception as e:
                 logging.error(f"Failed to extract palette from {path}: {e}")
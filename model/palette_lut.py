@@ -0,0 +1,156 @@
+"""
+model/palette_lut.py
+
+Nearest-palette-slot lookup in Oklab space, resolved per unique color.
+
+The naive conversion builds an (H*W, N, 3) difference tensor per image and
+palette. Here each distinct sprite color is converted to Oklab and matched
+once, and pixels pick up their slot with an index gather. The distance maths
+is the same as the per-pixel version, so results are bit-identical.
+
+nearest_slots_stacked() scores many palettes in one pass: palettes are stacked
+into a (P, N, 3) Oklab array padded with +inf, so the padded slots never win.
+
+PaletteLUT additionally remembers every color it has resolved (sorted packed
+key → slot arrays), so converting a whole folder of sprites against the same
+palette only ever matches each color once. LUTs are cached per palette by
+their colors via get_palette_lut().
+"""
+
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from model.color_keys import unpack_rgb
+from model.palette import Color
+from model.palette_extractor import rgb_to_oklab
+
+
+LUT_CACHE_SIZE = 256        # palettes kept in the module-level LUT cache
+LUT_MAX_ENTRIES = 1 << 18   # resolved colors remembered per palette
+STACKED_CHUNK_BYTES = 64 << 20   # cap on the (P, U, N, 3) difference tensor
+
+
+def colors_to_oklab(rgb: np.ndarray) -> np.ndarray:
+    """
+    rgb_to_oklab for a set of unique sprite colors.
+    Matches the per-pixel result bit for bit (rgb_to_oklab keeps one row batched).
+    """
+    return rgb_to_oklab(rgb)
+
+
+def nearest_slots(colors_lab: np.ndarray, palette_lab: np.ndarray) -> np.ndarray:
+    """(U, 3) Oklab colors × (N, 3) Oklab palette → (U,) index of the nearest entry."""
+    diff = colors_lab[:, np.newaxis, :] - palette_lab[np.newaxis, :, :]   # (U, N, 3)
+    return (diff ** 2).sum(axis=2).argmin(axis=1)
+
+
+def stack_palettes(color_lists: list[list[Color]]) -> np.ndarray:
+    """Stack P color lists into a (P, N_max, 3) Oklab array, padded with +inf."""
+    if any(not colors for colors in color_lists):
+        raise ValueError("Cannot match against an empty palette")
+    n_max = max((len(colors) for colors in color_lists), default=0)
+    stacked = np.full((len(color_lists), n_max, 3), np.inf, dtype=np.float32)
+    for i, colors in enumerate(color_lists):
+        palette_rgb = np.array([c.to_tuple() for c in colors], dtype=np.uint8)
+        stacked[i, :len(colors)] = rgb_to_oklab(palette_rgb)
+    return stacked
+
+
+def nearest_slots_stacked(colors_lab: np.ndarray, palettes_lab: np.ndarray) -> np.ndarray:
+    """
+    (U, 3) Oklab colors × (P, N, 3) stacked palettes → (P, U) nearest slot per palette.
+    Processed in chunks of colors so the difference tensor stays bounded.
+    """
+    n_pal, n_slots = palettes_lab.shape[:2]
+    out = np.empty((n_pal, len(colors_lab)), dtype=np.int64)
+    chunk = max(1, STACKED_CHUNK_BYTES // max(1, n_pal * n_slots * 3 * 4))
+    for start in range(0, len(colors_lab), chunk):
+        block = colors_lab[start:start + chunk]
+        diff = block[np.newaxis, :, np.newaxis, :] - palettes_lab[:, np.newaxis, :, :]  # (P, u, N, 3)
+        out[:, start:start + chunk] = (diff ** 2).sum(axis=3).argmin(axis=2)
+    return out
+
+
+class PaletteLUT:
+    """Packed-RGB → nearest slot table for one list of palette colors."""
+
+    def __init__(self, colors: list[Color]):
+        if not colors:
+            raise ValueError("Cannot match against an empty palette")
+        palette_rgb = np.array([c.to_tuple() for c in colors], dtype=np.uint8)
+        self.lab = rgb_to_oklab(palette_rgb)                       # (N, 3)
+        self._keys = np.empty(0, dtype=np.uint32)                 # sorted
+        self._slots = np.empty(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def nearest(self, colors_rgb: np.ndarray) -> np.ndarray:
+        """Match (U, 3) uint8 colors directly, without touching the table."""
+        if len(colors_rgb) == 0:
+            return np.empty(0, dtype=np.int64)
+        return nearest_slots(colors_to_oklab(colors_rgb), self.lab)
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Nearest slot (0-based) for each of the given *unique* packed keys.
+        Unknown keys are matched and added to the table.
+        """
+        keys = np.asarray(keys, dtype=np.uint32)
+        with self._lock:
+            known_keys, known_slots = self._keys, self._slots
+
+        out = np.empty(len(keys), dtype=np.int64)
+        if len(known_keys):
+            pos = np.minimum(np.searchsorted(known_keys, keys), len(known_keys) - 1)
+            hit = known_keys[pos] == keys
+            out[hit] = known_slots[pos[hit]]
+        else:
+            hit = np.zeros(len(keys), dtype=bool)
+
+        miss = ~hit
+        if miss.any():
+            new_keys = keys[miss]
+            new_slots = self.nearest(unpack_rgb(new_keys))
+            out[miss] = new_slots
+            self._remember(new_keys, new_slots)
+        return out
+
+    def _remember(self, keys: np.ndarray, slots: np.ndarray) -> None:
+        with self._lock:
+            if len(self._keys) + len(keys) > LUT_MAX_ENTRIES:
+                return   # huge photos would bloat the table for no reuse
+            merged_keys = np.concatenate([self._keys, keys])
+            merged_slots = np.concatenate([self._slots, slots])
+            merged_keys, first = np.unique(merged_keys, return_index=True)
+            self._keys, self._slots = merged_keys, merged_slots[first]
+
+
+_lut_cache: OrderedDict[tuple, PaletteLUT] = OrderedDict()
+_lut_cache_lock = threading.Lock()
+
+
+def get_palette_lut(colors: list[Color]) -> PaletteLUT:
+    """Return the shared PaletteLUT for these colors, creating it on first use."""
+    key = tuple(c.to_tuple() for c in colors)
+    with _lut_cache_lock:
+        lut = _lut_cache.get(key)
+        if lut is not None:
+            _lut_cache.move_to_end(key)
+            return lut
+    lut = PaletteLUT(colors)
+    with _lut_cache_lock:
+        lut = _lut_cache.setdefault(key, lut)
+        _lut_cache.move_to_end(key)
+        while len(_lut_cache) > LUT_CACHE_SIZE:
+            _lut_cache.popitem(last=False)
+    return lut
+
+
+def clear_lut_cache() -> None:
+    with _lut_cache_lock:
+        _lut_cache.clear()
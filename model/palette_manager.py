@@ -12,32 +12,47 @@ Folder layout (searched in order, duplicates skipped):
 When running as a PyInstaller bundle, PORYPAL_BUNDLE_DIR is set to
 sys._MEIPASS and the defaults directory is looked up there rather than
 relative to CWD (which is the user-data directory next to the exe).
+
+reload() rescans every folder and re-parses every file. After changing a
+single file, sync_path(path) / sync(name) re-reads just that palette's key
+(added, rewritten or deleted) and leaves the rest alone; wrap several of
+them in `with manager.batch():` to publish the result once. Readers always
+see a complete, consistently ordered list: updates build a new list and
+swap it in.
 """
 
 from __future__ import annotations
 import logging
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
 
 from model.palette import Palette
 
 
+_SOURCE_RANK = {"default": 0, "user": 1, "legacy": 2}
+
+
 class PaletteManager:
     """Loads and manages palettes from a directory of JASC-PAL files."""
 
     def __init__(self) -> None:
         self._palettes: list[Palette] = []
         self._meta:     dict[str, dict] = {}   # name → {path, is_default, source, folder}
+        self._by_name:  dict[str, Palette] = {}
+        self._lock      = threading.RLock()
+        self._batch_depth = 0
+        self._pending: tuple[dict, dict] | None = None   # (by_name, meta) not yet published
         self._load_palettes()
 
     # ── private ────────────────────────────────────────────────────────────────
 
-    def _load_palettes(self) -> None:
+    @staticmethod
+    def _dirs() -> tuple[Path, Path, Path]:
+        """(palette_dir, defaults_dir, user_dir)."""
         palette_dir = Path("palettes")
-        if not palette_dir.exists():
-            logging.warning("palettes/ directory not found – creating it")
-            palette_dir.mkdir(parents=True, exist_ok=True)
-
         # When frozen, bundled defaults live in PORYPAL_BUNDLE_DIR.
         # In development they live next to the repo root.
         _bundle = os.environ.get("PORYPAL_BUNDLE_DIR")
@@ -45,6 +60,19 @@ class PaletteManager:
             defaults_dir = Path(_bundle) / "palettes" / "defaults"
         else:
             defaults_dir = palette_dir / "defaults"
+        return palette_dir, defaults_dir, palette_dir / "user"
+
+    @staticmethod
+    def _order(meta: dict) -> tuple:
+        """Position of a palette in the list, matching the scan order of _load_palettes."""
+        folder = meta["folder"]
+        return (_SOURCE_RANK[meta["source"]], folder is not None, folder or "", meta["path"].name)
+
+    def _load_palettes(self) -> None:
+        palette_dir, defaults_dir, user_dir = self._dirs()
+        if not palette_dir.exists():
+            logging.warning("palettes/ directory not found – creating it")
+            palette_dir.mkdir(parents=True, exist_ok=True)
 
         # Each entry: (Path, is_default, source, folder_name_or_None)
         candidates: list[tuple[Path, bool, str, str | None]] = []
@@ -53,7 +81,6 @@ class PaletteManager:
             for f in sorted(defaults_dir.glob("*.pal")):
                 candidates.append((f, True, "default", None))
 
-        user_dir = palette_dir / "user"
         if user_dir.exists():
             for f in sorted(user_dir.glob("*.pal")):
                 candidates.append((f, False, "user", None))
@@ -66,8 +93,8 @@ class PaletteManager:
         for f in sorted(palette_dir.glob("*.pal")):
             candidates.append((f, False, "legacy", None))
 
-        self._palettes = []
-        self._meta     = {}
+        palettes: list[Palette] = []
+        meta_by_key: dict[str, dict] = {}
         seen: set[str] = set()
 
         for path, is_default, source, folder in candidates:
@@ -75,21 +102,62 @@ class PaletteManager:
             if key in seen:
                 continue
             seen.add(key)
-            try:
-                p = Palette.from_jasc_pal(path)
-                p = Palette(name=key, colors=p.colors)
-                self._palettes.append(p)
-                self._meta[key] = {
-                    "path":       path,
-                    "is_default": is_default,
-                    "source":     source,
-                    "folder":     folder,
-                }
-                logging.debug(f"Loaded palette [{source}]: {key}")
-            except Exception as e:
-                logging.error(f"Failed to load palette {path}: {e}")
-
-        logging.info(f"Loaded {len(self._palettes)} palettes")
+            p = self._read(path, key)
+            if p is None:
+                continue
+            palettes.append(p)
+            meta_by_key[key] = {
+                "path":       path,
+                "is_default": is_default,
+                "source":     source,
+                "folder":     folder,
+            }
+            logging.debug(f"Loaded palette [{source}]: {key}")
+
+        with self._lock:
+            self._pending = None
+            self._publish(palettes, meta_by_key)
+        logging.info(f"Loaded {len(palettes)} palettes")
+
+    @staticmethod
+    def _read(path: Path, key: str) -> Palette | None:
+        try:
+            p = Palette.from_jasc_pal(path)
+            return Palette(name=key, colors=p.colors)
+        except Exception as e:
+            logging.error(f"Failed to load palette {path}: {e}")
+            return None
+
+    def _publish(self, palettes: list[Palette], meta_by_key: dict[str, dict]) -> None:
+        """Swap in a new snapshot (caller holds the lock)."""
+        self._palettes = palettes
+        self._meta     = meta_by_key
+        self._by_name  = {p.name: p for p in palettes}
+
+    def _candidates_for(self, key: str) -> list[tuple[Path, bool, str, str | None]]:
+        """The files that could provide *key*, highest priority first."""
+        palette_dir, defaults_dir, user_dir = self._dirs()
+        if "/" in key:
+            folder, filename = key.split("/", 1)
+            return [(user_dir / folder / filename, False, "user", folder)]
+        return [
+            (defaults_dir / key, True,  "default", None),
+            (user_dir / key,     False, "user",    None),
+            (palette_dir / key,  False, "legacy",  None),
+        ]
+
+    def _key_for_path(self, path: Path) -> str | None:
+        """Library key a .pal path maps to, or None if it is outside the palette folders."""
+        path = Path(path)
+        if path.suffix != ".pal":
+            return None
+        palette_dir, defaults_dir, user_dir = self._dirs()
+        parent = path.resolve().parent
+        if parent in (defaults_dir.resolve(), user_dir.resolve(), palette_dir.resolve()):
+            return path.name
+        if parent.parent == user_dir.resolve():
+            return f"{parent.name}/{path.name}"
+        return None
 
     # ── public ─────────────────────────────────────────────────────────────────
 
@@ -100,7 +168,7 @@ class PaletteManager:
         return self._palettes[index]
 
     def get_palette_by_name(self, name: str) -> Palette | None:
-        return next((p for p in self._palettes if p.name == name), None)
+        return self._by_name.get(name)
 
     def get_meta(self, name: str) -> dict | None:
         return self._meta.get(name)
@@ -121,4 +189,61 @@ class PaletteManager:
         return sorted(sub.name for sub in user_dir.iterdir() if sub.is_dir())
 
     def reload(self) -> None:
-        self._load_palettes()
\ No newline at end of file
+        self._load_palettes()
+
+    def sync(self, name: str) -> Palette | None:
+        """
+        Re-read the palette *name* from disk: picks up a new, rewritten or
+        deleted file (falling back to a lower-priority file with the same name,
+        as reload() would). Returns the palette now registered, or None.
+        """
+        with self._lock:
+            palette, meta = None, None
+            for path, is_default, source, folder in self._candidates_for(name):
+                if path.exists():
+                    palette = self._read(path, name)
+                    if palette is not None:
+                        meta = {"path": path, "is_default": is_default, "source": source, "folder": folder}
+                    break   # reload() skips lower-priority duplicates even when this one fails to parse
+
+            by_name, meta_by_key = self._pending or (dict(self._by_name), dict(self._meta))
+            by_name.pop(name, None)
+            meta_by_key.pop(name, None)
+            if palette is not None:
+                by_name[name]     = palette
+                meta_by_key[name] = meta
+            self._pending = (by_name, meta_by_key)
+            if self._batch_depth == 0:
+                self._commit_pending()
+            return palette
+
+    def sync_path(self, path: str | Path) -> Palette | None:
+        """
+        sync() the palette a file under palettes/ maps to. Paths reload() would
+        not see (other folders, nested subfolders) are ignored and return None.
+        """
+        key = self._key_for_path(Path(path))
+        if key is None:
+            logging.debug(f"Not a library palette path, ignoring: {path}")
+            return None
+        return self.sync(key)
+
+    @contextmanager
+    def batch(self) -> Iterator["PaletteManager"]:
+        """Group several sync()/sync_path() calls; readers see the result once, at the end."""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._commit_pending()
+
+    def _commit_pending(self) -> None:
+        if self._pending is None:
+            return
+        by_name, meta_by_key = self._pending
+        self._pending = None
+        ordered = sorted(meta_by_key, key=lambda k: self._order(meta_by_key[k]))
+        self._publish([by_name[k] for k in ordered], meta_by_key)
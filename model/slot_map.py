@@ -0,0 +1,102 @@
+"""
+model/slot_map.py
+
+Render sprites through a color → palette slot map. Pure numpy, no Qt.
+
+A slot map is a dict {(r, g, b): slot}. Pixels that are not fully opaque, or
+that match the background color, go to slot 0. Colors in the map take their
+slot; any other color takes the slot of its nearest mapped color (squared RGB
+distance; on ties the entry that comes first in the dict wins, and an empty
+map gives slot 1). Lookups run on packed uint32 keys (model.color_keys) with
+np.searchsorted, and the nearest-slot fallback is solved once per distinct
+unmatched color.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from PIL import Image
+
+from model.color_keys import pack_rgb, unique_keys
+from model.palette import Color
+
+
+def _foreground_mask(px: np.ndarray, bg_rgb) -> np.ndarray:
+    """(H, W) bool: fully opaque and not the background color."""
+    bg = np.asarray(bg_rgb, dtype=np.uint8).reshape(3)
+    return (px[:, :, 3] >= 255) & ~np.all(px[:, :, :3] == bg, axis=2)
+
+
+def render_slots(px: np.ndarray, bg_rgb, slot_map: dict[tuple, int]) -> np.ndarray:
+    """Map an (H, W, 4) uint8 RGBA sprite to an (H, W) int32 array of slots."""
+    h, w  = px.shape[:2]
+    slots = np.zeros(h * w, dtype=np.int32)
+    fg    = _foreground_mask(px, bg_rgb).ravel()
+    if not fg.any():
+        return slots.reshape(h, w)
+
+    uniq, inverse = unique_keys(pack_rgb(px[:, :, :3].reshape(-1, 3)[fg]))
+
+    if slot_map:
+        map_rgb   = np.array(list(slot_map.keys()), dtype=np.uint8).reshape(-1, 3)
+        map_slots = np.array(list(slot_map.values()), dtype=np.int32)
+        map_keys  = pack_rgb(map_rgb)
+        order     = np.argsort(map_keys, kind="stable")
+        sorted_keys = map_keys[order]
+
+        pos     = np.minimum(np.searchsorted(sorted_keys, uniq), len(sorted_keys) - 1)
+        matched = sorted_keys[pos] == uniq
+        uniq_slots = np.where(matched, map_slots[order[pos]], 0)
+
+        if not matched.all():
+            missing = uniq[~matched]
+            rgb     = np.stack([(missing >> 16) & 0xFF, (missing >> 8) & 0xFF, missing & 0xFF], axis=1)
+            dists   = ((rgb[:, None, :].astype(np.int64) - map_rgb[None, :, :].astype(np.int64)) ** 2).sum(axis=2)
+            uniq_slots[~matched] = map_slots[dists.argmin(axis=1)]
+    else:
+        uniq_slots = np.ones(len(uniq), dtype=np.int32)
+
+    slots[fg] = uniq_slots[inverse]
+    return slots.reshape(h, w)
+
+
+def majority_colors(px: np.ndarray, bg_rgb, slot_image: np.ndarray, n_slots: int) -> list[tuple | None]:
+    """
+    For slots 1..n_slots, the most frequent foreground color of *px* among the
+    pixels *slot_image* assigns to that slot (ties: the color seen first in
+    row-major order), or None if no pixel contributes. Index 0 of the returned
+    list is slot 1.
+    """
+    valid = (slot_image.ravel() > 0) & _foreground_mask(px, bg_rgb).ravel()
+    best: list[tuple | None] = [None] * n_slots
+    if not valid.any():
+        return best
+
+    slot = slot_image.ravel()[valid].astype(np.int64)
+    keys = pack_rgb(px[:, :, :3].reshape(-1, 3)[valid]).astype(np.int64)
+    pairs, first, counts = np.unique((slot << 24) | keys, return_index=True, return_counts=True)
+
+    pair_slot = pairs >> 24
+    # Per slot: highest count first, then earliest first occurrence
+    order = np.lexsort((first, -counts, pair_slot))
+    head  = np.ones(len(order), dtype=bool)
+    head[1:] = pair_slot[order][1:] != pair_slot[order][:-1]
+    for pair in pairs[order[head]]:
+        s = int(pair >> 24)
+        if 1 <= s <= n_slots:
+            key = int(pair & 0xFFFFFF)
+            best[s - 1] = ((key >> 16) & 0xFF, (key >> 8) & 0xFF, key & 0xFF)
+    return best
+
+
+def indexed_image(index_map: np.ndarray, palette_colors: list[Color]) -> Image.Image:
+    """Paletted image from an (H, W) slot array; slot 0 is marked transparent."""
+    h, w = index_map.shape
+    out  = Image.frombytes("P", (w, h), np.ascontiguousarray(index_map, dtype=np.uint8).tobytes())
+    pal_data: list[int] = []
+    for c in palette_colors:
+        pal_data += list(c.to_tuple())
+    pal_data += [0] * (768 - len(pal_data))
+    out.putpalette(pal_data[:768])
+    out.info["transparency"] = 0
+    return out
@@ -2,6 +2,10 @@
 model/tileset_manager.py
 
 Tileset loading, slicing, reordering — pure Pillow, no Qt.
+
+load() accepts any model.image_source.ImageSource (path, encoded bytes, PIL
+image or pixel array), so routes and pipeline steps can hand over what they
+already hold instead of writing a temporary file.
 """
 
 from __future__ import annotations
@@ -11,6 +15,8 @@ from typing import Optional
 
 from PIL import Image
 
+from model.image_source import ImageSource, is_path_source, open_image
+
 
 class TilesetManager:
     def __init__(self, config: dict):
@@ -22,10 +28,10 @@ class TilesetManager:
         self._tiles: list[Image.Image] = []
         self._processed: Optional[Image.Image] = None
 
-    def load(self, file_path: str | Path) -> bool:
+    def load(self, source: ImageSource) -> bool:
         try:
             # Open once to capture palette metadata before any conversion
-            original = Image.open(file_path)
+            original = open_image(source)
             self._was_4bpp = False
             self._source_palette = None
             self._source_transparency = None
@@ -45,7 +51,8 @@ class TilesetManager:
             self._source = self._resize(img)
             self._tiles = self._extract_tiles(self._source)
             self._processed = self._arrange(self._tiles)
-            logging.debug(f"Tileset loaded: {file_path} → {len(self._tiles)} tiles (4bpp={self._was_4bpp})")
+            label = Path(source).name if is_path_source(source) else "image"
+            logging.debug(f"Tileset loaded: {label} → {len(self._tiles)} tiles (4bpp={self._was_4bpp})")
             return True
         except Exception as e:
             logging.error(f"Failed to load tileset: {e}")
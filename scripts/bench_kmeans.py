@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+scripts/bench_kmeans.py
+
+Compare the k-means modes of model.palette_extractor on large sources:
+  pixels    — _kmeans over every opaque pixel (original implementation)
+  histogram — _kmeans_histogram over unique colors
+  minibatch — _kmeans_minibatch over unique colors
+
+Reports wall time and inertia (sum of squared Oklab distances over all pixels,
+lower is better) for a synthetic trainer overworld sheet and a 2048×2048
+tileset dump.
+
+Usage:
+    python scripts/bench_kmeans.py [--skip-pixels] [--batch-size 1024]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from model.color_keys import unique_rgb  # noqa: E402
+from model.palette_extractor import (  # noqa: E402
+    _assign_chunked, _kmeans, _kmeans_histogram, _kmeans_minibatch, rgb_to_oklab,
+)
+
+N_CLUSTERS = 15
+
+
+def overworld_sheet(seed: int = 0) -> np.ndarray:
+    """9 frames of 32×32, 14 flat colors plus light shading noise → (N, 3) uint8."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, (14, 3))
+    idx = rng.integers(0, 14, 9 * 32 * 32)
+    noise = rng.integers(-6, 7, (len(idx), 3))
+    return np.clip(base[idx] + noise, 0, 255).astype(np.uint8)
+
+
+def tileset_dump(size: int = 2048, seed: int = 1) -> np.ndarray:
+    """64-step gradients with one-bit dithering — tens of thousands of distinct colors."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] * 64 // size
+    rgb = np.stack([x * 4, y * 4, (x + y) * 2], axis=-1)
+    rgb = rgb + rng.integers(0, 2, rgb.shape[:-1])[..., np.newaxis] * 2
+    return np.clip(rgb, 0, 255).reshape(-1, 3).astype(np.uint8)
+
+
+def inertia(lab: np.ndarray, counts: np.ndarray, centers: np.ndarray) -> float:
+    _, dist_sq = _assign_chunked(lab, centers.astype(np.float32), 64 << 20)
+    return float(np.sum(counts * dist_sq.astype(np.float64)))
+
+
+def run(label: str, pixels: np.ndarray, skip_pixels: bool, batch_size: int) -> None:
+    colors, inverse = unique_rgb(pixels)
+    counts = np.bincount(inverse, minlength=len(colors))
+    lab = rgb_to_oklab(colors)
+    print(f"\n{label}: {len(pixels):,} px, {len(colors):,} unique colors")
+
+    modes = []
+    if not skip_pixels:
+        modes.append(("pixels", lambda: _kmeans(lab[inverse], N_CLUSTERS)[0]))
+    modes.append(("histogram", lambda: _kmeans_histogram(lab, counts, inverse, N_CLUSTERS)[0]))
+    modes.append(("minibatch", lambda: _kmeans_minibatch(lab, counts, N_CLUSTERS, batch_size=batch_size)[0]))
+
+    reference = None
+    for name, fn in modes:
+        t0 = time.perf_counter()
+        centers = fn()
+        elapsed = time.perf_counter() - t0
+        score = inertia(lab, counts, centers)
+        reference = reference or score
+        print(f"  {name:<10} {elapsed:8.2f} s   inertia {score:12.4f}  ({score / reference:5.3f}×)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--skip-pixels", action="store_true",
+                        help="skip the per-pixel implementation (slow, ~GBs of memory on 2048²)")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    run("overworld sheet (288×32)", overworld_sheet(), False, args.batch_size)
+    run("tileset dump (2048×2048)", tileset_dump(), args.skip_pixels, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
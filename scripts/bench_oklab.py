@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+scripts/bench_oklab.py
+
+Micro-benchmark for the sRGB → Oklab layer in model.palette_extractor.
+
+Compares, on a 256×256 sprite, images with 5k and 60k distinct colors and a
+4096×4096 tilesheet:
+  legacy  — float gamma decode (np.where + **2.4) on every pixel (pre-table code)
+  table   — rgb_to_oklab with the 256-entry linear-light table
+  unique  — rgb_to_oklab_unique, converting only the distinct colors
+
+Usage:
+    python scripts/bench_oklab.py [--repeat 3] [--skip-large]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from model.palette_extractor import (  # noqa: E402
+    _W, _srgb_to_linear, rgb_to_oklab, rgb_to_oklab_unique,
+)
+
+
+def legacy_rgb_to_oklab(pixels: np.ndarray) -> np.ndarray:
+    lin = _srgb_to_linear(pixels.astype(np.float32) / 255.0)
+    lms = np.cbrt(np.maximum(lin @ _W["rgb_to_lms"].T, 0))
+    return (lms @ _W["lms_to_oklab"].T).astype(np.float32)
+
+
+def make_image(size: int, n_colors: int, seed: int = 0) -> np.ndarray:
+    """(size*size, 3) uint8 pixels drawn from n_colors distinct colors."""
+    rng = np.random.default_rng(seed)
+    colors = rng.integers(0, 256, (n_colors, 3), dtype=np.uint8)
+    return colors[rng.integers(0, n_colors, size * size)]
+
+
+def best_of(fn, pixels: np.ndarray, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(pixels)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(label: str, pixels: np.ndarray, repeat: int) -> None:
+    expected = legacy_rgb_to_oklab(pixels)
+    assert np.array_equal(rgb_to_oklab(pixels), expected)
+    assert np.array_equal(rgb_to_oklab_unique(pixels), expected)
+
+    legacy = best_of(legacy_rgb_to_oklab, pixels, repeat)
+    table  = best_of(rgb_to_oklab, pixels, repeat)
+    unique = best_of(rgb_to_oklab_unique, pixels, repeat)
+
+    print(f"\n{label} ({len(pixels):,} px)")
+    for name, t in (("legacy", legacy), ("table", table), ("unique", unique)):
+        print(f"  {name:<12} {t * 1000:10.2f} ms   {legacy / t:6.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-large", action="store_true", help="skip the 4096×4096 case")
+    args = parser.parse_args()
+
+    run("256×256 sprite, 48 colors", make_image(256, 48), args.repeat)
+    run("512×512 image, 5k colors", make_image(512, 5_000), args.repeat)
+    run("1024×1024 image, 60k colors", make_image(1024, 60_000), args.repeat)
+    if not args.skip_large:
+        run("4096×4096 tilesheet, 256 colors", make_image(4096, 256), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+scripts/bench_pipeline_steps.py
+
+Per-file overhead of the pipeline's extract → tileset → convert steps.
+
+Compares, for one sprite run through all three steps:
+  tempfile  — the old step functions: each step encodes the image with
+              save_png, writes it to a NamedTemporaryFile and has
+              PaletteExtractor / TilesetManager / ImageManager decode it again
+  in-memory — the current step functions, which pass the PIL image through
+
+Usage:
+    python scripts/bench_pipeline_steps.py [--repeat 20] [--size 128]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from model.image_manager import ImageManager  # noqa: E402
+from model.palette_extractor import PaletteExtractor  # noqa: E402
+from model.tileset_manager import TilesetManager  # noqa: E402
+from server.api import pipeline  # noqa: E402
+from server.helpers import save_png  # noqa: E402
+
+
+def make_sheet(size: int, n_colors: int = 24, seed: int = 0) -> Image.Image:
+    """size×size RGBA sheet: 60% of pixels drawn from n_colors colors, the rest the default bg."""
+    rng = np.random.default_rng(seed)
+    colors = rng.integers(0, 256, (n_colors, 3), dtype=np.uint8)
+    px = np.empty((size, size, 4), dtype=np.uint8)
+    px[..., :3] = (0x73, 0xC5, 0xA4)
+    px[..., 3] = 255
+    mask = rng.random((size, size)) < 0.6
+    px[mask, :3] = colors[rng.integers(0, n_colors, int(mask.sum()))]
+    return Image.fromarray(px, "RGBA")
+
+
+def _via_tempfile(img: Image.Image, use) -> object:
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+        tmp.write(save_png(img))
+        tmp_path = tmp.name
+    try:
+        return use(tmp_path)
+    finally:
+        os.unlink(tmp_path)
+
+
+def tempfile_steps(img: Image.Image, preset: dict) -> Image.Image:
+    """The step chain as it was: one encode / disk write / decode per step."""
+    palette, _ = _via_tempfile(
+        img, lambda path: PaletteExtractor().extract(path, n_colors=15, bg_color="#73C5A4", name="bench"),
+    )
+
+    config = {
+        "tileset": {
+            "input_sprite_size": {"width": preset["tile_w"], "height": preset["tile_h"]},
+            "output_sprite_size": {"width": preset["tile_w"], "height": preset["tile_h"]},
+            "sprite_order": preset["slots"],
+        },
+        "output": {
+            "output_width": preset["cols"] * preset["tile_w"],
+            "output_height": preset["rows"] * preset["tile_h"],
+        },
+    }
+
+    def tile(path):
+        mgr = TilesetManager(config)
+        mgr.load(path)
+        return mgr.get_processed()
+    img = _via_tempfile(img, tile)
+
+    def convert(path):
+        mgr = ImageManager()
+        mgr.load_image(path)
+        return mgr.process_all_palettes([palette])[0].image
+    return _via_tempfile(img, convert)
+
+
+def in_memory_steps(img: Image.Image, preset: dict) -> Image.Image:
+    img, palette = pipeline._run_extract_step(img, "bench", {"bg_mode": "default", "n_colors": 15})
+    img = pipeline._run_tileset_step(img, {}, preset)
+    out, _notes, _name = pipeline._run_convert_step(img, {"palette_source": "extracted"}, palette)
+    return out
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--size", type=int, default=128, help="sheet width/height in pixels")
+    args = parser.parse_args()
+
+    img = make_sheet(args.size)
+    tiles = args.size // 32
+    preset = {
+        "tile_w": 32, "tile_h": 32, "cols": tiles, "rows": tiles,
+        "slots": list(reversed(range(tiles * tiles))),
+    }
+    in_memory_steps(img, preset)    # warm the extraction / LUT caches for both runs
+    tempfile_steps(img, preset)
+
+    old = best_of(lambda: tempfile_steps(img, preset), args.repeat)
+    new = best_of(lambda: in_memory_steps(img, preset), args.repeat)
+
+    print(f"\n{args.size}×{args.size} sheet, extract → tileset → convert (best of {args.repeat})")
+    print(f"  {'tempfile':<10} {old * 1000:8.2f} ms/file")
+    print(f"  {'in-memory':<10} {new * 1000:8.2f} ms/file   {old / new:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,60 +2,214 @@
 server/api/batch.py
 
 Routes: /api/batch
+
+Uploads are converted on the shared compute pool (server/compute.py
+map_compute) and each PNG is streamed into the zip response as soon as it is
+ready (completion order), so the archive is never staged in memory. A request
+is turned away with 503 when the pool is saturated; once admitted it keeps at
+most BATCH_WORKERS * 2 files in flight, which bounds memory regardless of
+batch size. The zip ends with manifest.json: per-file colors_used / output /
+error and timings, in upload order.
+
+POST /api/batch/matrix scores N sprites against M palettes in one vectorized
+pass (model.image_manager.convert_many) on the shared compute pool and picks
+the best palette per sprite with the pipeline's tie-break rules
+(choose_best / conflict_mode). download=true streams a zip of each sprite
+converted with its best palette instead of returning JSON.
 """
 
 from __future__ import annotations
-import io
+import json
 import os
-import tempfile
-import zipfile
+import time
+from contextlib import closing
 from pathlib import Path
+from typing import Iterator
 
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
 
-from server.helpers import save_png
+from model.image_manager import (
+    CONFLICT_MODES, choose_best, colors_used_matrix, convert, convert_many, load_rgba,
+)
+from model.palette import Palette
+from server.compute import admit_compute, map_compute, run_compute
+from server.helpers import bg_hex, save_png, stream_zip
 from server.state import state
 
 router = APIRouter(prefix="/api/batch", tags=["batch"])
 
+# One request keeps at most BATCH_WORKERS * 2 files on the compute pool
+BATCH_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _convert_one(filename: str, data: bytes, palette: Palette) -> tuple[dict, bytes | None]:
+    """Convert one upload; returns (manifest entry, png bytes or None on error)."""
+    started = time.perf_counter()
+    try:
+        r = convert(data, [palette])[0]
+        png = save_png(r.image)
+    except Exception as e:
+        return {"file": filename, "error": str(e), "seconds": round(time.perf_counter() - started, 4)}, None
+
+    out_name = f"{Path(filename).stem}_{Path(palette.name).stem}.png"
+    return {
+        "file":        filename,
+        "output":      out_name,
+        "colors_used": r.colors_used,
+        "seconds":     round(time.perf_counter() - started, 4),
+    }, png
+
+
+def _iter_batch(uploads: list[tuple[str, bytes]], palette: Palette) -> Iterator[tuple[str, bytes]]:
+    """
+    Yield (arcname, png) zip entries as conversions finish, then manifest.json.
+    Closing the iterator (client went away) cancels the files not yet started.
+    """
+    started = time.perf_counter()
+    meta: list[dict | None] = [None] * len(uploads)
+    converted = map_compute(
+        _convert_one, [(filename, data, palette) for filename, data in uploads], BATCH_WORKERS * 2,
+    )
+
+    with closing(converted):
+        for i, (entry, png) in converted:
+            meta[i] = entry
+            if png is not None:
+                yield entry["output"], png
+
+    manifest = {
+        "palette":   palette.name,
+        "converted": sum(1 for m in meta if "error" not in m),
+        "failed":    sum(1 for m in meta if "error" in m),
+        "seconds":   round(time.perf_counter() - started, 4),
+        "files":     meta,
+    }
+    yield "manifest.json", json.dumps(manifest, indent=2)
+
 
 @router.post("")
 async def batch_convert(
     files: list[UploadFile] = File(...),
     palette_name: str = Form(...),
 ):
-    """Convert multiple sprites against one palette. Returns a zip of all results."""
+    """
+    Convert multiple sprites against one palette. Streams a zip of all results
+    plus manifest.json; files that fail to convert are listed there with their error.
+    """
     palette = state.palette_manager.get_palette_by_name(palette_name)
     if not palette:
         raise HTTPException(404, f"Palette '{palette_name}' not found")
 
-    zip_buf = io.BytesIO()
-    results_meta = []
-
-    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        for upload in files:
-            data = await upload.read()
-            with tempfile.NamedTemporaryFile(suffix=Path(upload.filename).suffix, delete=False) as tmp:
-                tmp.write(data)
-                tmp_path = tmp.name
-            try:
-                state.image_manager.load_image(tmp_path)
-                results = state.image_manager.process_all_palettes([palette])
-                r = results[0]
-                stem = Path(upload.filename).stem
-                pal_stem = Path(palette_name).stem
-                out_name = f"{stem}_{pal_stem}.png"
-                zf.writestr(out_name, save_png(r.image))
-                results_meta.append({"file": upload.filename, "colors_used": r.colors_used, "output": out_name})
-            except Exception as e:
-                results_meta.append({"file": upload.filename, "error": str(e)})
-            finally:
-                os.unlink(tmp_path)
-
-    zip_buf.seek(0)
+    admit_compute()
+    uploads = [(upload.filename, await upload.read()) for upload in files]
     return StreamingResponse(
-        zip_buf,
+        stream_zip(_iter_batch(uploads, palette)),
         media_type="application/zip",
         headers={"Content-Disposition": 'attachment; filename="batch_output.zip"'},
     )
+
+
+def _score_matrix(
+    uploads: list[tuple[str, bytes]],
+    palettes: list[Palette],
+    bg_color: str | None,
+    conflict_mode: str,
+) -> tuple[list[dict], list]:
+    """
+    Decode every upload and score the decodable ones against every palette in
+    one pass. Returns (per-sprite rows in upload order, chosen result or None).
+    """
+    rows:   list[dict] = []
+    images: list       = []
+    for filename, data in uploads:
+        try:
+            images.append(load_rgba(data))
+            rows.append({"file": filename})
+        except Exception as e:
+            images.append(None)
+            rows.append({"file": filename, "error": f"Cannot open image: {e}"})
+
+    decoded = [img for img in images if img is not None]
+    if not decoded:
+        return rows, [None] * len(rows)
+    results = convert_many(decoded, palettes, [bg_color] * len(decoded))
+    matrix  = colors_used_matrix(results)
+
+    chosen_results: list = []
+    scored = iter(zip(results, matrix))
+    for row, img in zip(rows, images):
+        if img is None:
+            chosen_results.append(None)
+            continue
+        sprite_results, colors_used = next(scored)
+        chosen, tied, notes = choose_best(sprite_results, conflict_mode)
+        row.update({
+            "colors_used": colors_used.tolist(),
+            "best":        chosen.palette.name,
+            "best_colors": chosen.colors_used,
+            "tied":        tied,
+            "notes":       notes,
+        })
+        chosen_results.append(chosen)
+    return rows, chosen_results
+
+
+def _iter_matrix_zip(rows: list[dict], chosen_results: list, palette_names: list[str]) -> Iterator[tuple[str, bytes]]:
+    """Best-palette PNG per sprite (rendered as the zip streams), then manifest.json."""
+    for row, chosen in zip(rows, chosen_results):
+        if chosen is None:
+            continue
+        row["output"] = f"{Path(row['file']).stem}_{Path(chosen.palette.name).stem}.png"
+        yield row["output"], save_png(chosen.image)
+    yield "manifest.json", json.dumps({"palettes": palette_names, "sprites": rows}, indent=2)
+
+
+@router.post("/matrix")
+async def batch_matrix(
+    files: list[UploadFile] = File(...),
+    palette_names: str = Form(default="[]"),      # JSON array; empty = every loaded palette
+    bg_color: str | None = Form(default=None),
+    conflict_mode: str = Form(default="auto_first"),
+    download: bool = Form(default=False),
+):
+    """
+    Score every sprite against every selected palette.
+
+    Returns {"palettes": [...], "sprites": [{file, colors_used: [one per
+    palette], best, best_colors, tied, notes} | {file, error}]}. Ties on
+    colors_used go to the first palette name; conflict_mode='flag' adds a note.
+    download=true: a zip with each sprite converted to its best palette plus
+    the same data as manifest.json.
+    """
+    if conflict_mode not in CONFLICT_MODES:
+        raise HTTPException(400, f"conflict_mode must be one of {', '.join(CONFLICT_MODES)}")
+    bg = bg_hex(bg_color)
+    try:
+        selected = json.loads(palette_names) or []
+    except Exception:
+        raise HTTPException(400, "palette_names must be a JSON array")
+
+    all_palettes = state.palette_manager.get_palettes()
+    if selected:
+        by_name  = {p.name: p for p in all_palettes}
+        missing  = [n for n in selected if n not in by_name]
+        if missing:
+            raise HTTPException(404, f"Palette(s) not found: {', '.join(missing)}")
+        palettes = [by_name[n] for n in selected]
+    else:
+        palettes = all_palettes
+    if not palettes:
+        raise HTTPException(400, "No palettes loaded")
+
+    uploads = [(upload.filename, await upload.read()) for upload in files]
+    rows, chosen_results = await run_compute(_score_matrix, uploads, palettes, bg, conflict_mode)
+    names = [p.name for p in palettes]
+
+    if download:
+        return StreamingResponse(
+            stream_zip(_iter_matrix_zip(rows, chosen_results, names)),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="batch_best_palettes.zip"'},
+        )
+    return {"palettes": names, "sprites": rows}
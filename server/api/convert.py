@@ -2,74 +2,100 @@
 server/api/convert.py
 
 Routes: /api/convert
+
+Conversion goes through the stateless model.image_manager.convert() on the
+shared compute pool (server/compute.py), so concurrent requests never share an image or its bg color.
 """
 
 from __future__ import annotations
 import io
 import json
-import os
-import tempfile
 import zipfile
 from pathlib import Path
 
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
-from PIL import Image
 
-from server.helpers import copy_without_transparency, pil_to_b64, is_4bpp_bytes, save_png
+from model.image_manager import best_indices, convert as convert_image, load_rgba
+from server.artifact_store import artifact_store, load_artifact
+from server.compute import run_compute
+from server.helpers import bg_hex, copy_without_transparency, pil_to_b64, is_4bpp_bytes, save_png
 from server.state import state
 
 router = APIRouter(prefix="/api/convert", tags=["convert"])
 
 
+def _open_upload(data: bytes):
+    try:
+        return load_rgba(data)
+    except Exception as e:
+        raise HTTPException(400, f"Cannot open image: {e}")
+
+
 @router.post("")
 async def convert(
     file: UploadFile = File(...),
     palette_name: str | None = Form(default=None),
     bg_color: str | None = Form(default=None),
+    offset: int = Form(default=0),
+    limit: int | None = Form(default=None),
+    best_only: bool = Form(default=False),
 ):
     """
     Convert an uploaded sprite against all (or one specific) palette(s).
     Returns base64 PNG previews + color counts for each result.
+
+    Every palette is scored (colors_used / used_indices / best), but preview
+    images are only rendered for results[offset:offset + limit] — or only for
+    the best matches when best_only is set. Other results have image = null.
+
+    The scored results are kept as an artifact; pass the returned artifact_id
+    to /download-all to zip them without re-uploading or re-converting.
+    Previews are rendered without being kept on the stored results, so the
+    artifact only ever holds the index maps its size accounts for.
     """
     data = await file.read()
-    try:
-        Image.open(io.BytesIO(data))
-    except Exception as e:
-        raise HTTPException(400, f"Cannot open image: {e}")
+    img  = _open_upload(data)
+    bg   = bg_hex(bg_color)
 
-    with tempfile.NamedTemporaryFile(suffix=Path(file.filename).suffix, delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
+    palettes = state.palette_manager.get_palettes()
+    if palette_name:
+        palettes = [p for p in palettes if p.name == palette_name]
+        if not palettes:
+            raise HTTPException(404, f"Palette '{palette_name}' not found")
 
-    try:
-        state.image_manager.load_image(tmp_path, bg_color=bg_color)
+    results = await run_compute(convert_image, img, palettes, bg)
+    best = best_indices(results)
 
-        palettes = state.palette_manager.get_palettes()
-        if palette_name:
-            palettes = [p for p in palettes if p.name == palette_name]
-            if not palettes:
-                raise HTTPException(404, f"Palette '{palette_name}' not found")
+    artifact_id = artifact_store.put(
+        "convert",
+        {"stem": Path(file.filename).stem, "was_4bpp": is_4bpp_bytes(data), "bg_color": bg, "results": results},
+        size=len(data) + img.width * img.height * 9,   # pixel→color index + bg mask behind the lazy renders
+    )
 
-        results = state.image_manager.process_all_palettes(palettes)
-        best = state.image_manager.get_best_indices()
+    end = len(results) if limit is None else offset + max(0, limit)
+    visible = set(range(max(0, offset), min(end, len(results))))
+    if best_only:
+        visible &= set(best)
 
+    def previews() -> dict:
         return {
-            "original": pil_to_b64(state.image_manager._original_rgba),
+            "artifact_id": artifact_id,
+            "original": pil_to_b64(img),
             "results": [
                 {
                     "palette_name": r.palette.name,
                     "colors_used": r.colors_used,
                     "used_indices": sorted(r.used_indices),
                     "colors": [c.to_hex() for c in r.palette.colors],
-                    "image": pil_to_b64(copy_without_transparency(r.image)),
+                    "image": pil_to_b64(copy_without_transparency(r.render_image())) if i in visible else None,
                     "best": i in best,
                 }
                 for i, r in enumerate(results)
             ],
         }
-    finally:
-        os.unlink(tmp_path)
+
+    return await run_compute(previews)
 
 
 @router.post("/download")
@@ -81,63 +107,67 @@ async def download_converted(
     """Convert and return a single GBA-compatible indexed PNG for download."""
     data = await file.read()
     was_4bpp = is_4bpp_bytes(data)
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
-
-    try:
-        state.image_manager.load_image(tmp_path, bg_color=bg_color)
-        palette = state.palette_manager.get_palette_by_name(palette_name)
-        if not palette:
-            raise HTTPException(404, f"Palette '{palette_name}' not found")
+    img = _open_upload(data)
+    palette = state.palette_manager.get_palette_by_name(palette_name)
+    if not palette:
+        raise HTTPException(404, f"Palette '{palette_name}' not found")
 
-        results = state.image_manager.process_all_palettes([palette])
-        result = results[0]
+    def render() -> bytes:
+        result = convert_image(img, [palette], bg_color)[0]
+        return save_png(copy_without_transparency(result.image), preserve_4bpp=was_4bpp)
 
-        visible_result = copy_without_transparency(result.image)
-        out_buf = io.BytesIO(save_png(visible_result, preserve_4bpp=was_4bpp))
+    out_buf = io.BytesIO(await run_compute(render))
 
-        stem = Path(file.filename).stem
-        pal_stem = Path(palette_name).stem
-        filename = f"{stem}_{pal_stem}.png"
+    stem = Path(file.filename).stem
+    pal_stem = Path(palette_name).stem
+    filename = f"{stem}_{pal_stem}.png"
 
-        return StreamingResponse(
-            out_buf,
-            media_type="image/png",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-        )
-    finally:
-        os.unlink(tmp_path)
+    return StreamingResponse(
+        out_buf,
+        media_type="image/png",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.post("/download-all")
 async def download_all_converted(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(default=None),
     bg_color: str | None = Form(default=None),
     palette_names: str = Form(default="[]"),  # JSON array of selected palette names
+    artifact_id: str | None = Form(default=None),
 ):
     """
     Convert against the selected palettes and return a zip of all results.
     palette_names: JSON-encoded list of palette name strings. If empty, uses all loaded palettes.
+    artifact_id: reuse the results of a previous POST /api/convert instead of uploading file.
+    A bg_color other than the one that preview used is a 409 (re-send the file instead).
     """
-    data = await file.read()
-    was_4bpp = is_4bpp_bytes(data)
-
     try:
         selected = json.loads(palette_names)
     except Exception:
         selected = []
-
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
-
-    try:
-        state.image_manager.load_image(tmp_path, bg_color=bg_color)
+    selected_set = set(selected)
+
+    if artifact_id:
+        converted = load_artifact(artifact_id, "convert")
+        if bg_color and bg_hex(bg_color) != converted["bg_color"]:
+            raise HTTPException(
+                409, f"Artifact was converted with bg_color {converted['bg_color'] or 'none'}, not {bg_hex(bg_color)}",
+            )
+        stem      = converted["stem"]
+        was_4bpp  = converted["was_4bpp"]
+        results   = [r for r in converted["results"] if not selected_set or r.palette.name in selected_set]
+        if not results:
+            raise HTTPException(400, "No matching palettes found")
+    else:
+        if file is None:
+            raise HTTPException(400, "Either file or artifact_id is required")
+        data = await file.read()
+        was_4bpp = is_4bpp_bytes(data)
+        img = _open_upload(data)
 
         all_palettes = state.palette_manager.get_palettes()
-        if selected:
-            selected_set = set(selected)
+        if selected_set:
             palettes = [p for p in all_palettes if p.name in selected_set]
         else:
             palettes = all_palettes
@@ -145,24 +175,26 @@ async def download_all_converted(
         if not palettes:
             raise HTTPException(400, "No matching palettes found")
 
-        results = state.image_manager.process_all_palettes(palettes)
+        results = await run_compute(convert_image, img, palettes, bg_color)
+        stem    = Path(file.filename).stem
 
+    def build_zip() -> io.BytesIO:
         zip_buf = io.BytesIO()
-        stem = Path(file.filename).stem
         with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
             for r in results:
                 pal_stem = Path(r.palette.name).stem
-                visible_result = copy_without_transparency(r.image)
+                visible_result = copy_without_transparency(r.render_image())
                 zf.writestr(
                     f"{stem}_{pal_stem}.png",
                     save_png(visible_result, preserve_4bpp=was_4bpp),
                 )
         zip_buf.seek(0)
+        return zip_buf
+
+    zip_buf = await run_compute(build_zip)
 
-        return StreamingResponse(
-            zip_buf,
-            media_type="application/zip",
-            headers={"Content-Disposition": f'attachment; filename="{stem}_all_palettes.zip"'},
-        )
-    finally:
-        os.unlink(tmp_path)
+    return StreamingResponse(
+        zip_buf,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{stem}_all_palettes.zip"'},
+    )
@@ -1,19 +1,23 @@
 """
 server/api/extract.py
 Routes: /api/extract
+
+Extraction and zip building run on the shared compute pool (server/compute.py).
 """
 from __future__ import annotations
 import io
 import json
-import os
-import tempfile
 import zipfile
 from pathlib import Path
 
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
 
-from model.image_manager import ImageManager
+from model.image_manager import convert
+from model.palette import Palette
+from model.palette_extractor import PaletteExtractor
+from server.artifact_store import artifact_store, load_artifact
+from server.compute import run_compute
 from server.helpers import make_pal_content, save_png
 from server.state import state
 
@@ -30,12 +34,51 @@ def _palette_response(palette, method: str, color_space: str) -> dict:
     }
 
 
+def _extract_zip(data: bytes, palette: Palette, method: str, color_space: str, bg: str, stem: str) -> io.BytesIO:
+    """Render the sprite with *palette* and zip it with the .pal and a manifest."""
+    # Render indexed PNG via convert()
+    # (nearest-neighbour pixel→slot mapping, same pipeline as Convert tab)
+    results = convert(data, [palette], bg)
+
+    zip_buf = io.BytesIO()
+    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        # save_png sees mode "P" with <=16 colors -> writes 4bpp automatically
+        zf.writestr(f"{stem}.png", save_png(results[0].image))
+
+        # JASC-PAL
+        zf.writestr(f"{stem}.pal", make_pal_content(palette))
+
+        # Manifest
+        manifest = {
+            "name":        stem,
+            "method":      method,
+            "color_space": color_space,
+            "bg_color":    bg,
+            "n_colors":    len(palette.colors),
+            "colors":      [c.to_hex() for c in palette.colors],
+        }
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+    zip_buf.seek(0)
+    return zip_buf
+
+
+def _check_kmeans_mode(kmeans_mode: str) -> None:
+    if kmeans_mode not in PaletteExtractor.VALID_KMEANS_MODES:
+        raise HTTPException(
+            400,
+            f"kmeans_mode must be one of {', '.join(PaletteExtractor.VALID_KMEANS_MODES)}, "
+            f"got {kmeans_mode!r}",
+        )
+
+
 @router.post("")
 async def extract_palette(
     file: UploadFile = File(...),
     n_colors: int = Form(default=15),
     bg_color: str | None = Form(default="#73C5A4"),
     color_space: str = Form(default="oklab"),
+    kmeans_mode: str = Form(default="histogram"),
 ):
     """
     Extract a GBA palette from the uploaded sprite.
@@ -43,48 +86,54 @@ async def extract_palette(
     For paletted PNGs with ≤16 colors (4bpp), the embedded palette is used
     directly and both oklab/rgb responses are identical.
     For all other images, k-means clustering is applied in the requested color space.
+    kmeans_mode: 'histogram' (default), 'pixels', or 'minibatch' for large sheets.
 
-    Returns palette hex colors, JASC .pal content, and method ('embedded'|'kmeans').
+    Returns palette hex colors, JASC .pal content, method ('embedded'|'kmeans')
+    and an artifact_id that /download-zip accepts instead of the file.
     """
     if color_space not in ("oklab", "rgb"):
         raise HTTPException(400, f"color_space must be 'oklab' or 'rgb', got {color_space!r}")
+    _check_kmeans_mode(kmeans_mode)
 
     data = await file.read()
-    suffix = Path(file.filename).suffix
-    name   = Path(file.filename).stem
-
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
-
-    try:
-        palette, method = state.extractor.extract(
-            tmp_path,
-            n_colors=n_colors,
-            bg_color=bg_color,
-            color_space=color_space,
-            name=name,
+    name = Path(file.filename).stem
+
+    palette, method = await run_compute(
+        state.extractor.extract,
+        data,
+        n_colors=n_colors,
+        bg_color=bg_color,
+        color_space=color_space,
+        name=name,
+        kmeans_mode=kmeans_mode,
+    )
+
+    if len(palette.colors) > 16:
+        raise HTTPException(
+            400,
+            f"Image has too many colors ({len(palette.colors)}); max 16 for GBA",
         )
 
-        if len(palette.colors) > 16:
-            raise HTTPException(
-                400,
-                f"Image has too many colors ({len(palette.colors)}); max 16 for GBA",
-            )
-
-        return _palette_response(palette, method, color_space)
-
-    finally:
-        os.unlink(tmp_path)
+    response = _palette_response(palette, method, color_space)
+    response["artifact_id"] = artifact_store.put("extract", {
+        "data":        data,
+        "palette":     palette,
+        "method":      method,
+        "color_space": color_space,
+        "bg_color":    bg_color or "#73C5A4",
+    })
+    return response
 
 
 @router.post("/download-zip")
 async def download_extract_zip(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(default=None),
     n_colors: int = Form(default=15),
     bg_color: str | None = Form(default="#73C5A4"),
     color_space: str = Form(default="oklab"),
     name: str = Form(default=""),
+    kmeans_mode: str = Form(default="histogram"),
+    artifact_id: str | None = Form(default=None),
 ):
     """
     Extract palette and return a zip containing:
@@ -94,63 +143,45 @@ async def download_extract_zip(
 
     The indexed PNG uses the extracted palette so palette slots match exactly
     between the .png and .pal files.
-    """
-    if color_space not in ("oklab", "rgb"):
-        raise HTTPException(400, f"color_space must be 'oklab' or 'rgb', got {color_space!r}")
 
-    data   = await file.read()
-    suffix = Path(file.filename).suffix or ".png"
-    stem   = (name or Path(file.filename).stem).strip() or "palette"
-    bg     = bg_color or "#73C5A4"
-
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
-
-    try:
-        # 1. Extract palette
-        palette, method = state.extractor.extract(
-            tmp_path,
+    With artifact_id (from POST /api/extract) the stored sprite and palette are
+    used; file and the extraction parameters are ignored.
+    """
+    if artifact_id:
+        extracted   = load_artifact(artifact_id, "extract")
+        data        = extracted["data"]
+        method      = extracted["method"]
+        color_space = extracted["color_space"]
+        bg          = extracted["bg_color"]
+        stem        = name.strip() or extracted["palette"].name or "palette"
+        palette     = Palette(name=stem, colors=list(extracted["palette"].colors))
+    else:
+        if file is None:
+            raise HTTPException(400, "Either file or artifact_id is required")
+        if color_space not in ("oklab", "rgb"):
+            raise HTTPException(400, f"color_space must be 'oklab' or 'rgb', got {color_space!r}")
+        _check_kmeans_mode(kmeans_mode)
+
+        data = await file.read()
+        stem = (name or Path(file.filename).stem).strip() or "palette"
+        bg   = bg_color or "#73C5A4"
+
+        palette, method = await run_compute(
+            state.extractor.extract,
+            data,
             n_colors=n_colors,
             bg_color=bg,
             color_space=color_space,
             name=stem,
+            kmeans_mode=kmeans_mode,
         )
 
-        # 2. Render indexed PNG via ImageManager
-        #    (nearest-neighbour pixel→slot mapping, same pipeline as Convert tab)
-        img_mgr = ImageManager()
-        img_mgr.load_image(tmp_path, bg_color=bg)
-        results = img_mgr.process_all_palettes([palette])
-
-        # 3. Build zip
-        zip_buf = io.BytesIO()
-        with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-            # save_png sees mode "P" with <=16 colors -> writes 4bpp automatically
-            zf.writestr(f"{stem}.png", save_png(results[0].image))
-
-            # JASC-PAL
-            zf.writestr(f"{stem}.pal", make_pal_content(palette))
-
-            # Manifest
-            manifest = {
-                "name":        stem,
-                "method":      method,
-                "color_space": color_space,
-                "bg_color":    bg,
-                "n_colors":    len(palette.colors),
-                "colors":      [c.to_hex() for c in palette.colors],
-            }
-            zf.writestr("manifest.json", json.dumps(manifest, indent=2))
-
-        zip_buf.seek(0)
-        return StreamingResponse(
-            zip_buf,
-            media_type="application/zip",
-            headers={"Content-Disposition": f'attachment; filename="{stem}.zip"'},
-        )
-    finally:
-        os.unlink(tmp_path)
+    zip_buf = await run_compute(_extract_zip, data, palette, method, color_space, bg, stem)
+    return StreamingResponse(
+        zip_buf,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{stem}.zip"'},
+    )
 
 
 @router.post("/save")
@@ -175,5 +206,5 @@ async def save_extracted_palette(
         counter += 1
 
     dest.write_text(pal_content, encoding="utf-8")
-    state.palette_manager.reload()
+    state.palette_manager.sync_path(dest)
     return {"saved": dest.name}
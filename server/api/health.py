@@ -5,6 +5,9 @@ Routes: /api/health
 """
 
 from fastapi import APIRouter
+from server.artifact_store import artifact_store
+from server.build_cache import build_cache
+from server.compute import compute
 from server.state import state
 
 router = APIRouter(prefix="/api", tags=["health"])
@@ -12,4 +15,11 @@ router = APIRouter(prefix="/api", tags=["health"])
 
 @router.get("/health")
 def health():
-    return {"status": "ok", "palettes_loaded": len(state.palette_manager.get_palettes())}
\ No newline at end of file
+    return {
+        "status":          "ok",
+        "palettes_loaded": len(state.palette_manager.get_palettes()),
+        "extract_cache":   state.extractor.cache.stats() if state.extractor.cache else None,
+        "artifacts":       artifact_store.stats(),
+        "compute":         compute.stats(),
+        "build_cache":     build_cache.stats(),
+    }
\ No newline at end of file
@@ -2,15 +2,29 @@
 server/api/items.py
 
 Routes: /api/items
+
+Decoding, extraction and rendering run on the shared compute pool
+(server/compute.py) so the event loop stays free. Group extraction fans out
+from the route itself: every sprite's palette is extracted as its own compute
+task (at most ITEM_WORKERS of one request at a time), and each shape group is
+aligned and rendered as soon as its own sprites are done. POST
+/api/items/extract with stream=true returns the groups as NDJSON, one line per
+group as it finishes.
+
+Preview routes (/extract, /extract-variants) keep their results in
+server/artifact_store.py and return an artifact_id; the download routes accept
+it in place of the uploaded files. Artifacts record the settings they were
+built with, and a download that names other settings gets a 409.
 """
 
 from __future__ import annotations
+import asyncio
 import io
 import json
 import os
-import tempfile
 import zipfile
 from pathlib import Path
+from typing import AsyncIterator, Awaitable
 
 import numpy as np
 from PIL import Image
@@ -18,14 +32,21 @@ from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
 
 from model.palette import Color, Palette
-from server.helpers import pil_to_b64, make_pal_content, save_png
+from model.slot_map import indexed_image, majority_colors, render_slots
+from server.artifact_store import artifact_store, load_artifact
+from server.compute import run_compute, run_compute_waiting
+from server.helpers import bg_hex, pil_to_b64, make_pal_content, save_png
 from server.state import state
 
 router = APIRouter(prefix="/api/items", tags=["items"])
 
 DEFAULT_BG        = "#73C5A4"
+DEFAULT_N_COLORS  = 15
 DEFAULT_THRESHOLD = 0.6
 
+# Compute tasks (per-sprite extraction, per-group rendering) one request keeps on the pool
+ITEM_WORKERS = min(8, os.cpu_count() or 1)
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -40,27 +61,76 @@ def _load_rgba(data: bytes) -> np.ndarray:
     return np.array(Image.open(io.BytesIO(data)).convert("RGBA"))
 
 
+def _input_bgs(input_bgs: list, count: int) -> list[str]:
+    """The normalized input bg each of count sprites is read with (DEFAULT_BG past the end of the list)."""
+    return [bg_hex(input_bgs[i], "input bg") if i < len(input_bgs) else DEFAULT_BG for i in range(count)]
+
+
+def _check_artifact(built: dict, requested: dict) -> None:
+    """409 if a download names settings other than its artifact's; unsent (None) settings are not checked."""
+    for key, value in requested.items():
+        if value is not None and value != built[key]:
+            raise HTTPException(409, f"Artifact was built with {key} {built[key]}, not {value}")
+
+
+def _check_grouping(groups: list[dict], group_assignments: dict[str, str]) -> None:
+    """409 unless the sprites a download groups together are exactly the artifact's groups."""
+    if not group_assignments:
+        return
+    member_of = {r["name"]: g["group_id"] for g in groups for r in g["results"]}
+    requested: dict[str, set[str]] = {}
+    built: dict[str, set[str]] = {}
+    for name, label in group_assignments.items():
+        requested.setdefault(str(label), set()).add(name)
+        built.setdefault(member_of.get(name), set()).add(name)
+    same_groups = sorted(map(sorted, requested.values())) == sorted(map(sorted, built.values()))
+    if set(group_assignments) != set(member_of) or not same_groups:
+        raise HTTPException(409, "Artifact was built with another sprite grouping")
+
+
 def _extract_palette_for_sprite(image_data: bytes, filename: str, n_colors: int, bg_color: str) -> Palette:
     """
     Extract a clean palette using the shared extractor (same as Extract tab).
-    Writes to a temp file, calls state.extractor.extract(), cleans up.
+    Hands the upload bytes straight to state.extractor.extract().
     Guarantees no duplicates, no padding — identical behaviour to the Extract tab.
     """
-    suffix = Path(filename).suffix or ".png"
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(image_data)
-        tmp_path = tmp.name
+    palette, _method = state.extractor.extract(
+        image_data,
+        n_colors=n_colors,
+        bg_color=bg_color,
+        color_space="oklab",
+        name=Path(filename).stem,
+    )
+    return palette
+
+
+async def _gather_or_cancel(aws: list[Awaitable]) -> list:
+    """asyncio.gather that cancels the rest as soon as one fails (or is cancelled)."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
     try:
-        palette, _method = state.extractor.extract(
-            tmp_path,
-            n_colors=n_colors,
-            bg_color=bg_color,
-            color_space="oklab",
-            name=Path(filename).stem,
-        )
-        return palette
+        return await asyncio.gather(*tasks)
     finally:
-        os.unlink(tmp_path)
+        for task in tasks:
+            task.cancel()
+
+
+async def _on_pool(limit: asyncio.Semaphore, fn, *args):
+    async with limit:
+        return await run_compute_waiting(fn, *args)
+
+
+async def _extract_palettes(
+    sprites: list[dict],
+    n_colors: int,
+    limit: asyncio.Semaphore | None = None,
+) -> list[Palette]:
+    """_extract_palette_for_sprite for every sprite, one compute task each (ITEM_WORKERS at a time)."""
+    limit = limit or asyncio.Semaphore(ITEM_WORKERS)
+    return await _gather_or_cancel([
+        _on_pool(limit, _extract_palette_for_sprite,
+                 sprite["raw"], sprite["name"] + ".png", n_colors, sprite["input_bg"])
+        for sprite in sprites
+    ])
 
 
 def _silhouette_key(px: np.ndarray, input_bg_rgb: np.ndarray) -> tuple:
@@ -79,43 +149,8 @@ def _render_sprite(
     palette_colors: list[Color],
     output_bg: Color,
 ) -> Image.Image:
-    h, w       = px.shape[:2]
-    alpha      = px[:, :, 3]
-    rgb        = px[:, :, :3]
-    flat_rgb   = rgb.reshape(-1, 3).astype(np.uint8)
-    flat_alpha = alpha.flatten()
-    index_flat = np.zeros(h * w, dtype=np.int32)
-
-    for i in range(h * w):
-        if flat_alpha[i] < 255:
-            index_flat[i] = 0
-            continue
-        color_key = tuple(flat_rgb[i])
-        if np.all(flat_rgb[i] == input_bg_rgb):
-            index_flat[i] = 0
-        elif color_key in slot_map:
-            index_flat[i] = slot_map[color_key]
-        else:
-            best_slot, best_dist = 1, float('inf')
-            r, g, b = flat_rgb[i]
-            for mapped_color, slot in slot_map.items():
-                mr, mg, mb = mapped_color
-                dist = (r - mr) ** 2 + (g - mg) ** 2 + (b - mb) ** 2
-                if dist < best_dist:
-                    best_dist = dist
-                    best_slot = slot
-            index_flat[i] = best_slot
-
-    index_map = index_flat.reshape(h, w)
-    out = Image.new("P", (w, h))
-    pal_data = list(output_bg.to_tuple())
-    for c in palette_colors[1:]:
-        pal_data += list(c.to_tuple())
-    pal_data += [0] * (768 - len(pal_data))
-    out.putpalette(pal_data)
-    out.putdata(index_map.flatten().tolist())
-    out.info["transparency"] = 0
-    return out
+    index_map = render_slots(px, input_bg_rgb, slot_map)
+    return indexed_image(index_map, [output_bg] + list(palette_colors[1:]))
 
 
 def _public_result(result: dict) -> dict:
@@ -195,19 +230,23 @@ def _extract_group(
     n_colors: int,
     output_bg: Color,
     shared_threshold: float = DEFAULT_THRESHOLD,
+    per_sprite_palettes: list[Palette] | None = None,
 ) -> dict:
+    """
+    Align and render one group. per_sprite_palettes: already extracted palettes
+    (one per sprite, same order); extracted here when omitted.
+    """
     h, w = sprites[0]["px"].shape[:2]
 
     # Use state.extractor for each sprite — guarantees clean palettes
-    per_sprite_palettes: list[Palette] = []
-    per_sprite_bg: list[np.ndarray]    = []
-
-    for sprite in sprites:
-        bg_color = sprite["input_bg"]
-        bg_rgb   = np.array(_parse_hex(bg_color).to_tuple(), dtype=np.uint8)
-        per_sprite_bg.append(bg_rgb)
-        pal = _extract_palette_for_sprite(sprite["raw"], sprite["name"] + ".png", n_colors, bg_color)
-        per_sprite_palettes.append(pal)
+    if per_sprite_palettes is None:
+        per_sprite_palettes = [
+            _extract_palette_for_sprite(sprite["raw"], sprite["name"] + ".png", n_colors, sprite["input_bg"])
+            for sprite in sprites
+        ]
+    per_sprite_bg: list[np.ndarray] = [
+        np.array(_parse_hex(sprite["input_bg"]).to_tuple(), dtype=np.uint8) for sprite in sprites
+    ]
 
     per_sprite_slot_maps, shared_indices = _build_aligned_palette(
         per_sprite_palettes, n_colors, output_bg, shared_threshold
@@ -272,13 +311,11 @@ def _extract_group(
     }
 
 
-def _build_groups(
+def _group_sprites(
     sprites: list[dict],
-    n_colors: int,
-    output_bg: Color,
-    shared_threshold: float = DEFAULT_THRESHOLD,
     group_assignments: dict[str, str] | None = None,
-) -> list[dict]:
+) -> list[list[dict]]:
+    """Split sprites by manual assignment or silhouette, largest group first."""
     groups: dict[str, list[dict]] = {}
 
     for sprite in sprites:
@@ -292,19 +329,52 @@ def _build_groups(
 
         groups.setdefault(gid, []).append(sprite)
 
-    unsorted = []
-    for gid, group_sprites in groups.items():
-        group_data = _extract_group(group_sprites, n_colors, output_bg, shared_threshold)
-        unsorted.append(group_data)
+    return sorted(groups.values(), key=len, reverse=True)
 
-    unsorted.sort(key=lambda g: -len(g["results"]))
 
-    result_groups = []
-    for i, group_data in enumerate(unsorted):
-        group_data["group_id"] = f"shape_{i + 1}"
-        result_groups.append(group_data)
+async def _iter_groups(
+    sprites: list[dict],
+    n_colors: int,
+    output_bg: Color,
+    shared_threshold: float = DEFAULT_THRESHOLD,
+    group_assignments: dict[str, str] | None = None,
+) -> AsyncIterator[tuple[int, dict]]:
+    """
+    Yield (position, group) as each group finishes, where position is the
+    group's place in the largest-first order and its id is shape_<position + 1>.
+
+    Every sprite palette is a compute task; a group is aligned and rendered
+    in one more task once its last sprite palette is in. Raises whatever
+    extraction raises (ValueError for unusable sprites); closing the iterator
+    cancels the tasks that have not started.
+    """
+    grouped = await run_compute_waiting(_group_sprites, sprites, group_assignments)
+    limit   = asyncio.Semaphore(ITEM_WORKERS)
+
+    async def build(position: int, members: list[dict]) -> tuple[int, dict]:
+        palettes   = await _extract_palettes(members, n_colors, limit)
+        group_data = await _on_pool(limit, _extract_group, members, n_colors, output_bg, shared_threshold, palettes)
+        group_data["group_id"] = f"shape_{position + 1}"
+        return position, group_data
+
+    tasks = [asyncio.ensure_future(build(position, members)) for position, members in enumerate(grouped)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
 
-    return result_groups
+
+async def _build_groups(
+    sprites: list[dict],
+    n_colors: int,
+    output_bg: Color,
+    shared_threshold: float = DEFAULT_THRESHOLD,
+    group_assignments: dict[str, str] | None = None,
+) -> list[dict]:
+    finished = [item async for item in _iter_groups(sprites, n_colors, output_bg, shared_threshold, group_assignments)]
+    return [group_data for _position, group_data in sorted(finished, key=lambda item: item[0])]
 
 
 # ---------------------------------------------------------------------------
@@ -338,71 +408,28 @@ def _extract_variants(
     ref_slot_map: dict[tuple, int] = {c.to_tuple(): i + 1 for i, c in enumerate(ref_colors)}
     ref_bg_rgb = np.array(_parse_hex(ref_bg).to_tuple(), dtype=np.uint8)
 
-    h, w      = ref["px"].shape[:2]
-    ref_rgb   = ref["px"][:, :, :3]
-    ref_alpha = ref["px"][:, :, 3]
-
-    # Build per-pixel slot index image from reference
-    ref_slot_image = np.zeros((h, w), dtype=np.int32)
-    for row in range(h):
-        for col in range(w):
-            a      = ref_alpha[row, col]
-            px_rgb = tuple(ref_rgb[row, col].tolist())
-            if a < 255 or np.all(ref_rgb[row, col] == ref_bg_rgb):
-                ref_slot_image[row, col] = 0
-            elif px_rgb in ref_slot_map:
-                ref_slot_image[row, col] = ref_slot_map[px_rgb]
-            else:
-                best_slot, best_dist = 1, float('inf')
-                r, g, b = px_rgb
-                for rc, slot in ref_slot_map.items():
-                    d = (r-rc[0])**2 + (g-rc[1])**2 + (b-rc[2])**2
-                    if d < best_dist:
-                        best_dist, best_slot = d, slot
-                ref_slot_image[row, col] = best_slot
+    # Per-pixel slot index image from reference
+    ref_slot_image = render_slots(ref["px"], ref_bg_rgb, ref_slot_map)
 
     results = []
 
     for sprite in sprites:
         sp_bg_rgb = np.array(_parse_hex(sprite["input_bg"]).to_tuple(), dtype=np.uint8)
-        sp_rgb    = sprite["px"][:, :, :3]
-        sp_alpha  = sprite["px"][:, :, 3]
-
-        # For each slot, collect all variant pixel colors at that position and take majority
-        slot_colors: dict[int, dict[tuple, int]] = {i: {} for i in range(1, len(ref_colors) + 1)}
-
-        for row in range(h):
-            for col in range(w):
-                slot = ref_slot_image[row, col]
-                if slot == 0:
-                    continue
-                if sp_alpha[row, col] < 255:
-                    continue
-                c = tuple(sp_rgb[row, col].tolist())
-                if np.all(sp_rgb[row, col] == sp_bg_rgb):
-                    continue
-                slot_colors[slot][c] = slot_colors[slot].get(c, 0) + 1
+
+        # For each slot, take the majority variant color at that slot's positions
+        slot_colors = majority_colors(sprite["px"], sp_bg_rgb, ref_slot_image, len(ref_colors))
 
         # Build variant palette using the ref slot structure
         variant_colors: list[Color] = [output_bg]
-        for slot_i in range(1, len(ref_colors) + 1):
-            freq = slot_colors[slot_i]
-            if freq:
-                best_color = max(freq, key=freq.get)
-                variant_colors.append(Color(best_color[0], best_color[1], best_color[2]))
+        for slot_i, best_color in enumerate(slot_colors):
+            if best_color is not None:
+                variant_colors.append(Color(*best_color))
             else:
                 # No pixels mapped here — fall back to the ref color for this slot
-                variant_colors.append(ref_colors[slot_i - 1])
+                variant_colors.append(ref_colors[slot_i])
 
         # Render using the reference slot image (same pixel→slot mapping for all variants)
-        out_img = Image.new("P", (w, h))
-        pal_data = list(output_bg.to_tuple())
-        for c in variant_colors[1:]:
-            pal_data += list(c.to_tuple())
-        pal_data += [0] * (768 - len(pal_data))
-        out_img.putpalette(pal_data)
-        out_img.putdata(ref_slot_image.flatten().tolist())
-        out_img.info["transparency"] = 0
+        out_img = indexed_image(ref_slot_image, variant_colors)
 
         pal_object = Palette(name=sprite["name"], colors=variant_colors)
 
@@ -443,7 +470,17 @@ async def extract_item_palettes(
     output_bg_color: str    = Form(default=DEFAULT_BG),
     shared_threshold: float = Form(default=DEFAULT_THRESHOLD),
     group_assignments: str  = Form(default="{}"),
+    stream: bool            = Form(default=False),
 ):
+    """
+    Group sprites by shape and extract slot-aligned palettes per group.
+    stream=true: NDJSON, one group per line as soon as it is done (any order,
+    group_id tells where it goes), then {"artifact_id": ...}; a failure ends
+    the stream with {"error": ...} instead.
+
+    The artifact_id lets /download-all and /download-group build their zips
+    without a re-upload.
+    """
     if not files:
         raise HTTPException(400, "At least one file required")
 
@@ -458,45 +495,99 @@ async def extract_item_palettes(
 
     output_bg   = _parse_hex(output_bg_color)
     files_data  = [(f.filename, await f.read()) for f in files]
-    sprites     = _load_sprites(files_data, input_bgs)
+    sprites     = await run_compute(_load_sprites, files_data, input_bgs)
+    built = {
+        "n_colors":         n_colors,
+        "output_bg_color":  output_bg.to_hex(),
+        "shared_threshold": shared_threshold,
+        "input_bg_colors":  list(zip([s["name"] for s in sprites], _input_bgs(input_bgs, len(sprites)))),
+    }
+
+    if stream:
+        async def lines():
+            finished = []
+            try:
+                async for position, group in _iter_groups(
+                    sprites, n_colors, output_bg, shared_threshold, group_assign_map
+                ):
+                    finished.append((position, group))
+                    yield json.dumps(_public_group(group)) + "\n"
+            except ValueError as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+                return
+            groups = [group for _position, group in sorted(finished, key=lambda item: item[0])]
+            artifact_id = artifact_store.put("items.groups", {"built": built, "groups": groups})
+            yield json.dumps({"artifact_id": artifact_id}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
     try:
-        groups = _build_groups(sprites, n_colors, output_bg, shared_threshold, group_assign_map)
+        groups = await _build_groups(sprites, n_colors, output_bg, shared_threshold, group_assign_map)
     except ValueError as e:
         raise HTTPException(400, str(e))
 
-    return {"groups": [_public_group(group) for group in groups]}
+    return {
+        "groups":      [_public_group(group) for group in groups],
+        "artifact_id": artifact_store.put("items.groups", {"built": built, "groups": groups}),
+    }
 
 
 @router.post("/download-all")
 async def download_all_item_palettes(
-    files: list[UploadFile] = File(...),
-    n_colors: int           = Form(default=15),
-    input_bg_colors: str    = Form(default="[]"),
-    output_bg_color: str    = Form(default=DEFAULT_BG),
-    group_names: str        = Form(default="{}"),
-    shared_threshold: float = Form(default=DEFAULT_THRESHOLD),
-    group_assignments: str  = Form(default="{}"),
+    files: list[UploadFile] | None  = File(default=None),
+    n_colors: int | None            = Form(default=None),
+    input_bg_colors: str | None     = Form(default=None),
+    output_bg_color: str | None     = Form(default=None),
+    group_names: str                = Form(default="{}"),
+    shared_threshold: float | None  = Form(default=None),
+    group_assignments: str | None   = Form(default=None),
+    artifact_id: str | None         = Form(default=None),
 ):
-    shared_threshold = max(0.0, min(1.0, shared_threshold))
+    """
+    Zip every group's palettes. With artifact_id (from /extract) nothing is
+    re-uploaded or re-extracted; the settings that are sent must match the
+    artifact's (409 otherwise).
+    """
+    if shared_threshold is not None:
+        shared_threshold = max(0.0, min(1.0, shared_threshold))
 
     try:
-        input_bgs        = json.loads(input_bg_colors)
+        input_bgs        = json.loads(input_bg_colors or "[]")
         gnames           = json.loads(group_names)
-        group_assign_map = json.loads(group_assignments)
+        group_assign_map = json.loads(group_assignments or "{}")
     except Exception:
         input_bgs        = []
         gnames           = {}
         group_assign_map = {}
 
-    output_bg  = _parse_hex(output_bg_color)
-    files_data = [(f.filename, await f.read()) for f in files]
-    sprites    = _load_sprites(files_data, input_bgs)
+    if artifact_id:
+        artifact = load_artifact(artifact_id, "items.groups")
+        built    = artifact["built"]
+        groups   = artifact["groups"]
+        _check_artifact(
+            {**built, "input_bg_colors": [bg for _name, bg in built["input_bg_colors"]]},
+            {
+                "n_colors":         n_colors,
+                "output_bg_color":  bg_hex(output_bg_color, "output_bg_color"),
+                "shared_threshold": shared_threshold,
+                "input_bg_colors":  None if input_bg_colors is None
+                                    else _input_bgs(input_bgs, len(built["input_bg_colors"])),
+            },
+        )
+        _check_grouping(groups, group_assign_map)
+    else:
+        if not files:
+            raise HTTPException(400, "Either files or artifact_id is required")
+        n_colors         = DEFAULT_N_COLORS if n_colors is None else n_colors
+        shared_threshold = DEFAULT_THRESHOLD if shared_threshold is None else shared_threshold
+        output_bg  = _parse_hex(output_bg_color or DEFAULT_BG)
+        files_data = [(f.filename, await f.read()) for f in files]
+        sprites    = await run_compute(_load_sprites, files_data, input_bgs)
 
-    try:
-        groups = _build_groups(sprites, n_colors, output_bg, shared_threshold, group_assign_map)
-    except ValueError as e:
-        raise HTTPException(400, str(e))
+        try:
+            groups = await _build_groups(sprites, n_colors, output_bg, shared_threshold, group_assign_map)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
 
     zip_buf  = io.BytesIO()
     manifest = {"groups": []}
@@ -534,34 +625,65 @@ async def download_all_item_palettes(
 
 @router.post("/download-group")
 async def download_group_palettes(
-    files: list[UploadFile] = File(...),
-    n_colors: int           = Form(default=15),
-    input_bg_colors: str    = Form(default="[]"),
-    output_bg_color: str    = Form(default=DEFAULT_BG),
-    shared_threshold: float = Form(default=DEFAULT_THRESHOLD),
-    group_assignments: str  = Form(default="{}"),
-    group_name: str         = Form(default="group"),
+    files: list[UploadFile] | None  = File(default=None),
+    n_colors: int | None            = Form(default=None),
+    input_bg_colors: str | None     = Form(default=None),
+    output_bg_color: str | None     = Form(default=None),
+    shared_threshold: float | None  = Form(default=None),
+    group_assignments: str | None   = Form(default=None),
+    group_name: str                 = Form(default="group"),
+    artifact_id: str | None         = Form(default=None),
+    group_id: str | None            = Form(default=None),
 ):
-    shared_threshold = max(0.0, min(1.0, shared_threshold))
+    """
+    Zip one group's palettes and sprites. artifact_id + group_id reuse the
+    /extract results; input_bg_colors and group_assignments then cover just
+    that group's sprites, and the settings that are sent must match the
+    artifact's (409 otherwise).
+    """
+    if shared_threshold is not None:
+        shared_threshold = max(0.0, min(1.0, shared_threshold))
 
     try:
-        input_bgs        = json.loads(input_bg_colors)
-        group_assign_map = json.loads(group_assignments)
+        input_bgs        = json.loads(input_bg_colors or "[]")
+        group_assign_map = json.loads(group_assignments or "{}")
     except Exception:
         input_bgs        = []
         group_assign_map = {}
 
-    output_bg  = _parse_hex(output_bg_color)
-    files_data = [(f.filename, await f.read()) for f in files]
-    sprites    = _load_sprites(files_data, input_bgs)
+    if artifact_id:
+        artifact   = load_artifact(artifact_id, "items.groups")
+        group_data = next((g for g in artifact["groups"] if g["group_id"] == group_id), None)
+        if group_data is None:
+            raise HTTPException(404, f"Group '{group_id}' not found in artifact")
+        built   = artifact["built"]
+        members = {r["name"] for r in group_data["results"]}
+        group_bgs = [bg for name, bg in built["input_bg_colors"] if name in members]
+        _check_artifact(
+            {**built, "input_bg_colors": group_bgs},
+            {
+                "n_colors":         n_colors,
+                "output_bg_color":  bg_hex(output_bg_color, "output_bg_color"),
+                "shared_threshold": shared_threshold,
+                "input_bg_colors":  None if input_bg_colors is None else _input_bgs(input_bgs, len(group_bgs)),
+            },
+        )
+        _check_grouping([group_data], group_assign_map)
+    else:
+        n_colors         = DEFAULT_N_COLORS if n_colors is None else n_colors
+        shared_threshold = DEFAULT_THRESHOLD if shared_threshold is None else shared_threshold
+        output_bg  = _parse_hex(output_bg_color or DEFAULT_BG)
+        files_data = [(f.filename, await f.read()) for f in files or []]
+        sprites    = await run_compute(_load_sprites, files_data, input_bgs)
 
-    if not sprites:
-        raise HTTPException(400, "No sprites provided")
+        if not sprites:
+            raise HTTPException(400, "No sprites provided")
 
-    try:
-        group_data = _extract_group(sprites, n_colors, output_bg, shared_threshold)
-    except ValueError as e:
-        raise HTTPException(400, str(e))
+        try:
+            palettes   = await _extract_palettes(sprites, n_colors)
+            group_data = await run_compute(_extract_group, sprites, n_colors, output_bg, shared_threshold, palettes)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
 
     label = group_name or "group"
 
@@ -610,7 +732,7 @@ async def extract_variants(
 
     output_bg  = _parse_hex(output_bg_color)
     files_data = [(f.filename, await f.read()) for f in files]
-    sprites    = _load_sprites(files_data, input_bgs)
+    sprites    = await run_compute(_load_sprites, files_data, input_bgs)
 
     h0, w0 = sprites[0]["px"].shape[:2]
     for s in sprites[1:]:
@@ -622,50 +744,89 @@ async def extract_variants(
                 f"'{sprites[0]['name']}' is {w0}×{h0} but '{s['name']}' is {w}×{h}."
             )
 
-    ref_idx = max(0, min(reference_index, len(sprites) - 1))
+    built = {
+        "n_colors":        n_colors,
+        "output_bg_color": output_bg.to_hex(),
+        "input_bg_colors": _input_bgs(input_bgs, len(sprites)),
+        "reference_index": max(0, min(reference_index, len(sprites) - 1)),
+    }
+
+    ref_idx = built["reference_index"]
     if ref_idx != 0:
         sprites.insert(0, sprites.pop(ref_idx))
 
     try:
-        results = _extract_variants(sprites, n_colors, output_bg)
+        results = await run_compute(_extract_variants, sprites, n_colors, output_bg)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(400, str(e))
 
-    return {"reference": sprites[0]["name"], "results": [_public_result(r) for r in results]}
+    artifact_id = artifact_store.put("items.variants", {
+        "reference": sprites[0]["name"],
+        "results":   results,
+        "built":     built,
+    })
+    return {
+        "reference":   sprites[0]["name"],
+        "results":     [_public_result(r) for r in results],
+        "artifact_id": artifact_id,
+    }
 
 
 @router.post("/extract-variants/download")
 async def download_variants(
-    files: list[UploadFile] = File(...),
-    n_colors: int           = Form(default=15),
-    input_bg_colors: str    = Form(default="[]"),
-    output_bg_color: str    = Form(default=DEFAULT_BG),
-    reference_index: int    = Form(default=0),
+    files: list[UploadFile] | None = File(default=None),
+    n_colors: int | None           = Form(default=None),
+    input_bg_colors: str | None    = Form(default=None),
+    output_bg_color: str | None    = Form(default=None),
+    reference_index: int | None    = Form(default=None),
+    artifact_id: str | None        = Form(default=None),
 ):
-    if not files:
-        raise HTTPException(400, "At least one file required")
-
+    """
+    Zip variant palettes and sprites. With artifact_id (from /extract-variants)
+    nothing is recomputed; the settings that are sent must match the
+    artifact's (409 otherwise).
+    """
     try:
-        input_bgs = json.loads(input_bg_colors)
+        input_bgs = json.loads(input_bg_colors or "[]")
     except Exception:
         input_bgs = []
 
-    output_bg  = _parse_hex(output_bg_color)
-    files_data = [(f.filename, await f.read()) for f in files]
-    sprites    = _load_sprites(files_data, input_bgs)
+    if artifact_id:
+        variants       = load_artifact(artifact_id, "items.variants")
+        results        = variants["results"]
+        reference_name = variants["reference"]
+        built          = variants["built"]
+        count          = len(built["input_bg_colors"])
+        _check_artifact(built, {
+            "n_colors":        n_colors,
+            "output_bg_color": bg_hex(output_bg_color, "output_bg_color"),
+            "input_bg_colors": None if input_bg_colors is None else _input_bgs(input_bgs, count),
+            "reference_index": None if reference_index is None else max(0, min(reference_index, count - 1)),
+        })
+    else:
+        if not files:
+            raise HTTPException(400, "At least one file required")
 
-    h0, w0 = sprites[0]["px"].shape[:2]
-    for s in sprites[1:]:
-        h, w = s["px"].shape[:2]
-        if h != h0 or w != w0:
-            raise HTTPException(400, f"Dimension mismatch: '{s['name']}' is {w}×{h}, expected {w0}×{h0}.")
+        n_colors        = DEFAULT_N_COLORS if n_colors is None else n_colors
+        reference_index = reference_index or 0
+        output_bg  = _parse_hex(output_bg_color or DEFAULT_BG)
+        files_data = [(f.filename, await f.read()) for f in files]
+        sprites    = await run_compute(_load_sprites, files_data, input_bgs)
 
-    ref_idx = max(0, min(reference_index, len(sprites) - 1))
-    if ref_idx != 0:
-        sprites.insert(0, sprites.pop(ref_idx))
+        h0, w0 = sprites[0]["px"].shape[:2]
+        for s in sprites[1:]:
+            h, w = s["px"].shape[:2]
+            if h != h0 or w != w0:
+                raise HTTPException(400, f"Dimension mismatch: '{s['name']}' is {w}×{h}, expected {w0}×{h0}.")
 
-    results        = _extract_variants(sprites, n_colors, output_bg)
-    reference_name = sprites[0]["name"]
+        ref_idx = max(0, min(reference_index, len(sprites) - 1))
+        if ref_idx != 0:
+            sprites.insert(0, sprites.pop(ref_idx))
+
+        results        = await run_compute(_extract_variants, sprites, n_colors, output_bg)
+        reference_name = sprites[0]["name"]
 
     zip_buf = io.BytesIO()
     with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
@@ -721,46 +882,51 @@ async def download_apply_variants(
             raise HTTPException(400, f"Invalid palette JSON for {name}")
 
     sprite_data   = await sprite_file.read()
-    sprite_px     = _load_rgba(sprite_data)
     stem          = Path(sprite_file.filename).stem
-    output_bg     = ref_colors[0]
-    output_bg_rgb = np.array(output_bg.to_tuple(), dtype=np.uint8)
 
-    slot_map: dict[tuple, int] = {
-        c.to_tuple(): i + 1 for i, c in enumerate(ref_colors[1:], start=0)
-    }
+    def build_zip() -> io.BytesIO:
+        sprite_px     = _load_rgba(sprite_data)
+        output_bg     = ref_colors[0]
+        output_bg_rgb = np.array(output_bg.to_tuple(), dtype=np.uint8)
 
-    zip_buf        = io.BytesIO()
-    manifest_files = []
+        slot_map: dict[tuple, int] = {
+            c.to_tuple(): i + 1 for i, c in enumerate(ref_colors[1:], start=0)
+        }
 
-    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        for pal_name, pal_colors_list in palettes:
-            # Align variant palette length to ref
-            variant_palette = list(pal_colors_list)
-            while len(variant_palette) < len(ref_colors):
-                variant_palette.append(output_bg)
-            variant_palette = variant_palette[:len(ref_colors)]
-
-            out_img   = _render_sprite(sprite_px, output_bg_rgb, slot_map, variant_palette, output_bg)
-            safe_name = pal_name.replace('.pal', '')
-            pal_obj   = Palette(name=safe_name, colors=variant_palette)
-
-            zf.writestr(f"sprites/{safe_name}.png",  save_png(out_img))
-            zf.writestr(f"palettes/{safe_name}.pal", make_pal_content(pal_obj))
-            manifest_files.append({
-                "name":    safe_name,
-                "sprite":  f"sprites/{safe_name}.png",
-                "palette": f"palettes/{safe_name}.pal",
-            })
+        zip_buf        = io.BytesIO()
+        manifest_files = []
+
+        with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for pal_name, pal_colors_list in palettes:
+                # Align variant palette length to ref
+                variant_palette = list(pal_colors_list)
+                while len(variant_palette) < len(ref_colors):
+                    variant_palette.append(output_bg)
+                variant_palette = variant_palette[:len(ref_colors)]
+
+                out_img   = _render_sprite(sprite_px, output_bg_rgb, slot_map, variant_palette, output_bg)
+                safe_name = pal_name.replace('.pal', '')
+                pal_obj   = Palette(name=safe_name, colors=variant_palette)
+
+                zf.writestr(f"sprites/{safe_name}.png",  save_png(out_img))
+                zf.writestr(f"palettes/{safe_name}.pal", make_pal_content(pal_obj))
+                manifest_files.append({
+                    "name":    safe_name,
+                    "sprite":  f"sprites/{safe_name}.png",
+                    "palette": f"palettes/{safe_name}.pal",
+                })
+
+            manifest = {
+                "sprite":            sprite_file.filename,
+                "reference_palette": pal_names[0] if pal_names else "",
+                "files":             manifest_files,
+            }
+            zf.writestr("manifest.json", json.dumps(manifest, indent=2))
 
-        manifest = {
-            "sprite":            sprite_file.filename,
-            "reference_palette": pal_names[0] if pal_names else "",
-            "files":             manifest_files,
-        }
-        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+        zip_buf.seek(0)
+        return zip_buf
 
-    zip_buf.seek(0)
+    zip_buf = await run_compute(build_zip)
     return StreamingResponse(
         zip_buf,
         media_type="application/zip",
@@ -9,7 +9,6 @@ import os
 import re
 import subprocess
 import sys
-import tempfile
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
@@ -203,6 +202,20 @@ def _resolve_base(path_str: str) -> tuple[Path, Path]:
     return LIBRARY_DIR, resolved
 
 
+def resolve_project_folder(path_str: str) -> Path:
+    """
+    Absolute directory for a virtual path inside a loaded project folder
+    ("{fid}" or "{fid}/{subdir}", see _resolve_base). 404 if it is not one.
+    """
+    if _fid_for_path(path_str) is None:
+        raise HTTPException(404, f"Not a loaded project folder: {path_str!r}")
+    base, target = _resolve_base(path_str)
+    _guard_path(base, target)
+    if not target.is_dir():
+        raise HTTPException(404, f"Project folder not found: {path_str!r}")
+    return target
+
+
 def _proj_path(fid: str, abs_folder: Path, file_abs: Path) -> str:
     """Build the virtual path for a file inside a project folder."""
     try:
@@ -466,7 +479,6 @@ class GeneratePaletteBody(BaseModel):
 
 @router.post("/items/generate-palette")
 def generate_item_palette(body: GeneratePaletteBody):
-    import shutil as _shutil
     base, sprite_path = _resolve_base(body.sprite_path)
     _guard_path(base, sprite_path)
     if not sprite_path.exists():
@@ -475,20 +487,13 @@ def generate_item_palette(body: GeneratePaletteBody):
     base2, dest_path = _resolve_base(body.expected_palette_path)
     dest_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        _shutil.copy2(sprite_path, tmp.name)
-        tmp_path = tmp.name
-
-    try:
-        palette, _method = state.extractor.extract(
-            tmp_path,
-            n_colors=body.n_colors,
-            bg_color=body.bg_color,
-            color_space="oklab",
-            name=sprite_path.stem,
-        )
-    finally:
-        os.unlink(tmp_path)
+    palette, _method = state.extractor.extract(
+        sprite_path,
+        n_colors=body.n_colors,
+        bg_color=body.bg_color,
+        color_space="oklab",
+        name=sprite_path.stem,
+    )
 
     lines = ["JASC-PAL", "0100", str(len(palette.colors))]
     lines += [f"{c.r} {c.g} {c.b}" for c in palette.colors]
@@ -526,7 +531,7 @@ def import_palette(body: ImportBody):
         dest = dest_dir / f"{target.stem}_{counter}.pal"
         counter += 1
     dest.write_bytes(target.read_bytes())
-    state.palette_manager.reload()
+    state.palette_manager.sync_path(dest)
     return {"imported": dest.name, "folder": body.target_folder}
 
 
@@ -548,15 +553,16 @@ def import_folder(body: ImportFolderBody):
         dest_dir = dest_dir / folder.name
     dest_dir.mkdir(parents=True, exist_ok=True)
     imported = []
-    for pal_file in sorted(folder.rglob("*.pal")):
-        dest = dest_dir / pal_file.name
-        counter = 1
-        while dest.exists():
-            dest = dest_dir / f"{pal_file.stem}_{counter}.pal"
-            counter += 1
-        dest.write_bytes(pal_file.read_bytes())
-        imported.append(dest.name)
-    state.palette_manager.reload()
+    with state.palette_manager.batch() as palettes:
+        for pal_file in sorted(folder.rglob("*.pal")):
+            dest = dest_dir / pal_file.name
+            counter = 1
+            while dest.exists():
+                dest = dest_dir / f"{pal_file.stem}_{counter}.pal"
+                counter += 1
+            dest.write_bytes(pal_file.read_bytes())
+            palettes.sync_path(dest)
+            imported.append(dest.name)
     return {"imported": imported, "count": len(imported)}
 
 
@@ -80,7 +80,7 @@ async def upload_palette(
     dest_dir.mkdir(parents=True, exist_ok=True)
     dest = dest_dir / file.filename
     dest.write_bytes(await file.read())
-    state.palette_manager.reload()
+    state.palette_manager.sync_path(dest)
     return {"uploaded": file.filename, "folder": folder, "source": "user"}
 
 
@@ -96,7 +96,6 @@ def create_folder(body: FolderBody):
         raise HTTPException(400, "Invalid folder name")
     folder = USER_DIR / name
     folder.mkdir(parents=True, exist_ok=True)
-    state.palette_manager.reload()
     return {"created": name}
 
 
@@ -110,7 +109,6 @@ def delete_folder(name: str):
     if pals:
         raise HTTPException(400, f"Folder '{name}' still contains {len(pals)} palette(s)")
     folder.rmdir()
-    state.palette_manager.reload()
     return {"deleted": name}
 
 
@@ -138,7 +136,9 @@ def rename_palette(palette_path: str, body: RenameBody):
         raise HTTPException(409, f"A palette named '{new_filename}' already exists in this folder")
 
     path.rename(new_path)
-    state.palette_manager.reload()
+    with state.palette_manager.batch() as palettes:
+        palettes.sync(palette_path)
+        palettes.sync_path(new_path)
     return {"renamed": new_filename}
 
 
@@ -167,7 +167,9 @@ def move_palette(palette_path: str, body: MoveBody):
         raise HTTPException(409, f"A palette named '{path.name}' already exists in the target folder")
 
     path.rename(new_path)
-    state.palette_manager.reload()
+    with state.palette_manager.batch() as palettes:
+        palettes.sync(palette_path)
+        palettes.sync_path(new_path)
     new_key = f"{body.target_folder}/{path.name}" if body.target_folder else path.name
     return {"moved": new_key}
 
@@ -196,7 +198,7 @@ def update_palette_colors(palette_path: str, body: ColorsBody):
         lines.append(f"{r} {g} {b}")
     path.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
-    state.palette_manager.reload()
+    state.palette_manager.sync(palette_path)
     return {"updated": palette_path}
 
 
@@ -223,5 +225,5 @@ def delete_palette(palette_path: str):
     if not path or not path.exists():
         raise HTTPException(404, f"Palette '{palette_path}' not found")
     path.unlink()
-    state.palette_manager.reload()
+    state.palette_manager.sync(palette_path)
     return {"deleted": palette_path}
\ No newline at end of file
@@ -13,11 +13,59 @@ convert  — remaps pixels to nearest palette colors
 Job lifecycle
 -------------
 POST   /api/pipeline/run               → { job_id }
+POST   /api/pipeline/run-project       → { job_id, total, to_build, skipped }  (incremental, see below)
 GET    /api/pipeline/status/{job_id}   → { status, done, total, current_file, results }
+                                         ?since=N → only results[N:], plus "next" cursor
+GET    /api/pipeline/events/{job_id}   → Server-Sent Events: one "file" event per result, then "end"
+POST   /api/pipeline/cancel/{job_id}   → stop a running job (keeps what is committed)
+POST   /api/pipeline/resume/{job_id}   → continue an interrupted or cancelled job
 POST   /api/pipeline/preview           → { previews }
-GET    /api/pipeline/download/{job_id} → zip stream
+GET    /api/pipeline/download/{job_id} → zip stream (partial while the job is running)
 DELETE /api/pipeline/{job_id}          → cleanup
 
+Execution
+---------
+Files fan out over a ProcessPoolExecutor (PORYPAL_PIPELINE_WORKERS / main.py
+--pipeline-workers; default one per CPU, 1 = inline). Workers are spawned, not
+forked, and at most PORYPAL_PIPELINE_POOL_JOBS jobs (default 1) run a pool at
+once; the others wait for a slot. The job thread never blocks on its workers
+for more than POOL_POLL_S, so a cancel or max_seconds ends the job even if a
+worker hangs: it gets CANCEL_GRACE_S to finish its step, then is terminated. The step list is
+compiled once per job into a PipelinePlan (compile_plan): parameters are
+validated, loaded palettes resolved with their stacked Oklab colors, and
+tileset presets parsed into TilesetManager configs. An invalid step list is
+rejected with 400 by /run, /resume and /preview before any file is touched.
+The plan is shipped to each worker by the pool initializer. Workers only
+compute; the job thread writes sprites and palettes in input order, so output
+names and de-duplication do not depend on which worker finishes first.
+
+Inputs with identical decoded pixels are computed once per job (the key also
+covers PipelinePlan.digest()); the duplicates reuse the first file's result
+under their own names and are marked deduplicated_from in status, events and
+the manifest, whose summary reports deduplicated / compute_saved_ms.
+
+Each written file is recorded as a zip entry; the download route zips them on
+the fly, so nothing is staged twice on disk.
+
+/run-project reads its inputs from a loaded project folder (projects.json)
+instead of uploads and runs like an incremental build: every file gets a
+fingerprint (input bytes + PipelinePlan.digest(), which covers the referenced
+palettes' colors and presets' configs), and files whose fingerprint is already
+in server/build_cache.py are committed from the cache instead of re-run.
+Outputs mirror the folder tree.
+
+Jobs created by /run are mirrored into server/job_store.py (SQLite), with the
+uploads kept in <work_dir>/inputs, so status/download survive a restart and a
+job interrupted by one can be resumed. Statuses: running, done, error,
+interrupted, cancelled.
+
+Cancellation is cooperative: workers check the job's cancel flag before each
+step, the job thread before committing each file. Per-job limits come from
+PORYPAL_PIPELINE_MAX_FILES / _MAX_PIXELS / _MAX_SECONDS / _MAX_WORK_MB (see
+PipelineLimits; /run can only tighten them, and /resume keeps what /run set).
+Too many files or pixels is rejected up front with 400; running past the wall time or work_dir size
+cancels the job, and status reports the reason.
+
 Filename templating
 -------------------
 Pass `filename_template` and `palette_template` form fields to /run.
@@ -33,29 +81,42 @@ Defaults:
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import io
 import json
 import logging
+import multiprocessing
 import os
 import re
 import shutil
 import tempfile
 import threading
-import zipfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
 from uuid import uuid4
 
 import numpy as np
-from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import StreamingResponse
 from PIL import Image
 
-from model.image_manager import ImageManager, build_background_mask, detect_background_color
-from model.palette import Color
+from model.extract_cache import pixel_digest
+from model.image_manager import (
+    CONFLICT_MODES, SUPPORTED_FORMATS, build_background_mask, choose_best, convert, detect_background_color,
+)
+from model.palette import Color, Palette
 from model.palette_extractor import PaletteExtractor
+from model.palette_lut import get_palette_lut, stack_palettes
 from model.tileset_manager import TilesetManager
-from server.helpers import copy_without_transparency, pil_to_b64, save_png
+from server.api.library import resolve_project_folder
+from server.build_cache import BuildEntry, build_cache, fingerprint
+from server.helpers import copy_without_transparency, pil_to_b64, save_png, stream_zip
+from server.job_store import dir_size, input_path, job_store
 from server.preset_store import load_preset
 from server.state import state
 
@@ -63,9 +124,31 @@ router = APIRouter(prefix="/api/pipeline", tags=["pipeline"])
 
 _jobs: dict[str, dict] = {}
 _jobs_lock = threading.Lock()
+# job_id → (loop, event) of each /events stream waiting for news; set by _notify_progress
+_progress_waiters: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+_cancel_events: dict[str, Any] = {}   # job_id → multiprocessing.Event shared with the job's workers
+
+SSE_HEARTBEAT_S = 15.0
 
 PORYPAL_VERSION = "3.3.0"
 
+# Worker processes per /run job (also settable with main.py --pipeline-workers).
+# 1 runs files inline in the background task.
+PIPELINE_WORKERS_ENV = "PORYPAL_PIPELINE_WORKERS"
+
+# Jobs that may run a worker pool at the same time; later ones wait for a slot,
+# so the server never runs more than this many × PIPELINE_WORKERS processes.
+PIPELINE_POOL_JOBS_ENV = "PORYPAL_PIPELINE_POOL_JOBS"
+
+# Workers are spawned, never forked: a forked child inherits every lock another
+# server thread holds at that moment (extraction / LUT caches, logging) and can
+# deadlock on its first step.
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+POOL_POLL_S    = 0.5    # how often the job thread re-checks the cancel flag while waiting on workers
+CANCEL_GRACE_S = 5.0    # after a cancel, how long in-flight files get before their workers are killed
+
 DEFAULT_FILENAME_TEMPLATE = "<name>"
 DEFAULT_PALETTE_TEMPLATE  = "<name>_<cs>"
 DEFAULT_BG_COLOR          = "#73C5A4"
@@ -119,10 +202,11 @@ def _run_extract_step(
     img: Image.Image,
     stem: str,
     step: dict,
-    pal_dir: Path,
-    palette_template: str = DEFAULT_PALETTE_TEMPLATE,
 ) -> tuple[Image.Image, Any]:
-    """Extract palette. Returns (unchanged image, Palette)."""
+    """
+    Extract palette. Returns (unchanged image, Palette).
+    Saving the .pal (step["save_palette"]) is left to the caller — see _write_palette_file.
+    """
     bg_mode  = step.get("bg_mode", "auto")
     bg_color = step.get("bg_color", "#73C5A4")
     if bg_mode == "auto":
@@ -133,49 +217,42 @@ def _run_extract_step(
     n_colors    = int(step.get("n_colors", 15))
     color_space = step.get("color_space", "oklab")
 
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        tmp.write(save_png(img))
-        tmp_path = tmp.name
-
-    try:
-        extractor = PaletteExtractor()
-        palette, _method = extractor.extract(
-            tmp_path,
-            n_colors=n_colors,
-            bg_color=bg_color,
-            color_space=color_space,
-            name=stem,
-        )
-    finally:
-        os.unlink(tmp_path)
-
-    if step.get("save_palette", True):
-        pal_dir.mkdir(parents=True, exist_ok=True)
-        base_name = _apply_template(palette_template, name=stem, cs=color_space)
-        filename  = f"{base_name}.pal"
-        dest      = pal_dir / filename
-        counter   = 1
-        while dest.exists():
-            dest = pal_dir / f"{base_name}_{counter}.pal"
-            counter += 1
-        lines = ["JASC-PAL", "0100", str(len(palette.colors))]
-        lines += [f"{c.r} {c.g} {c.b}" for c in palette.colors]
-        dest.write_text("\n".join(lines) + "\n", encoding="utf-8")
-        state.palette_manager.reload()
-
+    # The shared extractor's ExtractionCache: a worker process has its own
+    # memory tier, the disk tier (PORYPAL_EXTRACT_CACHE_DIR) is shared by all.
+    palette, _method = state.extractor.extract(
+        img,
+        n_colors=n_colors,
+        bg_color=bg_color,
+        color_space=color_space,
+        name=stem,
+    )
     return img, palette
 
 
-def _run_tileset_step(img: Image.Image, step: dict) -> Image.Image:
-    """Rearrange tiles according to a preset. Returns new image."""
-    preset_id = step.get("preset_id")
-    if not preset_id:
-        raise ValueError("Tileset step has no preset_id")
-
-    preset = load_preset(preset_id)
-    if not preset:
-        raise ValueError(f"Preset '{preset_id}' not found")
-
+def _write_palette_file(
+    pal_dir: Path,
+    palette: Any,
+    stem: str,
+    color_space: str,
+    palette_template: str = DEFAULT_PALETTE_TEMPLATE,
+) -> Path:
+    """Write an extracted palette as <palette_template>.pal, de-duplicating the name."""
+    pal_dir.mkdir(parents=True, exist_ok=True)
+    base_name = _apply_template(palette_template, name=stem, cs=color_space)
+    filename  = f"{base_name}.pal"
+    dest      = pal_dir / filename
+    counter   = 1
+    while dest.exists():
+        dest = pal_dir / f"{base_name}_{counter}.pal"
+        counter += 1
+    lines = ["JASC-PAL", "0100", str(len(palette.colors))]
+    lines += [f"{c.r} {c.g} {c.b}" for c in palette.colors]
+    dest.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return dest
+
+
+def _tileset_config(preset: dict) -> dict:
+    """TilesetManager config for a preset: tile geometry, slot order and output size."""
     tile_w = preset["tile_w"]
     tile_h = preset["tile_h"]
     cols   = preset["cols"]
@@ -185,7 +262,7 @@ def _run_tileset_step(img: Image.Image, step: dict) -> Image.Image:
     out_tile_w = preset.get("out_tile_w") or preset.get("resize_tile_w") or tile_w
     out_tile_h = preset.get("out_tile_h") or preset.get("resize_tile_h") or tile_h
 
-    config = {
+    return {
         "tileset": {
             "input_sprite_size": {"width": tile_w, "height": tile_h},
             "output_sprite_size": {"width": out_tile_w, "height": out_tile_h},
@@ -200,20 +277,36 @@ def _run_tileset_step(img: Image.Image, step: dict) -> Image.Image:
         },
     }
 
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        tmp.write(save_png(img))
-        tmp_path = tmp.name
 
-    try:
-        mgr = TilesetManager(config)
-        if not mgr.load(tmp_path):
-            raise ValueError("Failed to process tileset")
-        processed = mgr.get_processed()
-        if processed is None:
-            raise ValueError("Tileset step produced no image")
-        return processed
-    finally:
-        os.unlink(tmp_path)
+def _run_tileset_step(
+    img: Image.Image,
+    step: dict,
+    preset: dict | None = None,
+    config: dict | None = None,
+) -> Image.Image:
+    """
+    Rearrange tiles according to a preset. Returns new image.
+    preset: the already-loaded preset for step["preset_id"]; looked up when omitted.
+    config: its _tileset_config(), when precomputed by the job's plan.
+    """
+    if config is None:
+        if preset is None:
+            preset_id = step.get("preset_id")
+            if not preset_id:
+                raise ValueError("Tileset step has no preset_id")
+
+            preset = load_preset(preset_id)
+            if not preset:
+                raise ValueError(f"Preset '{preset_id}' not found")
+        config = _tileset_config(preset)
+
+    mgr = TilesetManager(config)
+    if not mgr.load(img):
+        raise ValueError("Failed to process tileset")
+    processed = mgr.get_processed()
+    if processed is None:
+        raise ValueError("Tileset step produced no image")
+    return processed
 
 
 def _run_background_step(img: Image.Image, step: dict) -> Image.Image:
@@ -243,52 +336,246 @@ def _run_background_step(img: Image.Image, step: dict) -> Image.Image:
     return Image.fromarray(rgba, "RGBA")
 
 
+def _resolve_loaded_palettes(step: dict) -> list:
+    """The loaded palettes a convert step selected, in selection order, skipping unknown names."""
+    names    = step.get("selected_palettes", [])
+    palettes = [state.palette_manager.get_palette_by_name(n) for n in names]
+    return [p for p in palettes if p is not None]
+
+
 def _run_convert_step(
     img: Image.Image,
     step: dict,
     extracted_palette: Any,
+    palettes: list | None = None,
+    palettes_lab: np.ndarray | None = None,
 ) -> tuple[Image.Image, str, str | None]:
-    """Remap pixels to nearest palette. Returns (image, notes_str, palette_name)."""
+    """
+    Remap pixels to nearest palette. Returns (image, notes_str, palette_name).
+    palettes: the resolved loaded palettes for this step; looked up when omitted.
+    palettes_lab: their stacked Oklab colors, when precomputed by the job's plan.
+    """
     palette_source = step.get("palette_source", "loaded")
 
     if palette_source == "extracted":
         if extracted_palette is None:
             raise ValueError("Convert step uses extracted palette but no Extract step ran before it")
-        palettes = [extracted_palette]
+        palettes, palettes_lab = [extracted_palette], None
     else:
-        names    = step.get("selected_palettes", [])
-        palettes = [state.palette_manager.get_palette_by_name(n) for n in names]
-        palettes = [p for p in palettes if p is not None]
+        if palettes is None:
+            palettes = _resolve_loaded_palettes(step)
         if not palettes:
             raise ValueError("Convert step has no valid palettes selected")
 
-    img_mgr = ImageManager()
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        tmp.write(save_png(img))
-        tmp_path = tmp.name
+    results = convert(img, palettes, palettes_lab=palettes_lab)
+    chosen, _tied, notes = choose_best(results, step.get("conflict_mode", "auto_first"))
+    visible_image = copy_without_transparency(chosen.image)
+    return visible_image, notes, chosen.palette.name
+
+
+# ---------------------------------------------------------------------------
+# Step plan
+# ---------------------------------------------------------------------------
+
+STEP_TYPES              = ("extract", "tileset", "background", "convert")
+EXTRACT_BG_MODES        = ("auto", "default", "fixed")   # fixed: use step["bg_color"]
+BACKGROUND_ACTIONS      = ("set", "remove")
+BACKGROUND_TARGET_MODES = ("default", "custom")
+PALETTE_SOURCES         = ("loaded", "extracted")
+
+
+class PlanError(ValueError):
+    """The submitted step list cannot run; routes answer 400 before any file is processed."""
+
+
+@dataclass
+class CompiledStep:
+    """One validated step, with everything that does not depend on the file resolved up front."""
+    type:   str
+    params: dict                                        # the step, with defaults filled in
+    preset: dict | None = None                          # tileset: the loaded preset
+    tileset_config: dict | None = None                  # tileset: its TilesetManager config
+    palettes: list = field(default_factory=list)        # convert (loaded): palettes in selection order
+    palettes_lab: np.ndarray | None = None              # convert (loaded, >1 palette): stacked Oklab
+
+
+@dataclass
+class PipelinePlan:
+    """A job's step list compiled once by compile_plan(); every file runs against it."""
+    steps: list[CompiledStep]
+    force_png_output: bool = False
+    _digest: str | None = field(default=None, repr=False, compare=False)
+
+    def digest(self) -> str:
+        """
+        sha256 of what the steps do to a file: the compiled parameters plus the
+        colors of every resolved palette and each tileset's config, so it
+        changes when a referenced palette or preset is edited.
+        """
+        if self._digest is None:
+            effective = [
+                {
+                    "type":     step.type,
+                    "params":   step.params,
+                    "palettes": [[p.name, [c.to_hex() for c in p.colors]] for p in step.palettes],
+                    "tileset":  step.tileset_config,
+                }
+                for step in self.steps
+            ]
+            blob = json.dumps(effective, sort_keys=True, default=str).encode()
+            self._digest = hashlib.sha256(blob).hexdigest()
+        return self._digest
+
+    def warm(self) -> None:
+        """Build the per-palette LUTs single-palette convert steps use, once per process."""
+        for step in self.steps:
+            if len(step.palettes) == 1:
+                palette = step.palettes[0]
+                get_palette_lut(palette.opaque_colors or palette.colors)
+
+
+def _check_hex(value: Any, what: str) -> str:
     try:
-        img_mgr.load_image(tmp_path)
-        results = img_mgr.process_all_palettes(palettes)
-    finally:
-        os.unlink(tmp_path)
+        if len(value.lstrip("#")) != 6:
+            raise ValueError
+        return Color.from_hex(value).to_hex()
+    except (AttributeError, ValueError):
+        raise PlanError(f"{what}: invalid hex color {value!r}")
 
-    if not results:
-        raise ValueError("Conversion produced no results")
 
-    max_colors = max(r.colors_used for r in results)
-    best       = [r for r in results if r.colors_used == max_colors]
-    notes      = ""
-    conflict_mode = step.get("conflict_mode", "auto_first")
+def _check_choice(value: Any, choices: tuple[str, ...], what: str) -> str:
+    if value not in choices:
+        raise PlanError(f"{what} must be one of {', '.join(choices)}, got {value!r}")
+    return value
 
-    if len(best) > 1:
-        tied = sorted(r.palette.name for r in best)
-        if conflict_mode == "flag":
-            notes = f"conflict: {len(best)} palettes tied ({', '.join(tied)})"
-        best.sort(key=lambda r: r.palette.name)
 
-    chosen = best[0]
-    visible_image = copy_without_transparency(chosen.image)
-    return visible_image, notes, chosen.palette.name
+def _compile_step(step: dict, where: str, extract_before: bool) -> CompiledStep:
+    stype = step.get("type")
+
+    if stype == "extract":
+        try:
+            n_colors = int(step.get("n_colors", 15))
+        except (TypeError, ValueError):
+            raise PlanError(f"{where}: n_colors must be an integer")
+        max_colors = Palette.MAX_COLORS - 1
+        if not 1 <= n_colors <= max_colors:
+            raise PlanError(f"{where}: n_colors must be 1–{max_colors}, got {n_colors}")
+        bg_mode = _check_choice(step.get("bg_mode", "auto"), EXTRACT_BG_MODES, f"{where}: bg_mode")
+        params = {
+            **step,
+            "n_colors":    n_colors,
+            "bg_mode":     bg_mode,
+            "color_space": _check_choice(
+                step.get("color_space", "oklab"), PaletteExtractor.VALID_COLOR_SPACES, f"{where}: color_space",
+            ),
+            "save_palette": bool(step.get("save_palette", True)),
+        }
+        if bg_mode == "fixed":
+            params["bg_color"] = _check_hex(step.get("bg_color", DEFAULT_BG_COLOR), f"{where}: bg_color")
+        return CompiledStep(stype, params)
+
+    if stype == "tileset":
+        preset_id = step.get("preset_id")
+        if not preset_id:
+            raise PlanError(f"{where}: tileset step has no preset_id")
+        preset = load_preset(preset_id)
+        if not preset:
+            raise PlanError(f"{where}: preset '{preset_id}' not found")
+        try:
+            config = _tileset_config(preset)
+        except (KeyError, TypeError) as e:
+            raise PlanError(f"{where}: preset '{preset_id}' is malformed ({e})")
+        out = config["output"]
+        if out["output_width"] <= 0 or out["output_height"] <= 0:
+            raise PlanError(f"{where}: preset '{preset_id}' has an empty layout")
+        return CompiledStep(stype, dict(step), preset=preset, tileset_config=config)
+
+    if stype == "background":
+        params = {**step, "action": _check_choice(step.get("action", "set"), BACKGROUND_ACTIONS, f"{where}: action")}
+        if params["action"] == "set":
+            target_mode = _check_choice(
+                step.get("target_mode", "default"), BACKGROUND_TARGET_MODES, f"{where}: target_mode",
+            )
+            params["target_mode"] = target_mode
+            if target_mode == "custom":
+                params["target_color"] = _check_hex(
+                    step.get("target_color", DEFAULT_BG_COLOR), f"{where}: target_color",
+                )
+        return CompiledStep(stype, params)
+
+    if stype == "convert":
+        source = _check_choice(step.get("palette_source", "loaded"), PALETTE_SOURCES, f"{where}: palette_source")
+        params = {
+            **step,
+            "palette_source": source,
+            "conflict_mode":  _check_choice(
+                step.get("conflict_mode", "auto_first"), CONFLICT_MODES, f"{where}: conflict_mode",
+            ),
+        }
+        if source == "extracted":
+            if not extract_before:
+                raise PlanError(f"{where}: convert uses the extracted palette but no extract step runs before it")
+            return CompiledStep(stype, params)
+
+        palettes = _resolve_loaded_palettes(step)
+        if not palettes:
+            raise PlanError(f"{where}: convert step has no valid palettes selected")
+        palettes_lab = None
+        if len(palettes) > 1:
+            palettes_lab = stack_palettes([p.opaque_colors or p.colors for p in palettes])
+        return CompiledStep(stype, params, palettes=palettes, palettes_lab=palettes_lab)
+
+    raise PlanError(f"{where}: unknown step type {stype!r} (expected one of {', '.join(STEP_TYPES)})")
+
+
+def compile_plan(steps: Any) -> PipelinePlan:
+    """
+    Validate a step list and resolve what every file would otherwise redo:
+    loaded palettes (and their stacked Oklab colors), tileset presets and their
+    TilesetManager configs. Raises PlanError on the first invalid step.
+    """
+    if not isinstance(steps, list) or not steps:
+        raise PlanError("steps must be a non-empty JSON array")
+    compiled: list[CompiledStep] = []
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise PlanError(f"step {i + 1}: expected an object")
+        extract_before = any(c.type == "extract" for c in compiled)
+        compiled.append(_compile_step(step, f"step {i + 1} ({step.get('type', '?')})", extract_before))
+    return PipelinePlan(
+        steps=compiled,
+        force_png_output=any(c.type == "background" for c in compiled),
+    )
+
+
+def _compile_or_400(steps: Any) -> PipelinePlan:
+    try:
+        return compile_plan(steps)
+    except PlanError as e:
+        raise HTTPException(400, str(e))
+
+
+def _apply_step(
+    img: Image.Image,
+    stem: str,
+    step: CompiledStep,
+    extracted_palette: Any,
+) -> tuple[Image.Image, Any, tuple[str, str | None] | None]:
+    """
+    Run one compiled step. Returns (image, extracted palette so far,
+    (notes, applied palette name) for convert steps else None).
+    """
+    if step.type == "extract":
+        img, extracted_palette = _run_extract_step(img, stem, step.params)
+        return img, extracted_palette, None
+    if step.type == "tileset":
+        return _run_tileset_step(img, step.params, step.preset, step.tileset_config), extracted_palette, None
+    if step.type == "background":
+        return _run_background_step(img, step.params), extracted_palette, None
+    img, notes, applied_palette = _run_convert_step(
+        img, step.params, extracted_palette, step.palettes or None, step.palettes_lab,
+    )
+    return img, extracted_palette, (notes, applied_palette)
 
 
 # ---------------------------------------------------------------------------
@@ -300,11 +587,15 @@ async def preview_pipeline(
     file: UploadFile = File(...),
     steps: str = Form(...),
 ):
-    """Dry-run on a single file. Returns per-step preview images."""
+    """
+    Dry-run on a single file. Returns per-step preview images.
+    An invalid step list is rejected with 400 before the file is opened.
+    """
     try:
         parsed_steps = json.loads(steps)
     except Exception:
         raise HTTPException(400, "steps must be valid JSON")
+    plan = _compile_or_400(parsed_steps)
 
     data = await file.read()
     try:
@@ -323,78 +614,42 @@ async def preview_pipeline(
     }]
 
     extracted_palette = None
-    tmp_pal_dir = Path(tempfile.mkdtemp(prefix="porypal_preview_"))
 
-    try:
-        for step in parsed_steps:
-            stype = step.get("type", "unknown")
-            try:
-                if stype == "extract":
-                    dry_step = {**step, "save_palette": False}
-                    img, extracted_palette = _run_extract_step(img, stem, dry_step, tmp_pal_dir)
-                    space = step.get("color_space", "oklab")
-                    previews.append({
-                        "type":    "extract",
-                        "label":   f"extract ({space})",
-                        "image":   pil_to_b64(img),
-                        "palette": [c.to_hex() for c in extracted_palette.colors] if extracted_palette else [],
-                        "error":   None,
-                    })
-
-                elif stype == "tileset":
-                    preset_id   = step.get("preset_id", "")
-                    preset      = load_preset(preset_id) if preset_id else None
-                    preset_name = preset["name"] if preset else preset_id
-                    img = _run_tileset_step(img, step)
-                    previews.append({
-                        "type":    "tileset",
-                        "label":   f"tileset → {preset_name}",
-                        "image":   pil_to_b64(img),
-                        "palette": None,
-                        "error":   None,
-                    })
-
-                elif stype == "convert":
-                    img, notes, applied_palette = _run_convert_step(img, step, extracted_palette)
-                    label = f"convert → {Path(applied_palette).stem}" if applied_palette else "convert"
-                    previews.append({
-                        "type":    "convert",
-                        "label":   label,
-                        "image":   pil_to_b64(img),
-                        "palette": None,
-                        "error":   notes or None,
-                    })
-                    
-                elif stype == "background":
-                    img = _run_background_step(img, step)
-                    previews.append({
-                        "type":    "background",
-                        "label":   f"background → {step.get('action', 'set')}",
-                        "image":   pil_to_b64(img),
-                        "palette": None,
-                        "error":   None,
-                    })
-
-                else:
-                    previews.append({
-                        "type":    stype,
-                        "label":   stype,
-                        "image":   None,
-                        "palette": None,
-                        "error":   f"Unknown step type: {stype}",
-                    })
-
-            except Exception as e:
-                previews.append({
-                    "type":    stype,
-                    "label":   stype,
-                    "image":   None,
-                    "palette": None,
-                    "error":   str(e),
-                })
+    for step in plan.steps:
+        stype   = step.type
+        palette = None
+        error   = None
+        try:
+            img, extracted_palette, converted = _apply_step(img, stem, step, extracted_palette)
+
+            if stype == "extract":
+                label   = f"extract ({step.params['color_space']})"
+                palette = [c.to_hex() for c in extracted_palette.colors] if extracted_palette else []
+            elif stype == "tileset":
+                label = f"tileset → {step.preset['name']}"
+            elif stype == "convert":
+                notes, applied_palette = converted
+                label = f"convert → {Path(applied_palette).stem}" if applied_palette else "convert"
+                error = notes or None
+            else:
+                label = f"background → {step.params['action']}"
+
+            previews.append({
+                "type":    stype,
+                "label":   label,
+                "image":   pil_to_b64(img),
+                "palette": palette,
+                "error":   error,
+            })
 
-    finally:
-        shutil.rmtree(tmp_pal_dir, ignore_errors=True)
+        except Exception as e:
+            previews.append({
+                "type":    stype,
+                "label":   stype,
+                "image":   None,
+                "palette": None,
+                "error":   str(e),
+            })
 
     return {"previews": previews, "filename": file.filename}
 
@@ -403,111 +658,664 @@ async def preview_pipeline(
 # Background job executor
 # ---------------------------------------------------------------------------
 
+@dataclass
+class _JobContext:
+    """Everything a worker needs to run the steps on one file, shipped once per worker."""
+    job_id: str
+    plan:   PipelinePlan
+    cancel_event: Any = None   # multiprocessing.Event, checked between steps
+
+
+class _Cancelled(Exception):
+    """Raised inside _process_file when the job was cancelled between steps."""
+
+
+@dataclass
+class PipelineLimits:
+    """Per-job resource limits. 0 means unlimited."""
+    max_files:      int   = 0
+    max_pixels:     int   = 0       # summed width × height over all inputs
+    max_seconds:    float = 0.0     # wall time, after which the job is cancelled
+    max_work_bytes: int   = 0       # work_dir size (inputs + outputs), after which the job is cancelled
+
+    @classmethod
+    def from_env(cls) -> "PipelineLimits":
+        def env(name: str, default: float) -> float:
+            raw = os.environ.get(name, "").strip()
+            try:
+                return float(raw) if raw else default
+            except ValueError:
+                logging.warning(f"Ignoring invalid {name}={raw!r}")
+                return default
+
+        return cls(
+            max_files=int(env("PORYPAL_PIPELINE_MAX_FILES", DEFAULT_LIMITS.max_files)),
+            max_pixels=int(env("PORYPAL_PIPELINE_MAX_PIXELS", DEFAULT_LIMITS.max_pixels)),
+            max_seconds=env("PORYPAL_PIPELINE_MAX_SECONDS", DEFAULT_LIMITS.max_seconds),
+            max_work_bytes=int(env("PORYPAL_PIPELINE_MAX_WORK_MB", DEFAULT_LIMITS.max_work_bytes >> 20)) << 20,
+        )
+
+    def tightened(self, **requested: float | None) -> "PipelineLimits":
+        """Apply per-request limits; a request can lower a server limit but never raise it."""
+        values = {}
+        for name, server_value in vars(self).items():
+            wanted = requested.get(name)
+            if wanted is None or wanted <= 0:
+                values[name] = server_value
+            elif server_value <= 0:
+                values[name] = type(server_value)(wanted)
+            else:
+                values[name] = type(server_value)(min(wanted, server_value))
+        return PipelineLimits(**values)
+
+
+DEFAULT_LIMITS = PipelineLimits(
+    max_files=2000,
+    max_pixels=500_000_000,
+    max_seconds=3600.0,
+    max_work_bytes=2048 << 20,
+)
+
+
+@dataclass
+class _FileOutcome:
+    """What processing one file produced; committed to the job by the parent, in input order."""
+    result:    dict
+    stem:      str
+    ext:       str
+    out_bytes: bytes | None = None
+    palettes:  list[tuple[Any, str]] = field(default_factory=list)   # (Palette, color_space) to save
+
+
+def pipeline_workers() -> int:
+    """Worker processes per job: $PORYPAL_PIPELINE_WORKERS, else one per CPU."""
+    raw = os.environ.get(PIPELINE_WORKERS_ENV, "").strip()
+    if not raw:
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        logging.warning(f"Ignoring invalid {PIPELINE_WORKERS_ENV}={raw!r}; running jobs inline")
+        return 1
+
+
+def _pool_jobs() -> int:
+    raw = os.environ.get(PIPELINE_POOL_JOBS_ENV, "").strip()
+    try:
+        return max(1, int(raw)) if raw else 1
+    except ValueError:
+        logging.warning(f"Ignoring invalid {PIPELINE_POOL_JOBS_ENV}={raw!r}")
+        return 1
+
+
+_pool_slots = threading.BoundedSemaphore(_pool_jobs())
+
+
+def _cancel_event_for(job_id: str):
+    with _jobs_lock:
+        event = _cancel_events.get(job_id)
+        if event is None:
+            event = _cancel_events[job_id] = _MP_CONTEXT.Event()
+        return event
+
+
+def _request_cancel(job_id: str, reason: str) -> bool:
+    """
+    Ask a running job to stop. Workers check the flag between steps, the job
+    thread between files; whatever is committed so far is kept.
+    Returns False if the job is not running.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] != "running":
+            return False
+        job.setdefault("cancel_reason", reason)
+    _cancel_event_for(job_id).set()
+    logging.info(f"Pipeline [{job_id}] cancelling: {reason}")
+    return True
+
+
+def _build_job_context(job_id: str, plan: PipelinePlan) -> _JobContext:
+    return _JobContext(job_id=job_id, plan=plan, cancel_event=_cancel_event_for(job_id))
+
+
+def _process_file(ctx: _JobContext, filename: str, raw_bytes: bytes) -> _FileOutcome:
+    """Run every step on one file. Pure: writes nothing, so it can run in a worker process."""
+    started = time.perf_counter()
+    stem    = Path(filename).stem
+    ext     = ".png" if ctx.plan.force_png_output else (Path(filename).suffix or ".png")
+    outcome = _FileOutcome({"file": filename, "status": "ok", "notes": ""}, stem, ext)
+    result  = outcome.result
+
+    try:
+        img = Image.open(io.BytesIO(raw_bytes)).copy()
+        extracted_palette = None
+
+        for step in ctx.plan.steps:
+            if ctx.cancel_event is not None and ctx.cancel_event.is_set():
+                raise _Cancelled()
+            img, extracted_palette, converted = _apply_step(img, stem, step, extracted_palette)
+            if step.type == "extract" and step.params["save_palette"]:
+                outcome.palettes.append((extracted_palette, step.params["color_space"]))
+            elif converted is not None:
+                notes, applied_palette = converted
+                if applied_palette:
+                    result["palette"] = applied_palette
+                if notes:
+                    result["notes"] = notes
+                    result["status"] = "conflict" if "conflict" in notes else "ok"
+
+        outcome.out_bytes = save_png(img)
+
+    except _Cancelled:
+        result["status"] = "cancelled"
+        result["notes"]  = "job cancelled"
+        outcome.palettes.clear()
+
+    except Exception as e:
+        result["status"] = "error"
+        result["notes"]  = str(e)
+        logging.error(f"Pipeline [{ctx.job_id}] error on {filename}: {e}")
+
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+_worker_ctx: _JobContext | None = None
+
+
+def _init_worker(ctx: _JobContext) -> None:
+    global _worker_ctx
+    _worker_ctx = ctx
+    ctx.plan.warm()
+
+
+def _process_in_worker(index: int, filename: str, raw_bytes: bytes) -> tuple[int, _FileOutcome]:
+    return index, _process_file(_worker_ctx, filename, raw_bytes)
+
+
+def _iter_outcomes(
+    ctx: _JobContext,
+    file_data: list[tuple[str, bytes]],
+    workers: int,
+    on_start: Callable[[str], None],
+) -> Iterator[_FileOutcome]:
+    """
+    Yield one outcome per file, in input order.
+
+    With more than one worker the files fan out over a process pool; outcomes
+    that finish early wait in a reorder buffer until every earlier file is in.
+    on_start(filename) names the file the job is currently waiting on.
+    """
+    if workers <= 1:
+        for filename, raw_bytes in file_data:
+            on_start(filename)
+            yield _process_file(ctx, filename, raw_bytes)
+        return
+
+    on_start("")   # waiting for a pool slot
+    while not _pool_slots.acquire(timeout=POOL_POLL_S):
+        if ctx.cancel_event.is_set():
+            return
+    try:
+        yield from _iter_pool_outcomes(ctx, file_data, workers, on_start)
+    finally:
+        _pool_slots.release()
+
+
+def _iter_pool_outcomes(
+    ctx: _JobContext,
+    file_data: list[tuple[str, bytes]],
+    workers: int,
+    on_start: Callable[[str], None],
+) -> Iterator[_FileOutcome]:
+    """_iter_outcomes over a process pool; outcomes wait in a reorder buffer for every earlier file."""
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=_MP_CONTEXT, initializer=_init_worker, initargs=(ctx,),
+    )
+    processes = {}
+    pending: dict[Future, int] = {}
+    try:
+        pending = {
+            pool.submit(_process_in_worker, i, filename, raw_bytes): i
+            for i, (filename, raw_bytes) in enumerate(file_data)
+        }
+        # ProcessPoolExecutor has no public way to kill its workers (before 3.14)
+        processes = dict(pool._processes or {})
+        ready: dict[int, _FileOutcome] = {}
+        next_index = 0
+        cancelled_at = None
+        on_start(file_data[0][0])
+        while pending:
+            done, _ = wait(pending, timeout=POOL_POLL_S, return_when=FIRST_COMPLETED)
+            if ctx.cancel_event.is_set():
+                # Workers notice the flag at their next step; one stuck inside a
+                # step must not keep the job running forever.
+                cancelled_at = cancelled_at or time.monotonic()
+                if not done and time.monotonic() - cancelled_at > CANCEL_GRACE_S:
+                    logging.warning(f"Pipeline [{ctx.job_id}] workers did not stop; terminating them")
+                    return
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    _, ready[index] = future.result()
+                except Exception as e:   # worker died or the file could not be shipped
+                    filename = file_data[index][0]
+                    logging.error(f"Pipeline [{ctx.job_id}] worker failed on {filename}: {e}")
+                    ready[index] = _FileOutcome(
+                        {"file": filename, "status": "error", "notes": str(e)},
+                        Path(filename).stem, ".png",
+                    )
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
+                if next_index < len(file_data):
+                    on_start(file_data[next_index][0])
+    finally:
+        # Stopped early (cancellation, deadline): drop queued files and kill
+        # the workers still busy, so no process outlives its job.
+        processes.update(pool._processes or {})
+        pool.shutdown(wait=False, cancel_futures=True)
+        if pending:
+            for process in processes.values():
+                if process.is_alive():
+                    process.terminate()
+
+
+def _input_header(raw_bytes: bytes) -> tuple[str, tuple[int, int]] | None:
+    """(mode, size) from the image header alone, or None if it cannot be opened."""
+    try:
+        with Image.open(io.BytesIO(raw_bytes)) as img:
+            return img.mode, img.size
+    except Exception:
+        return None
+
+
+def _pixel_key(raw_bytes: bytes) -> str | None:
+    """model.extract_cache.pixel_digest of the decoded file, or None if it does not decode."""
+    try:
+        with Image.open(io.BytesIO(raw_bytes)) as img:
+            return pixel_digest(img)
+    except Exception:
+        return None
+
+
+def _dedupe_inputs(file_data: list[tuple[str, bytes]], threads: int = 1) -> list[int]:
+    """
+    source[i] is the index of the first file with the same pixels as file i
+    (i itself for the files that actually need computing).
+
+    Byte-identical files are matched on a sha256 of their bytes. Only the
+    remaining files whose header (mode, size) matches another one's can
+    still be pixel-identical; just those are decoded and pixel-hashed, on up
+    to *threads* threads. Files that do not open are left on their own, to
+    report their error.
+    """
+    first_by_bytes: dict[bytes, int] = {}
+    source = [
+        first_by_bytes.setdefault(hashlib.sha256(raw_bytes).digest(), i)
+        for i, (_filename, raw_bytes) in enumerate(file_data)
+    ]
+
+    by_header: dict[tuple, list[int]] = {}
+    unreadable = set()
+    for i in first_by_bytes.values():
+        header = _input_header(file_data[i][1])
+        if header is None:
+            unreadable.add(i)
+        else:
+            by_header.setdefault(header, []).append(i)
+    source = [i if src in unreadable else src for i, src in enumerate(source)]
+    candidates = sorted(i for group in by_header.values() if len(group) > 1 for i in group)
+    if not candidates:
+        return source
+
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(candidates)))) as pool:
+        keys = list(pool.map(_pixel_key, (file_data[i][1] for i in candidates)))
+    first_by_pixels: dict[str, int] = {}
+    same_pixels = {
+        i: first_by_pixels.setdefault(key, i)
+        for i, key in zip(candidates, keys) if key is not None
+    }
+    return [same_pixels.get(src, src) for src in source]
+
+
+def _duplicate_outcome(original: _FileOutcome, filename: str, force_png_output: bool) -> _FileOutcome:
+    """
+    The outcome of a pixel-identical file, renamed for *filename*. Counted as
+    deduplicated only, even when the original came from the build cache.
+    """
+    result = {
+        **{k: v for k, v in original.result.items() if k != "cached"},
+        "file":              filename,
+        "deduplicated_from": original.result["file"],
+        "saved_ms":          original.result.get("saved_ms", original.result.get("elapsed_ms", 0.0)),
+        "elapsed_ms":        0.0,
+    }
+    ext = ".png" if force_png_output else (Path(filename).suffix or ".png")
+    return _FileOutcome(result, Path(filename).stem, ext, original.out_bytes, list(original.palettes))
+
+
+def _fan_out(
+    computed: Iterator[_FileOutcome],
+    file_data: list[tuple[str, bytes]],
+    source: list[int],
+    force_png_output: bool,
+    cached: dict[int, _FileOutcome] | None = None,
+) -> Iterator[_FileOutcome]:
+    """
+    Yield one outcome per input file, in input order, from the outcomes of the
+    unique files only: cached[i] when the build cache had it, else the next
+    one from computed (which holds the rest, in their input order). A unique
+    outcome is kept in memory until its last duplicate has been yielded.
+    """
+    cached   = cached or {}
+    last_use = {src: i for i, src in enumerate(source)}
+    kept: dict[int, _FileOutcome] = {}
+    for i, (filename, _raw) in enumerate(file_data):
+        src = source[i]
+        if src == i:
+            outcome = cached.pop(i, None) or next(computed, None)
+            if outcome is None:     # stopped early (cancellation)
+                return
+            if last_use[i] > i:
+                kept[i] = outcome
+        else:
+            outcome = _duplicate_outcome(kept[src], filename, force_png_output)
+            if last_use[src] == i:
+                del kept[src]
+        yield outcome
+
+
+def _cached_outcome(entry: BuildEntry, filename: str, force_png_output: bool) -> _FileOutcome:
+    """A build cache entry as the outcome of *filename*."""
+    stem   = Path(filename).stem
+    result = {
+        **entry.result,
+        "file":       filename,
+        "cached":     True,
+        "saved_ms":   entry.result.get("elapsed_ms", 0.0),
+        "elapsed_ms": 0.0,
+    }
+    palettes = [
+        (Palette(name=stem, colors=[Color.from_hex(h) for h in colors]), color_space)
+        for colors, color_space in entry.palettes
+    ]
+    ext = ".png" if force_png_output else (Path(filename).suffix or ".png")
+    return _FileOutcome(result, stem, ext, entry.out_bytes, palettes)
+
+
+def _build_entry(outcome: _FileOutcome) -> BuildEntry:
+    result = {k: outcome.result[k] for k in ("status", "palette", "notes", "elapsed_ms") if k in outcome.result}
+    return BuildEntry(
+        result=result,
+        out_bytes=outcome.out_bytes,
+        palettes=[([c.to_hex() for c in p.colors], cs) for p, cs in outcome.palettes],
+    )
+
+
+def _commit_outcome(
+    outcome: _FileOutcome,
+    sprites_dir: Path,
+    pal_dir: Path,
+    filename_template: str,
+    palette_template: str,
+    subdir: str = "",
+) -> list[tuple[str, str]]:
+    """
+    Write one file's palettes and sprite, de-duplicating names against what is already there.
+    subdir: relative directory to write both under (project runs mirror the source tree).
+    Returns the (arcname, path) zip entries written.
+    """
+    if subdir:
+        sprites_dir, pal_dir = sprites_dir / subdir, pal_dir / subdir
+        sprites_dir.mkdir(parents=True, exist_ok=True)
+    prefix = f"{subdir}/" if subdir else ""
+
+    written = []
+    for palette, color_space in outcome.palettes:
+        dest = _write_palette_file(pal_dir, palette, outcome.stem, color_space, palette_template)
+        written.append((f"palettes/{prefix}{dest.name}", str(dest)))
+
+    if outcome.out_bytes is None:
+        return written
+
+    # Apply filename template for the output sprite
+    out_stem = _apply_template(filename_template, name=outcome.stem)
+    out_path = sprites_dir / f"{out_stem}{outcome.ext}"
+    counter  = 1
+    while out_path.exists():
+        out_path = sprites_dir / f"{out_stem}_{counter}{outcome.ext}"
+        counter += 1
+    out_path.write_bytes(outcome.out_bytes)
+    written.append((f"sprites/{prefix}{out_path.name}", str(out_path)))
+    return written
+
+
+def _persist(job_id: str, method: str, *args) -> None:
+    """Mirror a job update into the durable store (jobs created via /run only)."""
+    job = _jobs.get(job_id)
+    if not job or not job.get("persisted"):
+        return
+    try:
+        getattr(job_store, method)(job_id, *args)
+    except Exception as e:
+        logging.warning(f"Pipeline [{job_id}] could not persist {method}: {e}")
+
+
 def _execute_job(
     job_id: str,
     file_data: list[tuple[str, bytes]],
     steps: list[dict],
     filename_template: str = DEFAULT_FILENAME_TEMPLATE,
     palette_template:  str = DEFAULT_PALETTE_TEMPLATE,
+    workers: int | None = None,
+    start: int = 0,
+    limits: PipelineLimits | None = None,
+    plan: PipelinePlan | None = None,
+    fingerprints: list[str] | None = None,
+    nested_output: bool = False,
 ) -> None:
-    work_dir    = Path(tempfile.mkdtemp(prefix=f"porypal_{job_id}_"))
+    """
+    Run steps over file_data and commit the outputs into the job's work_dir.
+    start: index of file_data[0] within the job — non-zero when resuming, in which
+    case the existing work_dir, results and entries are kept and extended.
+    limits: wall time and work_dir size are enforced here by cancelling the job.
+    plan: compile_plan(steps), when the route already compiled it to validate the request.
+    fingerprints: one build cache key per file (project runs). Files with a cache
+    entry are not recomputed; new results are stored.
+    nested_output: write outputs under the directory part of each filename.
+    """
+    limits = limits or PipelineLimits()
+    with _jobs_lock:
+        job = _jobs.get(job_id)   # kept even if the job is deleted mid-run
+        if job is None:
+            logging.info(f"Pipeline [{job_id}] was deleted before it started")
+            return
+        job["started"] = True
+        existing = job.get("work_dir")
+    work_dir = Path(existing) if existing else Path(tempfile.mkdtemp(prefix=f"porypal_{job_id}_"))
     sprites_dir = work_dir / "sprites"
     pal_dir     = work_dir / "palettes"
-    sprites_dir.mkdir()
-    pal_dir.mkdir()
-    force_png_output = any(step.get("type") == "background" for step in steps)
+    sprites_dir.mkdir(parents=True, exist_ok=True)
+    pal_dir.mkdir(parents=True, exist_ok=True)
 
     with _jobs_lock:
-        _jobs[job_id].update({"work_dir": str(work_dir), "total": len(file_data)})
+        job.update({
+            "work_dir":          str(work_dir),
+            "total":             start + len(file_data),
+            "steps":             steps,
+            "filename_template": filename_template,
+            "palette_template":  palette_template,
+        })
+        job.setdefault("entries", [])
 
-    for i, (filename, raw_bytes) in enumerate(file_data):
+    def on_start(filename: str) -> None:
         with _jobs_lock:
-            _jobs[job_id]["current_file"] = filename
+            job["current_file"] = filename
 
-        result = {"file": filename, "status": "ok", "notes": ""}
+    timer = None
+    if limits.max_seconds > 0:
+        timer = threading.Timer(
+            limits.max_seconds, _request_cancel,
+            (job_id, f"exceeded max_seconds ({limits.max_seconds:g})"),
+        )
+        timer.daemon = True
+        timer.start()
 
-        try:
-            img   = Image.open(io.BytesIO(raw_bytes)).copy()
-            stem  = Path(filename).stem
-            ext   = ".png" if force_png_output else (Path(filename).suffix or ".png")
-            extracted_palette = None
-
-            for step in steps:
-                stype = step.get("type")
-                if stype == "extract":
-                    img, extracted_palette = _run_extract_step(
-                        img, stem, step, pal_dir, palette_template
-                    )
-                elif stype == "background":
-                    img = _run_background_step(img, step)
-                elif stype == "tileset":
-                    img = _run_tileset_step(img, step)
-                elif stype == "convert":
-                    img, notes, applied_palette = _run_convert_step(img, step, extracted_palette)
-                    if applied_palette:
-                        result["palette"] = applied_palette
-                    if notes:
-                        result["notes"] = notes
-                        result["status"] = "conflict" if "conflict" in notes else "ok"
-
-            # Apply filename template for the output sprite
-            out_stem = _apply_template(filename_template, name=stem)
-            out_path = sprites_dir / f"{out_stem}{ext}"
-            counter  = 1
-            while out_path.exists():
-                out_path = sprites_dir / f"{out_stem}_{counter}{ext}"
-                counter += 1
-            out_bytes = save_png(img)
-            out_path.write_bytes(out_bytes)
+    copied = []
+    try:
+        ctx        = _build_job_context(job_id, plan or compile_plan(steps))
+        source     = _dedupe_inputs(file_data, workers or pipeline_workers())
+        cached: dict[int, _FileOutcome] = {}
+        if fingerprints is not None:
+            for i, src in enumerate(source):
+                entry = build_cache.get(fingerprints[i]) if src == i else None
+                if entry is not None:
+                    cached[i] = _cached_outcome(entry, file_data[i][0], ctx.plan.force_png_output)
+        unique     = [file_data[i] for i, src in enumerate(source) if src == i and i not in cached]
+        workers    = min(workers or pipeline_workers(), len(unique))
+        work_bytes = dir_size(work_dir)
+        if len(unique) < len(file_data):
+            logging.info(f"Pipeline [{job_id}] {len(file_data) - len(unique)} duplicate input(s) will reuse results")
+
+        with closing(_iter_outcomes(ctx, unique, workers, on_start)) as computed, \
+                closing(_fan_out(computed, file_data, source, ctx.plan.force_png_output, cached)) as outcomes:
+            for index, outcome in enumerate(outcomes, start):
+                if ctx.cancel_event.is_set():
+                    break
+                subdir  = Path(outcome.result["file"]).parent.as_posix() if nested_output else "."
+                subdir  = "" if subdir == "." else subdir
+                written = _commit_outcome(
+                    outcome, sprites_dir, pal_dir, filename_template, palette_template, subdir,
+                )
+                if (fingerprints is not None and not outcome.result.get("cached")
+                        and outcome.result["status"] in ("ok", "conflict")):
+                    build_cache.put(fingerprints[index - start], _build_entry(outcome))
+                with _jobs_lock:
+                    job["entries"].extend(written)
+                    job["results"].append(outcome.result)
+                    job["done"] = len(job["results"])
+                    _notify_progress(job_id)
+                _persist(job_id, "record_file", index, outcome.result, written)
+
+                work_bytes += sum(Path(path).stat().st_size for _, path in written)
+                if 0 < limits.max_work_bytes < work_bytes:
+                    _request_cancel(job_id, f"exceeded max_work_mb ({limits.max_work_bytes >> 20})")
+
+        # Copy loaded palettes used by convert steps into pal_dir
+        if not ctx.cancel_event.is_set():
+            already_in_pal_dir = {f.name for f in pal_dir.glob("*.pal")}
+            for step in ctx.plan.steps:
+                for pal_name in (p.name for p in step.palettes):
+                    if pal_name in already_in_pal_dir:
+                        continue
+                    src_path = state.palette_manager.get_path(pal_name)
+                    if src_path and src_path.exists():
+                        dest = pal_dir / pal_name
+                        dest.write_bytes(src_path.read_bytes())
+                        already_in_pal_dir.add(pal_name)
+                        copied.append((f"palettes/{dest.name}", str(dest)))
+        status = "cancelled" if ctx.cancel_event.is_set() else "done"
 
-        except Exception as e:
-            result["status"] = "error"
-            result["notes"]  = str(e)
-            logging.error(f"Pipeline [{job_id}] error on {filename}: {e}")
+    except Exception as e:
+        logging.error(f"Pipeline [{job_id}] failed: {e}")
+        status = "error"
 
-        with _jobs_lock:
-            _jobs[job_id]["results"].append(result)
-            _jobs[job_id]["done"] = i + 1
-
-    # Copy loaded palettes used by convert steps into pal_dir
-    already_in_pal_dir = {f.name for f in pal_dir.glob("*.pal")}
-    for step in steps:
-        if step.get("type") == "convert" and step.get("palette_source") == "loaded":
-            for pal_name in step.get("selected_palettes", []):
-                if pal_name in already_in_pal_dir:
-                    continue
-                src_path = state.palette_manager.get_path(pal_name)
-                if src_path and src_path.exists():
-                    dest = pal_dir / pal_name
-                    dest.write_bytes(src_path.read_bytes())
-                    already_in_pal_dir.add(pal_name)
-
-    results_snapshot = _jobs[job_id]["results"]
-
-    zip_path = work_dir / "results.zip"
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        for f in sorted(sprites_dir.glob("*")):
-            zf.write(f, f"sprites/{f.name}")
-        for f in sorted(pal_dir.glob("*.pal")):
-            zf.write(f, f"palettes/{f.name}")
-        manifest = {
-            "porypal_version":   PORYPAL_VERSION,
-            "filename_template": filename_template,
-            "palette_template":  palette_template,
-            "steps": steps,
-            "summary": {
-                "total":    len(results_snapshot),
-                "ok":       sum(1 for r in results_snapshot if r["status"] == "ok"),
-                "conflict": sum(1 for r in results_snapshot if r["status"] == "conflict"),
-                "error":    sum(1 for r in results_snapshot if r["status"] == "error"),
-            },
-            "files": results_snapshot,
-        }
-        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    finally:
+        if timer is not None:
+            timer.cancel()
 
     with _jobs_lock:
-        _jobs[job_id]["status"]   = "done"
-        _jobs[job_id]["zip_path"] = str(zip_path)
+        _cancel_events.pop(job_id, None)
+        if status == "done":
+            job["entries"].extend(copied)
+        job["status"] = status
+        deleted = job.get("deleted", False)
+        _notify_progress(job_id)
+
+    if deleted:
+        # DELETE arrived while running; the route left the files for us.
+        shutil.rmtree(work_dir, ignore_errors=True)
+    elif status == "error":
+        _persist(job_id, "set_status", "error")
+    else:
+        _persist(job_id, "finish_job", status, copied)
+
+
+def recover_jobs() -> None:
+    """On startup: flag jobs a previous process left running, and expire old ones."""
+    try:
+        interrupted = job_store.mark_interrupted()
+        if interrupted:
+            logging.info(f"{interrupted} pipeline job(s) were interrupted; resume via /api/pipeline/resume")
+        job_store.expire()
+    except Exception as e:
+        logging.warning(f"Could not recover pipeline jobs: {e}")
+
+
+def _get_job(job_id: str) -> dict | None:
+    """The live job, or the stored one (cached into _jobs) after a restart."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        return job
+    try:
+        stored = job_store.load_job(job_id)
+    except Exception as e:
+        logging.warning(f"Could not load pipeline job {job_id}: {e}")
+        return None
+    if stored is None:
+        return None
+    with _jobs_lock:
+        return _jobs.setdefault(job_id, stored)
+
+
+def _dedup_summary(results: list[dict]) -> dict:
+    """
+    Files that reused a result instead of computing it — a pixel-identical
+    earlier file (deduplicated) or the build cache (skipped) — and the compute
+    time that saved.
+    """
+    return {
+        "deduplicated":     sum(1 for r in results if r.get("deduplicated_from")),
+        "skipped":          sum(1 for r in results if r.get("cached")),
+        "compute_saved_ms": round(sum(r.get("saved_ms", 0.0) for r in results), 1),
+    }
+
+
+def _build_manifest(job: dict, results: list[dict]) -> dict:
+    return {
+        "porypal_version":   PORYPAL_VERSION,
+        "filename_template": job.get("filename_template", DEFAULT_FILENAME_TEMPLATE),
+        "palette_template":  job.get("palette_template", DEFAULT_PALETTE_TEMPLATE),
+        "steps": job.get("steps", []),
+        "complete": job["status"] == "done",
+        "summary": {
+            "total":    len(results),
+            "ok":       sum(1 for r in results if r["status"] == "ok"),
+            "conflict": sum(1 for r in results if r["status"] == "conflict"),
+            "error":    sum(1 for r in results if r["status"] == "error"),
+            **_dedup_summary(results),
+        },
+        "files": results,
+    }
+
+
+def _iter_result_zip_entries(job: dict, entries: list[tuple[str, str]], results: list[dict]):
+    """Zip layout: sprites/ then palettes/ (each sorted by name), then manifest.json."""
+    for arcname, path in sorted(entries, key=lambda e: (not e[0].startswith("sprites/"), e[0])):
+        yield arcname, Path(path)
+    yield "manifest.json", json.dumps(_build_manifest(job, results), indent=2)
+
+
+def _pixel_count(raw: bytes) -> int:
+    """width × height from the image header; 0 if unreadable (the job reports that file as an error)."""
+    try:
+        width, height = Image.open(io.BytesIO(raw)).size
+        return width * height
+    except Exception:
+        return 0
 
 
 # ---------------------------------------------------------------------------
@@ -521,8 +1329,22 @@ async def run_pipeline(
     steps: str = Form(...),
     filename_template: str = Form(default=DEFAULT_FILENAME_TEMPLATE),
     palette_template:  str = Form(default=DEFAULT_PALETTE_TEMPLATE),
+    max_files:   int | None   = Form(default=None),
+    max_pixels:  int | None   = Form(default=None),
+    max_seconds: float | None = Form(default=None),
+    max_work_mb: int | None   = Form(default=None),
 ):
-    """Start a pipeline job. Returns job_id immediately."""
+    """
+    Start a pipeline job. Returns job_id immediately.
+    The max_* fields can tighten the server's limits (PORYPAL_PIPELINE_MAX_*) but not lift them.
+    The steps are compiled (compile_plan) before anything is stored; an invalid step is a 400.
+    """
+    limits = PipelineLimits.from_env().tightened(
+        max_files=max_files,
+        max_pixels=max_pixels,
+        max_seconds=max_seconds,
+        max_work_bytes=max_work_mb << 20 if max_work_mb else None,
+    )
     try:
         parsed_steps = json.loads(steps)
     except json.JSONDecodeError:
@@ -530,6 +1352,10 @@ async def run_pipeline(
 
     if not parsed_steps:
         raise HTTPException(400, "steps cannot be empty")
+    plan = _compile_or_400(parsed_steps)
+
+    if 0 < limits.max_files < len(files):
+        raise HTTPException(400, f"Too many files: {len(files)} (limit {limits.max_files})")
 
     file_data: list[tuple[str, bytes]] = []
     for f in files:
@@ -539,7 +1365,27 @@ async def run_pipeline(
     if not file_data:
         raise HTTPException(400, "No files provided")
 
-    job_id = str(uuid4())
+    total_bytes = sum(len(raw) for _, raw in file_data)
+    if 0 < limits.max_work_bytes < total_bytes:
+        raise HTTPException(400, f"Uploads total {total_bytes >> 20} MB (limit {limits.max_work_bytes >> 20} MB)")
+    if limits.max_pixels > 0:
+        total_pixels = sum(_pixel_count(raw) for _, raw in file_data)
+        if total_pixels > limits.max_pixels:
+            raise HTTPException(400, f"Images total {total_pixels:,} pixels (limit {limits.max_pixels:,})")
+
+    job_store.expire()
+
+    job_id   = str(uuid4())
+    work_dir = Path(tempfile.mkdtemp(prefix=f"porypal_{job_id}_"))
+    for i, (_filename, raw) in enumerate(file_data):
+        dest = input_path(work_dir, i)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_bytes(raw)
+    job_store.create_job(
+        job_id, [name for name, _ in file_data], parsed_steps,
+        filename_template, palette_template, str(work_dir), asdict(limits),
+    )
+
     with _jobs_lock:
         _jobs[job_id] = {
             "status":       "running",
@@ -547,63 +1393,327 @@ async def run_pipeline(
             "done":         0,
             "current_file": "",
             "results":      [],
-            "zip_path":     None,
-            "work_dir":     None,
+            "entries":      [],
+            "work_dir":     str(work_dir),
+            "persisted":    True,
         }
 
     background_tasks.add_task(
         _execute_job, job_id, file_data, parsed_steps,
-        filename_template, palette_template,
+        filename_template, palette_template, None, 0, limits, plan,
     )
     return {"job_id": job_id}
 
 
-@router.get("/status/{job_id}")
-def get_status(job_id: str):
+def _read_project_files(root: Path) -> list[tuple[str, bytes]]:
+    """Every supported image under root, as (path relative to root, bytes), sorted by path."""
+    paths = sorted(
+        p for p in root.rglob("*")
+        if p.is_file() and p.suffix.lower() in SUPPORTED_FORMATS and not p.name.startswith(".")
+    )
+    return [(p.relative_to(root).as_posix(), p.read_bytes()) for p in paths]
+
+
+@router.post("/run-project")
+async def run_project_pipeline(
+    background_tasks: BackgroundTasks,
+    path: str = Form(...),     # project folder as in the palette library: "{project}/{folder}[/{subdir}]"
+    steps: str = Form(...),
+    filename_template: str = Form(default=DEFAULT_FILENAME_TEMPLATE),
+    palette_template:  str = Form(default=DEFAULT_PALETTE_TEMPLATE),
+    force: bool = Form(default=False),
+):
+    """
+    Incremental run over every image under a loaded project folder (projects.json)
+    instead of uploads.
+
+    Each file's fingerprint (its bytes + the compiled plan, including referenced
+    palette colors and preset configs) is looked up in the build cache
+    (server/build_cache.py); files whose fingerprint has an entry are not re-run,
+    their cached outputs are committed as-is. force=true evicts the entries and
+    rebuilds everything. Outputs mirror the folder tree under sprites/ and
+    palettes/, results are named by relative path and marked "cached" when
+    skipped, and the manifest summary counts them as "skipped".
+
+    Returns { job_id, total, to_build, skipped: [relative paths] } — the
+    files that will come from the cache. Progress, events and download work as
+    for /run. Project jobs are not persisted: re-running after an interruption
+    only rebuilds what had not finished.
+    """
+    try:
+        parsed_steps = json.loads(steps)
+    except json.JSONDecodeError:
+        raise HTTPException(400, "steps must be valid JSON")
+    plan = _compile_or_400(parsed_steps)
+    root = resolve_project_folder(path)
+
+    file_data = await asyncio.to_thread(_read_project_files, root)
+    if not file_data:
+        raise HTTPException(400, f"No images under '{path}'")
+    limits = PipelineLimits.from_env()
+    if 0 < limits.max_files < len(file_data):
+        raise HTTPException(400, f"Too many files: {len(file_data)} (limit {limits.max_files})")
+
+    fingerprints = [fingerprint(raw, plan.digest(), PORYPAL_VERSION) for _, raw in file_data]
+    if force:
+        for fp in fingerprints:
+            build_cache.evict(fp)
+    skipped = [name for (name, _), fp in zip(file_data, fingerprints) if fp in build_cache]
+
+    job_id = str(uuid4())
     with _jobs_lock:
-        job = _jobs.get(job_id)
+        _jobs[job_id] = {
+            "status":       "running",
+            "total":        len(file_data),
+            "done":         0,
+            "current_file": "",
+            "results":      [],
+            "entries":      [],
+            "work_dir":     None,
+            "project_path": path,
+        }
+
+    background_tasks.add_task(
+        _execute_job, job_id, file_data, parsed_steps, filename_template, palette_template,
+        None, 0, limits, plan, fingerprints=fingerprints, nested_output=True,
+    )
+    background_tasks.add_task(build_cache.prune)
+    logging.info(f"Pipeline [{job_id}] project '{path}': {len(file_data)} file(s), {len(skipped)} unchanged")
+    return {
+        "job_id":   job_id,
+        "total":    len(file_data),
+        "to_build": len(file_data) - len(skipped),
+        "skipped":  skipped,
+    }
+
+
+@router.post("/resume/{job_id}")
+def resume_pipeline(job_id: str, background_tasks: BackgroundTasks):
+    """Continue an interrupted, cancelled or failed job from its first file without a result."""
+    job = _get_job(job_id)
     if not job:
         raise HTTPException(404, f"Job '{job_id}' not found")
-    return {
+    if job["status"] not in ("interrupted", "cancelled", "error"):
+        raise HTTPException(400, f"Job is {job['status']}; only stopped jobs can be resumed")
+
+    stored = job_store.load_job(job_id)
+    if stored is None:
+        raise HTTPException(400, "Job was not persisted and cannot be resumed")
+
+    plan  = _compile_or_400(stored["steps"])   # palettes or presets may be gone since the job started
+    start = stored["next_index"]
+    file_data: list[tuple[str, bytes]] = []
+    for i, filename in enumerate(stored["filenames"][start:], start):
+        src = input_path(stored["work_dir"], i)
+        if not src.exists():
+            raise HTTPException(410, f"Input for '{filename}' is no longer available")
+        file_data.append((filename, src.read_bytes()))
+
+    job_store.set_status(job_id, "running")
+    with _jobs_lock:
+        _jobs[job_id] = {**stored, "status": "running"}
+        _notify_progress(job_id)
+
+    # The limits the job was started with, still capped by the server's current ones
+    limits = PipelineLimits.from_env().tightened(**(stored["limits"] or {}))
+    background_tasks.add_task(
+        _execute_job, job_id, file_data, stored["steps"],
+        stored["filename_template"], stored["palette_template"], None, start,
+        limits, plan,
+    )
+    return {"job_id": job_id, "resumed_from": start, "remaining": len(file_data)}
+
+
+@router.get("/status/{job_id}")
+def get_status(job_id: str, since: int | None = None):
+    """
+    Job progress. With ?since=N only results[N:] are returned, plus "next" — the
+    cursor to pass on the following poll — so pollers don't re-fetch every result.
+    deduplicated / compute_saved_ms count the files that reused a pixel-identical
+    earlier file's result.
+    """
+    job = _get_job(job_id)
+    if not job:
+        raise HTTPException(404, f"Job '{job_id}' not found")
+    with _jobs_lock:
+        start   = max(0, since or 0)
+        results = job["results"][start:]
+        body = {
+            "status":       job["status"],
+            "total":        job["total"],
+            "done":         job["done"],
+            "current_file": job["current_file"],
+            "results":      results,
+            **_dedup_summary(job["results"]),
+        }
+        if job.get("cancel_reason"):
+            body["reason"] = job["cancel_reason"]
+    if since is not None:
+        body.update({"since": start, "next": start + len(results)})
+    return body
+
+
+def _notify_progress(job_id: str) -> None:
+    """Wake the /events streams of *job_id* after a new result or status change (caller holds _jobs_lock)."""
+    for loop, event in _progress_waiters.get(job_id, ()):
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:   # that stream's loop has closed
+            pass
+
+
+def _progress_snapshot(job_id: str, seen: int) -> tuple[list[dict], dict] | None:
+    """(results beyond *seen*, status snapshot), or None if the job is gone (caller holds _jobs_lock)."""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    return job["results"][seen:], {
         "status":       job["status"],
-        "total":        job["total"],
         "done":         job["done"],
+        "total":        job["total"],
         "current_file": job["current_file"],
-        "results":      job["results"],
+        "reason":       job.get("cancel_reason"),
     }
 
 
+async def _wait_for_progress(job_id: str, seen: int, timeout: float) -> tuple[list[dict], dict] | None:
+    """
+    Wait until the job has results beyond *seen* or is no longer running (or
+    timeout), without holding a thread. Returns (new results, status
+    snapshot), or None if the job is gone.
+    """
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with _jobs_lock:
+        snapshot = _progress_snapshot(job_id, seen)
+        if snapshot is None or snapshot[0] or snapshot[1]["status"] != "running":
+            return snapshot
+        _progress_waiters.setdefault(job_id, set()).add(waiter)
+    try:
+        await asyncio.wait_for(waiter[1].wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        with _jobs_lock:
+            waiters = _progress_waiters.get(job_id, set())
+            waiters.discard(waiter)
+            if not waiters:
+                _progress_waiters.pop(job_id, None)
+    with _jobs_lock:
+        return _progress_snapshot(job_id, seen)
+
+
+def _sse(event: str, data: dict, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/events/{job_id}")
+async def job_events(job_id: str, request: Request, since: int = 0):
+    """
+    Server-Sent Events progress stream.
+
+      event: file — one per finished file, in input order:
+                    { index, file, status, palette, notes, elapsed_ms, done, total
+                      [, deduplicated_from] }
+                    The SSE id is index + 1, so reconnecting with Last-Event-ID
+                    (or ?since=N) resumes after the last file seen.
+      event: end  — once the job stops running: { status, done, total[, reason] }
+
+    A comment line is sent every SSE_HEARTBEAT_S seconds while nothing happens.
+    """
+    if not _get_job(job_id):
+        raise HTTPException(404, f"Job '{job_id}' not found")
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = max(since, int(last_event_id))
+
+    async def stream():
+        seen = max(0, since)
+        while not await request.is_disconnected():
+            snapshot = await _wait_for_progress(job_id, seen, SSE_HEARTBEAT_S)
+            if snapshot is None:
+                yield _sse("end", {"status": "deleted", "done": seen, "total": seen})
+                return
+            new_results, info = snapshot
+            for result in new_results:
+                seen += 1
+                event = {
+                    "index":      seen - 1,
+                    "file":       result["file"],
+                    "status":     result["status"],
+                    "palette":    result.get("palette"),
+                    "notes":      result.get("notes", ""),
+                    "elapsed_ms": result.get("elapsed_ms"),
+                    "done":       seen,
+                    "total":      info["total"],
+                }
+                if result.get("deduplicated_from"):
+                    event["deduplicated_from"] = result["deduplicated_from"]
+                yield _sse("file", event, event_id=seen)
+            if info["status"] != "running":
+                end = {"status": info["status"], "done": info["done"], "total": info["total"]}
+                if info["reason"]:
+                    end["reason"] = info["reason"]
+                yield _sse("end", end)
+                return
+            if not new_results:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/download/{job_id}")
 def download_results(job_id: str):
+    """
+    Stream the job's results as a zip, built on the fly from the files written so far.
+    While the job is still running this is a partial archive (manifest "complete": false).
+    """
+    job = _get_job(job_id)
     with _jobs_lock:
-        job = _jobs.get(job_id)
+        if job:
+            job     = dict(job)
+            entries = list(job.get("entries", []))
+            results = list(job["results"])
     if not job:
         raise HTTPException(404, f"Job '{job_id}' not found")
-    if job["status"] != "done":
-        raise HTTPException(400, "Job is not done yet")
-    zip_path = Path(job["zip_path"])
-    if not zip_path.exists():
-        raise HTTPException(500, "Result zip not found")
-
-    def iter_zip():
-        with open(zip_path, "rb") as f:
-            while chunk := f.read(65536):
-                yield chunk
 
+    filename = "pipeline_results.zip" if job["status"] == "done" else "pipeline_results_partial.zip"
     return StreamingResponse(
-        iter_zip(),
+        stream_zip(_iter_result_zip_entries(job, entries, results)),
         media_type="application/zip",
-        headers={"Content-Disposition": 'attachment; filename="pipeline_results.zip"'},
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+@router.post("/cancel/{job_id}")
+def cancel_job(job_id: str):
+    """Stop a running job after the files in flight; results so far stay downloadable."""
+    job = _get_job(job_id)
+    if not job:
+        raise HTTPException(404, f"Job '{job_id}' not found")
+    if not _request_cancel(job_id, "cancelled by request"):
+        raise HTTPException(400, f"Job is {job['status']}; only running jobs can be cancelled")
+    return {"job_id": job_id, "status": "cancelling"}
+
+
 @router.delete("/{job_id}")
 def cleanup_job(job_id: str):
-    with _jobs_lock:
-        job = _jobs.pop(job_id, None)
+    job = _get_job(job_id)
     if not job:
         raise HTTPException(404, f"Job '{job_id}' not found")
+    _request_cancel(job_id, "deleted")
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+        _notify_progress(job_id)
+        running = job["status"] == "running" and job.get("started", False)
+        if running:
+            job["deleted"] = True   # _execute_job removes work_dir once it stops
+    job_store.delete_job(job_id)
     work_dir = job.get("work_dir")
-    if work_dir and Path(work_dir).exists():
+    if not running and work_dir and Path(work_dir).exists():
         shutil.rmtree(work_dir, ignore_errors=True)
     return {"deleted": job_id}
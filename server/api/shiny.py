@@ -1,12 +1,18 @@
 """
 server/api/shiny.py
+
+Extraction, remapping and zip building run on the shared compute pool
+(server/compute.py).
+
+/extract-matched keeps the matched pair in server/artifact_store.py together
+with the n_colors and bg_color it was extracted with; /extract-matched/download
+takes the artifact_id instead of the sprites and answers 409 if it is sent
+other settings.
 """
 
 from __future__ import annotations
 import io
 import json
-import os
-import tempfile
 import zipfile
 from pathlib import Path
 
@@ -16,12 +22,19 @@ from PIL import Image
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
 
+from model.color_keys import unique_rgb
 from model.palette import Color, Palette
-from server.helpers import pil_to_b64, make_pal_content, save_png
+from model.slot_map import indexed_image
+from server.artifact_store import artifact_store, load_artifact
+from server.compute import run_compute
+from server.helpers import bg_hex, pil_to_b64, make_pal_content, save_png
 from server.state import state
 
 router = APIRouter(prefix="/api/shiny", tags=["shiny"])
 
+DEFAULT_BG       = "#73C5A4"
+DEFAULT_N_COLORS = 15
+
 
 def _parse_hex(hex_color: str) -> Color:
     h = hex_color.lstrip('#')
@@ -36,62 +49,46 @@ def _remap_sprite(sprite_px: np.ndarray, normal_colors: list[Color], shiny_color
     """
     Remap sprite pixels: find the nearest color in normal_colors for each pixel,
     then output a paletted image using shiny_colors at the same indices.
+
+    Transparent pixels (alpha < 128) and the background color map to slot 0.
+    Each distinct opaque color is matched once (squared RGB distance over
+    slots 1.., first slot wins ties) and the slots are gathered back onto the
+    pixels; slots beyond the shiny palette fall back to 0.
     """
     h, w = sprite_px.shape[:2]
-    rgb   = sprite_px[:, :, :3]
-    alpha = sprite_px[:, :, 3]
+    rgb    = sprite_px[:, :, :3].reshape(-1, 3)
+    opaque = sprite_px[:, :, 3].reshape(-1) >= 128
 
-    normal_rgb = np.array([c.to_tuple() for c in normal_colors], dtype=np.uint8)
-    shiny_rgb  = np.array([c.to_tuple() for c in shiny_colors],  dtype=np.uint8)
-
-    flat_rgb   = rgb.reshape(-1, 3).astype(np.uint8)
-    flat_alpha = alpha.flatten()
+    normal_rgb = np.array([c.to_tuple() for c in normal_colors], dtype=np.int32)
     index_flat = np.zeros(h * w, dtype=np.uint8)
-    bg_rgb     = normal_rgb[0]
-
-    for i in range(h * w):
-        if flat_alpha[i] < 128:
-            index_flat[i] = 0
-            continue
-        px = flat_rgb[i]
-        if np.all(px == bg_rgb):
-            index_flat[i] = 0
-            continue
-        dists  = ((normal_rgb[1:].astype(np.int32) - px.astype(np.int32)) ** 2).sum(axis=1)
-        idx    = int(dists.argmin()) + 1
-        index_flat[i] = idx if idx < len(shiny_rgb) else 0
-
-    out = Image.new("P", (w, h))
-    pal_data: list[int] = []
-    for c in shiny_colors:
-        pal_data += list(c.to_tuple())
-    pal_data += [0] * (768 - len(pal_data))
-    out.putpalette(pal_data)
-    out.putdata(index_flat.tolist())
-    out.info["transparency"] = 0
-    return out
+
+    if opaque.any():
+        colors, inverse = unique_rgb(rgb[opaque])
+        colors = colors.astype(np.int32)
+        fg     = ~(colors == normal_rgb[0]).all(axis=1)
+        slots  = np.zeros(len(colors), dtype=np.intp)
+        if fg.any():
+            dists = ((colors[fg, None, :] - normal_rgb[None, 1:, :]) ** 2).sum(axis=2)
+            slots[fg] = dists.argmin(axis=1) + 1
+        slots[slots >= len(shiny_colors)] = 0
+        index_flat[opaque] = slots[inverse]
+
+    return indexed_image(index_flat.reshape(h, w), shiny_colors)
 
 
 def _extract_normal_palette(image_data: bytes, filename: str, n_colors: int, bg_color: str) -> Palette:
     """
     Extract a clean palette using the shared extractor (same as Extract tab).
-    Writes to a temp file, calls state.extractor.extract(), cleans up.
+    Hands the upload bytes straight to state.extractor.extract().
     """
-    suffix = Path(filename).suffix or ".png"
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(image_data)
-        tmp_path = tmp.name
-    try:
-        palette, _method = state.extractor.extract(
-            tmp_path,
-            n_colors=n_colors,
-            bg_color=bg_color,
-            color_space="oklab",
-            name=Path(filename).stem,
-        )
-        return palette
-    finally:
-        os.unlink(tmp_path)
+    palette, _method = state.extractor.extract(
+        image_data,
+        n_colors=n_colors,
+        bg_color=bg_color,
+        color_space="oklab",
+        name=Path(filename).stem,
+    )
+    return palette
 
 
 def _build_shiny_palette(
@@ -155,25 +152,99 @@ def _build_shiny_palette(
     )
 
 
+def _match_pair(
+    normal_data: bytes, shiny_data: bytes, filename: str, n_colors: int, bg_color: str,
+) -> tuple[np.ndarray, Palette, Palette]:
+    """Decode both sprites and build the slot-matched (normal, shiny) palettes."""
+    normal_px = _load_rgba(normal_data)
+    shiny_px  = _load_rgba(shiny_data)
+
+    if normal_px.shape != shiny_px.shape:
+        raise HTTPException(400, "Normal and shiny sprites must be the same dimensions")
+
+    normal_pal = _extract_normal_palette(normal_data, filename, n_colors, bg_color)
+    shiny_pal  = _build_shiny_palette(normal_pal, normal_px, shiny_px, bg_color)
+    return normal_px, normal_pal, shiny_pal
+
+
+def _pair_zip(normal_px: np.ndarray, normal_pal: Palette, shiny_pal: Palette, stem_n: str, stem_s: str) -> io.BytesIO:
+    normal_img = _remap_sprite(normal_px, normal_pal.colors, normal_pal.colors)
+    shiny_img  = _remap_sprite(normal_px, normal_pal.colors, shiny_pal.colors)
+
+    zip_buf = io.BytesIO()
+    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(f"palettes/{stem_n}.pal",       make_pal_content(normal_pal))
+        zf.writestr(f"palettes/{stem_s}_shiny.pal", make_pal_content(shiny_pal))
+        zf.writestr(f"sprites/{stem_n}.png",        save_png(normal_img))
+        zf.writestr(f"sprites/{stem_s}_shiny.png",  save_png(shiny_img))
+        manifest = {
+            "files": [
+                {"name": stem_n, "palette": f"palettes/{stem_n}.pal",           "sprite": f"sprites/{stem_n}.png"},
+                {"name": stem_s, "palette": f"palettes/{stem_s}_shiny.pal",     "sprite": f"sprites/{stem_s}_shiny.png"},
+            ]
+        }
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+    zip_buf.seek(0)
+    return zip_buf
+
+
+def _apply_zip(
+    sprite_data: bytes, normal_colors: list[Color], shiny_colors: list[Color],
+    stem: str, normal_name: str, shiny_name: str,
+) -> io.BytesIO:
+    sprite_px = _load_rgba(sprite_data)
+
+    normal_img = _remap_sprite(sprite_px, normal_colors, normal_colors)
+    shiny_img  = _remap_sprite(sprite_px, normal_colors, shiny_colors)
+
+    # Wrap raw color lists in Palette objects so make_pal_content works
+    normal_palette_obj = Palette(name=normal_name, colors=normal_colors)
+    shiny_palette_obj  = Palette(name=shiny_name,  colors=shiny_colors)
+
+    zip_buf = io.BytesIO()
+    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(f"sprites/{stem}.png",             save_png(normal_img))
+        zf.writestr(f"sprites/{stem}_shiny.png",       save_png(shiny_img))
+        zf.writestr(f"palettes/{normal_name}.pal",     make_pal_content(normal_palette_obj))
+        zf.writestr(f"palettes/{shiny_name}.pal",      make_pal_content(shiny_palette_obj))
+        manifest = {
+            "files": [
+                {"name": stem,            "sprite": f"sprites/{stem}.png",       "palette": f"palettes/{normal_name}.pal"},
+                {"name": f"{stem}_shiny", "sprite": f"sprites/{stem}_shiny.png", "palette": f"palettes/{shiny_name}.pal"},
+            ]
+        }
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+    zip_buf.seek(0)
+    return zip_buf
+
+
 @router.post("/extract-matched")
 async def extract_matched_palettes(
     normal_file: UploadFile = File(...),
     shiny_file:  UploadFile = File(...),
-    n_colors: int = Form(default=15),
-    bg_color: str = Form(default="#73C5A4"),
+    n_colors: int = Form(default=DEFAULT_N_COLORS),
+    bg_color: str = Form(default=DEFAULT_BG),
 ):
     normal_data = await normal_file.read()
     shiny_data  = await shiny_file.read()
-    normal_px   = _load_rgba(normal_data)
-    shiny_px    = _load_rgba(shiny_data)
-
-    if normal_px.shape != shiny_px.shape:
-        raise HTTPException(400, "Normal and shiny sprites must be the same dimensions")
+    normal_px, normal_pal, shiny_pal = await run_compute(
+        _match_pair, normal_data, shiny_data, normal_file.filename, n_colors, bg_color,
+    )
 
-    normal_pal = _extract_normal_palette(normal_data, normal_file.filename, n_colors, bg_color)
-    shiny_pal  = _build_shiny_palette(normal_pal, normal_px, shiny_px, bg_color)
+    artifact_id = artifact_store.put("shiny.matched", {
+        "normal_pal": normal_pal,
+        "shiny_pal":  shiny_pal,
+        "normal_px":  normal_px,
+        "stem_n":     Path(normal_file.filename).stem,
+        "stem_s":     Path(shiny_file.filename).stem,
+        "n_colors":   n_colors,
+        "bg_color":   bg_hex(bg_color),
+    })
 
     return {
+        "artifact_id": artifact_id,
         "normal": {
             "name":        normal_pal.name,
             "colors":      [c.to_hex() for c in normal_pal.colors],
@@ -189,43 +260,42 @@ async def extract_matched_palettes(
 
 @router.post("/extract-matched/download")
 async def download_matched_palettes(
-    normal_file: UploadFile = File(...),
-    shiny_file:  UploadFile = File(...),
-    n_colors: int = Form(default=15),
-    bg_color: str = Form(default="#73C5A4"),
+    normal_file: UploadFile | None = File(default=None),
+    shiny_file:  UploadFile | None = File(default=None),
+    n_colors: int | None = Form(default=None),
+    bg_color: str | None = Form(default=None),
+    artifact_id: str | None = Form(default=None),
 ):
-    normal_data = await normal_file.read()
-    shiny_data  = await shiny_file.read()
-    normal_px   = _load_rgba(normal_data)
-    shiny_px    = _load_rgba(shiny_data)
-
-    if normal_px.shape != shiny_px.shape:
-        raise HTTPException(400, "Normal and shiny sprites must be the same dimensions")
-
-    normal_pal = _extract_normal_palette(normal_data, normal_file.filename, n_colors, bg_color)
-    shiny_pal  = _build_shiny_palette(normal_pal, normal_px, shiny_px, bg_color)
-
-    stem_n = Path(normal_file.filename).stem
-    stem_s = Path(shiny_file.filename).stem
-
-    normal_img = _remap_sprite(normal_px, normal_pal.colors, normal_pal.colors)
-    shiny_img  = _remap_sprite(normal_px, normal_pal.colors, shiny_pal.colors)
+    """
+    Zip the matched pair. With artifact_id (from /extract-matched) the sprites
+    are not re-uploaded or re-extracted; n_colors and bg_color, if sent, must
+    match the artifact's (409 otherwise).
+    """
+    if artifact_id:
+        matched    = load_artifact(artifact_id, "shiny.matched")
+        if n_colors is not None and n_colors != matched["n_colors"]:
+            raise HTTPException(409, f"Artifact was extracted with n_colors {matched['n_colors']}, not {n_colors}")
+        if bg_color and bg_hex(bg_color) != matched["bg_color"]:
+            raise HTTPException(409, f"Artifact was extracted with bg_color {matched['bg_color']}, not {bg_hex(bg_color)}")
+        normal_pal = matched["normal_pal"]
+        shiny_pal  = matched["shiny_pal"]
+        normal_px  = matched["normal_px"]
+        stem_n     = matched["stem_n"]
+        stem_s     = matched["stem_s"]
+    else:
+        if normal_file is None or shiny_file is None:
+            raise HTTPException(400, "Either both sprites or artifact_id is required")
+        normal_data = await normal_file.read()
+        shiny_data  = await shiny_file.read()
+        normal_px, normal_pal, shiny_pal = await run_compute(
+            _match_pair, normal_data, shiny_data, normal_file.filename,
+            DEFAULT_N_COLORS if n_colors is None else n_colors, bg_color or DEFAULT_BG,
+        )
 
-    zip_buf = io.BytesIO()
-    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr(f"palettes/{stem_n}.pal",       make_pal_content(normal_pal))
-        zf.writestr(f"palettes/{stem_s}_shiny.pal", make_pal_content(shiny_pal))
-        zf.writestr(f"sprites/{stem_n}.png",        save_png(normal_img))
-        zf.writestr(f"sprites/{stem_s}_shiny.png",  save_png(shiny_img))
-        manifest = {
-            "files": [
-                {"name": stem_n, "palette": f"palettes/{stem_n}.pal",           "sprite": f"sprites/{stem_n}.png"},
-                {"name": stem_s, "palette": f"palettes/{stem_s}_shiny.pal",     "sprite": f"sprites/{stem_s}_shiny.png"},
-            ]
-        }
-        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+        stem_n = Path(normal_file.filename).stem
+        stem_s = Path(shiny_file.filename).stem
 
-    zip_buf.seek(0)
+    zip_buf = await run_compute(_pair_zip, normal_px, normal_pal, shiny_pal, stem_n, stem_s)
     return StreamingResponse(
         zip_buf,
         media_type="application/zip",
@@ -248,34 +318,12 @@ async def download_apply_shiny(
     except Exception:
         raise HTTPException(400, "Invalid palette JSON")
 
-    sprite_px = _load_rgba(await sprite_file.read())
-
-    normal_img = _remap_sprite(sprite_px, normal_colors, normal_colors)
-    shiny_img  = _remap_sprite(sprite_px, normal_colors, shiny_colors)
-
+    sprite_data = await sprite_file.read()
     stem        = sprite_name or Path(sprite_file.filename).stem
     normal_name = normal_pal_name.replace('.pal', '')
     shiny_name  = shiny_pal_name.replace('.pal', '')
 
-    # Wrap raw color lists in Palette objects so make_pal_content works
-    normal_palette_obj = Palette(name=normal_name, colors=normal_colors)
-    shiny_palette_obj  = Palette(name=shiny_name,  colors=shiny_colors)
-
-    zip_buf = io.BytesIO()
-    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr(f"sprites/{stem}.png",             save_png(normal_img))
-        zf.writestr(f"sprites/{stem}_shiny.png",       save_png(shiny_img))
-        zf.writestr(f"palettes/{normal_name}.pal",     make_pal_content(normal_palette_obj))
-        zf.writestr(f"palettes/{shiny_name}.pal",      make_pal_content(shiny_palette_obj))
-        manifest = {
-            "files": [
-                {"name": stem,            "sprite": f"sprites/{stem}.png",       "palette": f"palettes/{normal_name}.pal"},
-                {"name": f"{stem}_shiny", "sprite": f"sprites/{stem}_shiny.png", "palette": f"palettes/{shiny_name}.pal"},
-            ]
-        }
-        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
-
-    zip_buf.seek(0)
+    zip_buf = await run_compute(_apply_zip, sprite_data, normal_colors, shiny_colors, stem, normal_name, shiny_name)
     return StreamingResponse(
         zip_buf,
         media_type="application/zip",
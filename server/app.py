@@ -1,6 +1,7 @@
 from __future__ import annotations
 import logging
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -11,10 +12,19 @@ from server.api import (
     pipeline, items, shiny,
 )
 from server import preset_store as presets
+from server.compute import compute
 
 logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 
-app = FastAPI(title="Porypal API", version="3.3.0")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    pipeline.recover_jobs()
+    yield
+    compute.shutdown()
+
+
+app = FastAPI(title="Porypal API", version="3.3.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,156 @@
+"""
+server/artifact_store.py
+
+Short-lived, in-memory results of preview routes, so the matching download
+route can build its zip from an artifact_id instead of having the client
+re-upload every file and the server recompute everything.
+
+A preview route stores whatever its download needs (rendered PNG bytes,
+.pal content, palettes, lazily-rendered conversion results, …) under a kind
+("items.groups", "convert", …) and returns the id. Artifacts expire after
+PORYPAL_ARTIFACT_TTL_S seconds (default 30 min) and the store is bounded by
+PORYPAL_ARTIFACT_MAX_MB (default 256) and MAX_ARTIFACTS entries; the least
+recently used artifacts go first.
+"""
+
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+from uuid import uuid4
+
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image
+
+
+DEFAULT_TTL_S  = 1800.0
+DEFAULT_MAX_MB = 256.0
+MAX_ARTIFACTS  = 256
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        logging.warning(f"Ignoring invalid {name}={raw!r}")
+        return default
+
+
+def estimate_size(obj: Any, _seen: set | None = None) -> int:
+    """Rough byte size of an artifact payload (buffers, strings, images and containers)."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, Image.Image):
+        return obj.width * obj.height * len(obj.getbands())
+    if isinstance(obj, dict):
+        return sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(estimate_size(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return estimate_size(vars(obj), seen)
+    return 8
+
+
+@dataclass
+class _Artifact:
+    kind:      str
+    payload:   Any
+    size:      int
+    last_used: float
+
+
+class ArtifactStore:
+    """Thread-safe TTL + LRU store of preview results."""
+
+    def __init__(
+        self,
+        ttl_s: float = DEFAULT_TTL_S,
+        max_bytes: int = int(DEFAULT_MAX_MB * 1024 * 1024),
+        max_entries: int = MAX_ARTIFACTS,
+    ):
+        self.ttl_s       = ttl_s
+        self.max_bytes   = max_bytes
+        self.max_entries = max_entries
+        self._items: OrderedDict[str, _Artifact] = OrderedDict()
+        self._bytes = 0
+        self._lock  = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ArtifactStore":
+        return cls(
+            ttl_s=_env_float("PORYPAL_ARTIFACT_TTL_S", DEFAULT_TTL_S),
+            max_bytes=int(_env_float("PORYPAL_ARTIFACT_MAX_MB", DEFAULT_MAX_MB) * 1024 * 1024),
+        )
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, kind: str, payload: Any, size: int | None = None) -> str:
+        """
+        Store payload and return its artifact id. Evicts expired, then least
+        recently used, artifacts. size overrides estimate_size() for payloads
+        holding memory it cannot see (e.g. lazy renderers).
+        """
+        artifact_id = uuid4().hex
+        size = estimate_size(payload) if size is None else size
+        now  = time.monotonic()
+        with self._lock:
+            self._items[artifact_id] = _Artifact(kind, payload, size, now)
+            self._bytes += size
+            self._evict(now)
+        return artifact_id
+
+    def get(self, artifact_id: str, kind: str) -> Any | None:
+        """The payload, or None if unknown, expired or of another kind."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            item = self._items.get(artifact_id)
+            if item is None or item.kind != kind:
+                return None
+            item.last_used = now
+            self._items.move_to_end(artifact_id)
+            return item.payload
+
+    def discard(self, artifact_id: str) -> None:
+        with self._lock:
+            item = self._items.pop(artifact_id, None)
+            if item is not None:
+                self._bytes -= item.size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"artifacts": len(self._items), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _evict(self, now: float) -> None:
+        for artifact_id, item in list(self._items.items()):   # least recently used first
+            over = len(self._items) > self.max_entries or self._bytes > self.max_bytes
+            if not over and now - item.last_used <= self.ttl_s:
+                continue
+            if len(self._items) == 1 and now - item.last_used <= self.ttl_s:
+                break   # never evict the artifact that was just stored
+            del self._items[artifact_id]
+            self._bytes -= item.size
+
+
+def load_artifact(artifact_id: str, kind: str) -> Any:
+    """Route helper: the payload, or 404 if the artifact is unknown or has expired."""
+    payload = artifact_store.get(artifact_id, kind)
+    if payload is None:
+        raise HTTPException(404, f"Artifact '{artifact_id}' not found or expired; re-run the preview")
+    return payload
+
+
+artifact_store = ArtifactStore.from_env()
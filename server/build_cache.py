@@ -0,0 +1,154 @@
+"""
+server/build_cache.py
+
+On-disk build cache for incremental pipeline runs over a project folder
+(POST /api/pipeline/run-project).
+
+Entries are content-addressed by a per-file fingerprint: the sha256 of the
+input file's bytes together with PipelinePlan.digest() (compiled step
+parameters, the colors of every referenced palette, each tileset preset's
+config) and the PoryPal version. A file is only re-run when its fingerprint
+has no entry, i.e. when the sprite, the steps or anything they reference
+changed. Output names are not part of an entry — they are derived from the
+filename when the entry is committed — so a renamed or moved sprite still hits.
+
+Layout: <dir>/<fp[:2]>/<fp>/{meta.json, sprite.png}. meta.json holds the
+file's result (status, palette, notes, elapsed_ms) and any extracted palettes.
+The directory is PORYPAL_BUILD_CACHE_DIR (default "build_cache" in the working
+directory) and is pruned, least recently used first, to PORYPAL_BUILD_CACHE_MB
+(default 512).
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+DEFAULT_DIR    = "build_cache"
+DEFAULT_MAX_MB = 512.0
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        logging.warning(f"Ignoring invalid {name}={raw!r}")
+        return default
+
+
+def fingerprint(raw_bytes: bytes, plan_digest: str, version: str) -> str:
+    """Cache key of one input file under a compiled plan."""
+    content = hashlib.sha256(raw_bytes).hexdigest()
+    return hashlib.sha256(f"{version};{plan_digest};{content}".encode()).hexdigest()
+
+
+@dataclass
+class BuildEntry:
+    """What one file's steps produced, independent of its name."""
+    result:    dict                                  # status, palette, notes, elapsed_ms
+    out_bytes: bytes | None = None
+    palettes:  list[tuple[list[str], str]] = field(default_factory=list)   # (hex colors, color_space)
+
+
+class BuildCache:
+    """Thread-safe fingerprint → BuildEntry store on disk."""
+
+    def __init__(self, root: str | Path | None = None, max_mb: float | None = None):
+        self.root   = Path(root or os.environ.get("PORYPAL_BUILD_CACHE_DIR", "").strip() or DEFAULT_DIR)
+        self.max_mb = _env_float("PORYPAL_BUILD_CACHE_MB", DEFAULT_MAX_MB) if max_mb is None else max_mb
+        self.hits   = 0
+        self.misses = 0
+        self._lock  = threading.Lock()
+
+    def _entry_dir(self, fp: str) -> Path:
+        return self.root / fp[:2] / fp
+
+    def __contains__(self, fp: str) -> bool:
+        return (self._entry_dir(fp) / "meta.json").exists()
+
+    def evict(self, fp: str) -> None:
+        shutil.rmtree(self._entry_dir(fp), ignore_errors=True)
+
+    def get(self, fp: str) -> BuildEntry | None:
+        entry_dir = self._entry_dir(fp)
+        try:
+            meta = json.loads((entry_dir / "meta.json").read_text(encoding="utf-8"))
+            sprite = entry_dir / "sprite.png"
+            out_bytes = sprite.read_bytes() if meta.get("has_sprite") else None
+            os.utime(entry_dir)   # recency for prune()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable build cache entry {fp}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return BuildEntry(
+            result=meta["result"],
+            out_bytes=out_bytes,
+            palettes=[(p["colors"], p["color_space"]) for p in meta.get("palettes", [])],
+        )
+
+    def put(self, fp: str, entry: BuildEntry) -> None:
+        """Store an entry; written to a temporary directory first, then moved into place."""
+        entry_dir = self._entry_dir(fp)
+        if entry_dir.exists():
+            return
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{fp[:8]}_", dir=entry_dir.parent))
+        try:
+            if entry.out_bytes is not None:
+                (tmp / "sprite.png").write_bytes(entry.out_bytes)
+            meta = {
+                "result":     entry.result,
+                "has_sprite": entry.out_bytes is not None,
+                "palettes":   [{"colors": colors, "color_space": cs} for colors, cs in entry.palettes],
+            }
+            (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, entry_dir)
+        except OSError as e:
+            if not entry_dir.exists():
+                logging.warning(f"Could not store build cache entry {fp}: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def prune(self) -> int:
+        """Drop the least recently used entries until the cache fits in max_mb. Returns how many."""
+        if not self.root.exists():
+            return 0
+        entries = []
+        for entry_dir in self.root.glob("*/*"):
+            if entry_dir.is_dir() and not entry_dir.name.startswith("."):
+                size = sum(f.stat().st_size for f in entry_dir.iterdir() if f.is_file())
+                entries.append((entry_dir.stat().st_mtime, size, entry_dir))
+        total  = sum(size for _, size, _ in entries)
+        budget = self.max_mb * 1024 * 1024
+        pruned = 0
+        for _mtime, size, entry_dir in sorted(entries):
+            if total <= budget:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total  -= size
+            pruned += 1
+        if pruned:
+            logging.info(f"Pruned {pruned} build cache entr{'y' if pruned == 1 else 'ies'}")
+        return pruned
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"dir": str(self.root), "hits": self.hits, "misses": self.misses}
+
+
+build_cache = BuildCache()
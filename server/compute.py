@@ -0,0 +1,233 @@
+"""
+server/compute.py
+
+Shared executor for the CPU-heavy parts of request handlers (k-means, pixel
+remapping, PNG encoding, zip building), so async routes never run them on the
+event loop and one heavy request cannot stall /api/health or library browsing.
+
+  result = await run_compute(fn, *args, **kwargs)
+
+Work runs on a thread pool of PORYPAL_COMPUTE_WORKERS threads (default: one
+per CPU, at most 8); numpy and Pillow release the GIL for the heavy parts.
+At most PORYPAL_COMPUTE_QUEUE tasks (default 4 per worker) may wait for a
+thread; beyond that run_compute raises HTTP 503 with a Retry-After header
+instead of queueing without bound. Queue depth, running tasks and totals are
+reported by /api/health.
+
+Routes that stream their results fan out with map_compute() instead: after
+admit_compute() has let the request in (503 when saturated), it keeps at most
+`window` of the request's tasks on the pool and waits for a free slot rather
+than failing halfway through a response. The async equivalent for a request's
+own follow-up tasks is run_compute_waiting().
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator
+
+from fastapi import HTTPException
+
+
+DEFAULT_MAX_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_QUEUE_PER_WORKER = 4
+SATURATED_POLL_S = 0.05   # map_compute's wait for a slot when none of its own tasks is in flight
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    try:
+        return max(1, int(raw)) if raw else default
+    except ValueError:
+        logging.warning(f"Ignoring invalid {name}={raw!r}")
+        return default
+
+
+class ComputeSaturated(Exception):
+    """Raised by ComputeExecutor.submit() when the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Compute queue is full; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ComputeExecutor:
+    """Bounded thread pool with queue-depth accounting."""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, max_queue: int | None = None):
+        self.max_workers = max_workers
+        self.max_queue   = max_queue if max_queue is not None else max_workers * DEFAULT_QUEUE_PER_WORKER
+        self._pool       = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="compute")
+        self._lock       = threading.Lock()
+        self._queued     = 0
+        self._running    = 0
+        self.completed   = 0
+        self.failed      = 0
+        self.rejected    = 0
+        self._avg_s      = 0.0   # exponential moving average of task run time
+
+    @classmethod
+    def from_env(cls) -> "ComputeExecutor":
+        workers = _env_int("PORYPAL_COMPUTE_WORKERS", DEFAULT_MAX_WORKERS)
+        return cls(
+            max_workers=workers,
+            max_queue=_env_int("PORYPAL_COMPUTE_QUEUE", workers * DEFAULT_QUEUE_PER_WORKER),
+        )
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up (at least 1)."""
+        with self._lock:
+            waves = (self._queued + self._running) / self.max_workers
+            return max(1, math.ceil(waves * self._avg_s))
+
+    def _full(self) -> bool:
+        """Whether every worker and queue slot is taken (caller holds the lock)."""
+        return self._queued + self._running >= self.max_workers + self.max_queue
+
+    def check(self) -> None:
+        """Raise ComputeSaturated if a submit() right now would be rejected."""
+        with self._lock:
+            if self._full():
+                self.rejected += 1
+                saturated = True
+            else:
+                saturated = False
+        if saturated:
+            raise ComputeSaturated(self.retry_after())
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """Schedule fn on the pool; raises ComputeSaturated when the queue is full."""
+        with self._lock:
+            if self._full():
+                self.rejected += 1
+                saturated = True
+            else:
+                self._queued += 1
+                saturated = False
+        if saturated:
+            raise ComputeSaturated(self.retry_after())
+        future = self._pool.submit(self._run, fn, args, kwargs)
+        future.add_done_callback(self._release_if_cancelled)
+        return future
+
+    def _release_if_cancelled(self, future: Future) -> None:
+        # A task cancelled while queued never reaches _run(), which would free its slot.
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Await fn(*args, **kwargs) on the pool."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers":    self.max_workers,
+                "max_queue":  self.max_queue,
+                "queued":     self._queued,
+                "running":    self._running,
+                "completed":  self.completed,
+                "failed":     self.failed,
+                "rejected":   self.rejected,
+                "avg_task_s": round(self._avg_s, 4),
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self._queued  -= 1
+            self._running += 1
+        started = time.monotonic()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._avg_s = elapsed if self._avg_s == 0 else 0.8 * self._avg_s + 0.2 * elapsed
+
+
+compute = ComputeExecutor.from_env()
+
+
+def _busy(e: ComputeSaturated) -> HTTPException:
+    return HTTPException(503, str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def run_compute(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Route helper: run fn on the shared compute pool, or 503 + Retry-After when saturated."""
+    try:
+        return await compute.run(fn, *args, **kwargs)
+    except ComputeSaturated as e:
+        raise _busy(e)
+
+
+async def run_compute_waiting(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    run_compute for the follow-up tasks of a request that is already being
+    served: when the pool is saturated it waits for a slot instead of raising 503.
+    """
+    while True:
+        try:
+            return await compute.run(fn, *args, **kwargs)
+        except ComputeSaturated:
+            await asyncio.sleep(SATURATED_POLL_S)
+
+
+def admit_compute() -> None:
+    """Route helper for streamed work: 503 + Retry-After now if the pool is saturated."""
+    try:
+        compute.check()
+    except ComputeSaturated as e:
+        raise _busy(e)
+
+
+def map_compute(fn: Callable, arg_lists: Iterable[tuple], window: int) -> Iterator[tuple[int, Any]]:
+    """
+    Run fn(*args) for every args tuple on the shared pool, at most *window*
+    at a time, and yield (index, result) as each finishes. A full queue makes
+    it wait for its own tasks (or SATURATED_POLL_S when none is in flight)
+    instead of raising. Exceptions from fn propagate; closing the iterator
+    cancels the tasks that have not started. For the threads that drive a
+    streaming response — never call it from inside a compute task.
+    """
+    pending: dict[Future, int] = {}
+    queued  = iter(enumerate(arg_lists))
+    held    = None   # next (index, args) not yet accepted by the pool
+    try:
+        while True:
+            while len(pending) < max(1, window):
+                held = held or next(queued, None)
+                if held is None:
+                    break
+                try:
+                    pending[compute.submit(fn, *held[1])] = held[0]
+                except ComputeSaturated:
+                    break
+                held = None
+            if not pending:
+                if held is None:
+                    return
+                time.sleep(SATURATED_POLL_S)
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+    finally:
+        for future in pending:
+            future.cancel()
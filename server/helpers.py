@@ -7,8 +7,14 @@ Shared utility functions used across routers.
 from __future__ import annotations
 import base64
 import io
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator
 
 from PIL import Image
+from fastapi import HTTPException
+
+from model.image_manager import parse_bg_color
 from model.palette import Palette
 
 
@@ -42,6 +48,14 @@ def make_pal_content(palette: Palette) -> str:
     return buf.getvalue()
 
 
+def bg_hex(bg_color: str | None, field: str = "bg_color") -> str | None:
+    """Normalized '#RRGGBB' (or None) so a preview's colors and a download's can be compared."""
+    try:
+        return parse_bg_color(bg_color).to_hex() if bg_color else None
+    except ValueError:
+        raise HTTPException(400, f"Invalid {field} '{bg_color}'")
+
+
 # ---------------------------------------------------------------------------
 # 4bpp / indexed PNG helpers
 # ---------------------------------------------------------------------------
@@ -96,3 +110,54 @@ def save_png(img: Image.Image, preserve_4bpp: bool = False) -> bytes:
         img.convert("RGBA").save(buf, **save_kwargs)
 
     return buf.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Streaming zip
+# ---------------------------------------------------------------------------
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target that hands back whatever zipfile wrote since the last drain."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(
+    entries: Iterable[tuple[str, Path | bytes | str]],
+    chunk_size: int = 64 * 1024,
+) -> Iterator[bytes]:
+    """
+    Build a deflated zip on the fly and yield it in chunks.
+
+    Each entry is (arcname, content): bytes/str are stored as-is, a Path is read
+    from disk in chunk_size pieces. Nothing is staged — the archive only ever
+    exists in the response stream, so callers can start sending before every
+    entry is known (entries may be a generator).
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for arcname, content in entries:
+            if isinstance(content, Path):
+                with open(content, "rb") as src, zf.open(arcname, "w") as dst:
+                    while chunk := src.read(chunk_size):
+                        dst.write(chunk)
+                        if (data := sink.drain()):
+                            yield data
+            else:
+                zf.writestr(arcname, content)
+            if (data := sink.drain()):
+                yield data
+    yield sink.drain()
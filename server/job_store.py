@@ -0,0 +1,259 @@
+"""
+server/job_store.py
+
+Durable record of pipeline jobs (SQLite, next to projects.json in the working
+directory) so a server restart or crash does not lose them.
+
+Stored per job: status, step list, filename templates, the resource limits it
+was started with, work_dir and, per input file, the result dict and the zip
+entries it produced. Uploaded inputs live in
+<work_dir>/inputs/<index> so an interrupted job can be resumed from its first
+file without a result.
+
+On startup, jobs still marked running are flagged 'interrupted' (see
+server.api.pipeline.recover_jobs). Finished jobs are expired, together with
+their work_dir, once they are older than PORYPAL_JOB_MAX_AGE_HOURS or when all
+job directories together exceed PORYPAL_JOB_MAX_MB (oldest first).
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+JOB_DB_FILE: Path = Path(os.environ.get("PORYPAL_JOB_DB", "pipeline_jobs.db")).resolve()
+
+DEFAULT_MAX_AGE_HOURS = 24.0
+DEFAULT_MAX_MB        = 2048.0
+
+ACTIVE_STATUSES = ("running",)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id                TEXT PRIMARY KEY,
+    status            TEXT NOT NULL,
+    created_at        REAL NOT NULL,
+    updated_at        REAL NOT NULL,
+    total             INTEGER NOT NULL,
+    steps             TEXT NOT NULL,
+    filename_template TEXT NOT NULL,
+    palette_template  TEXT NOT NULL,
+    work_dir          TEXT,
+    extra_entries     TEXT,
+    limits            TEXT
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id   TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    idx      INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    result   TEXT,
+    entries  TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+# Columns added after the first release: (name, type) appended to older databases on open
+_ADDED_COLUMNS = [("limits", "TEXT")]
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        logging.warning(f"Ignoring invalid {name}={raw!r}")
+        return default
+
+
+def input_path(work_dir: str | Path, index: int) -> Path:
+    """Where the raw upload for file *index* of a job is kept."""
+    return Path(work_dir) / "inputs" / f"{index:05d}"
+
+
+def dir_size(path: Path) -> int:
+    """Total size in bytes of every file under *path*."""
+    if not path.exists():
+        return 0
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class JobStore:
+    """Thread-safe SQLite job store. The database is opened on first use."""
+
+    def __init__(self, path: Path = JOB_DB_FILE):
+        self.path = Path(path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, sql_type in _ADDED_COLUMNS:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {sql_type}")
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- Writes ----------
+
+    def create_job(
+        self,
+        job_id: str,
+        filenames: list[str],
+        steps: list[dict],
+        filename_template: str,
+        palette_template: str,
+        work_dir: str,
+        limits: dict | None = None,
+    ) -> None:
+        now = time.time()
+        with self._lock, self._db() as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at, total, steps,"
+                " filename_template, palette_template, work_dir, limits) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (job_id, "running", now, now, len(filenames), json.dumps(steps),
+                 filename_template, palette_template, work_dir,
+                 json.dumps(limits) if limits is not None else None),
+            )
+            db.executemany(
+                "INSERT INTO job_files (job_id, idx, filename) VALUES (?,?,?)",
+                [(job_id, i, name) for i, name in enumerate(filenames)],
+            )
+
+    def record_file(self, job_id: str, index: int, result: dict, entries: list) -> None:
+        with self._lock, self._db() as db:
+            db.execute(
+                "UPDATE job_files SET result = ?, entries = ? WHERE job_id = ? AND idx = ?",
+                (json.dumps(result), json.dumps(entries), job_id, index),
+            )
+            db.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish_job(self, job_id: str, status: str, extra_entries: list) -> None:
+        """Set the final status and record job-level zip entries (e.g. copied loaded palettes)."""
+        with self._lock, self._db() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, extra_entries = ? WHERE id = ?",
+                (status, time.time(), json.dumps(extra_entries), job_id),
+            )
+
+    def set_status(self, job_id: str, status: str) -> None:
+        with self._lock, self._db() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                (status, time.time(), job_id),
+            )
+
+    def mark_interrupted(self) -> int:
+        """Flag every job left 'running' by a previous process. Returns how many."""
+        with self._lock, self._db() as db:
+            cur = db.execute(
+                "UPDATE jobs SET status = 'interrupted', updated_at = ? WHERE status = 'running'",
+                (time.time(),),
+            )
+            return cur.rowcount
+
+    def delete_job(self, job_id: str) -> None:
+        with self._lock, self._db() as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    # ---------- Reads ----------
+
+    def load_job(self, job_id: str) -> dict | None:
+        """
+        The job in the same shape as server.api.pipeline._jobs entries, plus
+        "filenames" (every input, in order), "next_index" (first file without
+        a result, i.e. where a resume starts) and "limits" (the create_job
+        limits, None for jobs stored without them).
+        """
+        with self._lock:
+            db   = self._db()
+            row  = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            files = db.execute(
+                "SELECT idx, filename, result, entries FROM job_files WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+
+        results, entries = [], []
+        for f in files:
+            if f["result"] is None:
+                break
+            results.append(json.loads(f["result"]))
+            entries.extend(tuple(e) for e in json.loads(f["entries"] or "[]"))
+        if len(results) == len(files):
+            entries.extend(tuple(e) for e in json.loads(row["extra_entries"] or "[]"))
+
+        return {
+            "status":            row["status"],
+            "total":             row["total"],
+            "done":              len(results),
+            "current_file":      "",
+            "results":           results,
+            "entries":           entries,
+            "work_dir":          row["work_dir"],
+            "steps":             json.loads(row["steps"]),
+            "filename_template": row["filename_template"],
+            "palette_template":  row["palette_template"],
+            "filenames":         [f["filename"] for f in files],
+            "next_index":        len(results),
+            "limits":            json.loads(row["limits"]) if row["limits"] else None,
+            "persisted":         True,
+        }
+
+    # ---------- Expiry ----------
+
+    def expire(self, max_age_hours: float | None = None, max_mb: float | None = None) -> list[str]:
+        """
+        Delete finished jobs (and their work_dir) older than max_age_hours, then
+        the oldest remaining ones until every work_dir together fits in max_mb.
+        Running jobs are never touched. Returns the expired job ids.
+        """
+        max_age_hours = _env_float("PORYPAL_JOB_MAX_AGE_HOURS", DEFAULT_MAX_AGE_HOURS) \
+            if max_age_hours is None else max_age_hours
+        max_mb = _env_float("PORYPAL_JOB_MAX_MB", DEFAULT_MAX_MB) if max_mb is None else max_mb
+
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, status, updated_at, work_dir FROM jobs ORDER BY updated_at"
+            ).fetchall()
+
+        cutoff  = time.time() - max_age_hours * 3600
+        sizes   = {r["id"]: dir_size(Path(r["work_dir"])) if r["work_dir"] else 0 for r in rows}
+        total   = sum(sizes.values())
+        budget  = max_mb * 1024 * 1024
+        expired = []
+        for r in rows:   # oldest first
+            if r["status"] in ACTIVE_STATUSES:
+                continue
+            if r["updated_at"] < cutoff or total > budget:
+                if r["work_dir"]:
+                    shutil.rmtree(r["work_dir"], ignore_errors=True)
+                self.delete_job(r["id"])
+                total -= sizes[r["id"]]
+                expired.append(r["id"])
+
+        if expired:
+            logging.info(f"Expired {len(expired)} pipeline job(s)")
+        return expired
+
+
+job_store = JobStore()
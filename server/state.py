@@ -2,21 +2,23 @@
 server/state.py
 
 Shared application state — single instance imported by all routers.
-Keeps PaletteManager, ImageManager, and PaletteExtractor alive across requests.
+Keeps PaletteManager and PaletteExtractor alive across requests. Conversion
+has no shared state: routes call model.image_manager.convert() per request.
+The extractor's ExtractionCache is what lets download routes reuse the
+palettes their preview call already extracted.
 """
 
 from __future__ import annotations
 
 from model.palette_manager import PaletteManager
-from model.image_manager import ImageManager
+from model.extract_cache import ExtractionCache
 from model.palette_extractor import PaletteExtractor
 
 
 class AppState:
     def __init__(self):
         self.palette_manager = PaletteManager()
-        self.image_manager = ImageManager()
-        self.extractor = PaletteExtractor()
+        self.extractor = PaletteExtractor(cache=ExtractionCache.from_env())
 
 
 state = AppState()
\ No newline at end of file
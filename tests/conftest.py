@@ -0,0 +1,43 @@
+"""Fixtures shared by the route tests, which call the handlers directly."""
+
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+
+class FakeUploadFile:
+    """The part of fastapi.UploadFile the routes use."""
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+
+@pytest.fixture
+def upload():
+    """upload(filename, data) → an UploadFile stand-in."""
+    return FakeUploadFile
+
+
+@pytest.fixture
+def drain():
+    """drain(response) → a StreamingResponse's whole body (str for text streams, else bytes)."""
+    def drain(response):
+        async def collect():
+            return [chunk async for chunk in response.body_iterator]
+
+        chunks = asyncio.run(collect())
+        return "".join(chunks) if chunks and isinstance(chunks[0], str) else b"".join(chunks)
+
+    return drain
+
+
+@pytest.fixture
+def read_zip(drain):
+    """read_zip(response) → the zip archive a download route streamed."""
+    return lambda response: zipfile.ZipFile(io.BytesIO(drain(response)))
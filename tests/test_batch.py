@@ -0,0 +1,169 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from model.palette import Color, Palette
+from server.api import batch
+from server.helpers import stream_zip
+
+
+def _sprite(seed):
+    rng = np.random.default_rng(seed)
+    px  = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+    px[..., 3] = 255
+    buf = io.BytesIO()
+    Image.fromarray(px, "RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _uploads():
+    files = [(f"s{i}.png", _sprite(i)) for i in range(7)]
+    files.insert(3, ("broken.png", b"not an image"))
+    return files
+
+
+PALETTE = Palette("gray.pal", [Color(255, 0, 255)] + [Color(i * 17, i * 17, i * 17) for i in range(15)])
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_batch_streams_every_file_and_a_manifest(monkeypatch, workers):
+    monkeypatch.setattr(batch, "BATCH_WORKERS", workers)
+    uploads = _uploads()
+
+    archive  = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(batch._iter_batch(uploads, PALETTE)))))
+    names    = archive.namelist()
+    manifest = json.loads(archive.read("manifest.json"))
+
+    assert names[-1] == "manifest.json"
+    assert sorted(names[:-1]) == sorted(f"s{i}_gray.png" for i in range(7))
+    assert [m["file"] for m in manifest["files"]] == [name for name, _ in uploads]
+    assert (manifest["converted"], manifest["failed"]) == (7, 1)
+    assert "error" in manifest["files"][3] and "output" not in manifest["files"][3]
+    assert all(m["colors_used"] >= 1 and m["seconds"] >= 0 for m in manifest["files"] if "error" not in m)
+
+    sequential = [batch._convert_one(name, data, PALETTE)[1] for name, data in uploads]
+    for entry, png in zip(manifest["files"], sequential):
+        if png is not None:
+            assert archive.read(entry["output"]) == png
+
+
+def test_closing_the_stream_cancels_pending_files(monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 2)
+    calls = []
+    real  = batch._convert_one
+
+    def counting(*args):
+        calls.append(args[0])
+        return real(*args)
+
+    monkeypatch.setattr(batch, "_convert_one", counting)
+    entries = batch._iter_batch([(f"s{i}.png", _sprite(i)) for i in range(40)], PALETTE)
+    next(entries)
+    entries.close()
+    assert len(calls) < 40
+
+
+def test_batch_runs_on_the_shared_compute_pool(monkeypatch):
+    import threading
+
+    from fastapi import HTTPException
+
+    from server import compute as compute_module
+    from server.compute import ComputeExecutor
+    from server.state import state
+
+    executor = ComputeExecutor(max_workers=1, max_queue=1)
+    monkeypatch.setattr(compute_module, "compute", executor)
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 4)
+    try:
+        uploads  = _uploads()
+        archive  = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(batch._iter_batch(uploads, PALETTE)))))
+        manifest = json.loads(archive.read("manifest.json"))
+        assert (manifest["converted"], manifest["failed"]) == (7, 1)
+        stats = executor.stats()
+        assert stats["completed"] == len(uploads) and stats["queued"] == stats["running"] == 0
+
+        release = threading.Event()
+        executor.submit(release.wait, 5)
+        executor.submit(release.wait, 5)
+        monkeypatch.setattr(state.palette_manager, "get_palette_by_name", lambda name: PALETTE)
+        with pytest.raises(HTTPException) as busy:
+            asyncio.run(batch.batch_convert(files=[], palette_name="gray.pal"))
+        assert busy.value.status_code == 503
+        release.set()
+    finally:
+        executor.shutdown()
+
+
+def test_unknown_palette_is_404():
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as missing:
+        asyncio.run(batch.batch_convert(files=[], palette_name="nope.pal"))
+    assert missing.value.status_code == 404
+
+
+def test_matrix_scores_every_sprite_against_every_palette(monkeypatch, upload, read_zip):
+    from server.state import state
+
+    warm = Palette("warm.pal", [Color(255, 0, 255)] + [Color(255, i * 17, 0) for i in range(15)])
+    monkeypatch.setattr(state.palette_manager, "get_palettes", lambda: [warm, PALETTE])
+    uploads = _uploads()
+
+    def call(**kwargs):
+        return asyncio.run(batch.batch_matrix(
+            files=[upload(name, data) for name, data in uploads],
+            palette_names="[]", bg_color=None, conflict_mode="flag", **kwargs,
+        ))
+
+    result = call(download=False)
+    assert result["palettes"] == ["warm.pal", "gray.pal"]
+    rows = result["sprites"]
+    assert [r["file"] for r in rows] == [name for name, _ in uploads]
+    assert "error" in rows[3]
+    for row, (name, data) in zip(rows, uploads):
+        if "error" in row:
+            continue
+        expected = [batch.convert(data, [p])[0].colors_used for p in (warm, PALETTE)]
+        assert row["colors_used"] == expected
+        assert row["best_colors"] == max(expected)
+
+    archive  = read_zip(call(download=True))
+    manifest = json.loads(archive.read("manifest.json"))
+    outputs  = [r["output"] for r in manifest["sprites"] if "output" in r]
+    assert len(outputs) == 7 and sorted(archive.namelist()) == sorted(outputs + ["manifest.json"])
+
+
+def test_matrix_reports_every_file_when_nothing_decodes():
+    rows, chosen = batch._score_matrix(
+        [("a.png", b"garbage"), ("b.png", b"")], [PALETTE], None, "auto_first",
+    )
+    assert [r["file"] for r in rows] == ["a.png", "b.png"]
+    assert all("error" in r for r in rows)
+    assert chosen == [None, None]
+
+
+def test_matrix_rejects_unknown_conflict_mode():
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as bad:
+        asyncio.run(batch.batch_matrix(
+            files=[], palette_names="[]", bg_color=None, conflict_mode="coin_flip", download=False,
+        ))
+    assert bad.value.status_code == 400
+
+
+@pytest.mark.parametrize("bg_color", ["zz", "#12"])
+def test_matrix_rejects_an_invalid_bg_color(bg_color):
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as bad:
+        asyncio.run(batch.batch_matrix(
+            files=[], palette_names="[]", bg_color=bg_color, conflict_mode="auto_first", download=False,
+        ))
+    assert bad.value.status_code == 400
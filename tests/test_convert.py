@@ -0,0 +1,55 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from model.palette import Color, Palette
+from server.api import convert
+from server.artifact_store import artifact_store
+
+
+PALETTE = Palette("gray.pal", [Color(255, 0, 255)] + [Color(i * 17, i * 17, i * 17) for i in range(15)])
+
+
+def _sprite_png():
+    img = Image.new("RGBA", (4, 4), (0x73, 0xC5, 0xA4, 255))
+    img.putpixel((1, 1), (0x40, 0x40, 0x40, 255))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _preview(monkeypatch, upload, bg_color):
+    monkeypatch.setattr(convert.state.palette_manager, "get_palettes", lambda: [PALETTE])
+    return asyncio.run(convert.convert(
+        file=upload("s.png", _sprite_png()), palette_name=None, bg_color=bg_color,
+        offset=0, limit=None, best_only=False,
+    ))
+
+
+def test_preview_renders_are_not_kept_on_the_artifact(monkeypatch, upload):
+    preview = _preview(monkeypatch, upload, "#73c5a4")
+    assert preview["results"][0]["image"] is not None
+
+    stored = artifact_store.get(preview["artifact_id"], "convert")
+    assert stored["bg_color"] == "#73C5A4"
+    assert not any(r.is_rendered for r in stored["results"])
+
+
+def test_download_all_rejects_another_bg_color_for_an_artifact(monkeypatch, upload, read_zip):
+    from fastapi import HTTPException
+
+    preview = _preview(monkeypatch, upload, "#73C5A4")
+
+    def download(bg_color):
+        return read_zip(asyncio.run(convert.download_all_converted(
+            file=None, bg_color=bg_color, palette_names="[]", artifact_id=preview["artifact_id"],
+        )))
+
+    assert download(None).namelist() == ["s_gray.png"]
+    assert download("73c5a4").namelist() == ["s_gray.png"]
+    with pytest.raises(HTTPException) as mismatch:
+        download("#000000")
+    assert mismatch.value.status_code == 409
+    assert not any(r.is_rendered for r in artifact_store.get(preview["artifact_id"], "convert")["results"])
@@ -2,7 +2,7 @@ import io
 
 from PIL import Image
 
-from server.helpers import copy_without_transparency, save_png
+from server.helpers import copy_without_transparency, save_png, stream_zip
 
 
 def _paletted_image_with_transparent_slot_zero():
@@ -27,3 +27,114 @@ def test_copy_without_transparency_keeps_slot_zero_visible():
     assert "transparency" not in reloaded.info
     assert reloaded.convert("RGBA").getpixel((0, 0)) == (0x11, 0x22, 0x33, 255)
     assert reloaded.convert("RGBA").getpixel((1, 0)) == (0xAA, 0xBB, 0xCC, 255)
+
+
+def test_stream_zip_round_trips_bytes_and_files(tmp_path):
+    import zipfile
+
+    big = tmp_path / "big.bin"
+    big.write_bytes(bytes(range(256)) * 1024)
+
+    chunks = list(stream_zip([("a.txt", b"hello"), ("sprites/big.bin", big), ("m.json", "{}")], chunk_size=4096))
+
+    assert len(chunks) > 2
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.namelist() == ["a.txt", "sprites/big.bin", "m.json"]
+        assert zf.testzip() is None
+        assert zf.read("sprites/big.bin") == big.read_bytes()
+
+
+def test_artifact_store_ttl_lru_and_kind(monkeypatch):
+    from server import artifact_store as store_module
+    from server.artifact_store import ArtifactStore
+
+    clock = [100.0]
+    monkeypatch.setattr(store_module.time, "monotonic", lambda: clock[0])
+    store = ArtifactStore(ttl_s=60, max_bytes=10, max_entries=3)
+
+    a = store.put("zip", b"aaaa")
+    b = store.put("zip", b"bbbb")
+    assert store.get(a, "zip") == b"aaaa"      # a is now most recently used
+    assert store.get(a, "other") is None       # wrong kind
+
+    store.put("zip", b"cccc")                  # 12 bytes > 10: evicts b, the LRU
+    assert store.get(b, "zip") is None
+    assert store.get(a, "zip") == b"aaaa"
+
+    clock[0] += 61
+    assert store.get(a, "zip") is None
+    assert len(store) == 0
+
+    big = store.put("zip", b"x" * 50)          # larger than the budget, but kept until replaced
+    assert store.get(big, "zip") is not None
+
+
+def test_compute_executor_rejects_with_retry_after_when_saturated():
+    import asyncio
+    import threading
+
+    import pytest
+    from fastapi import HTTPException
+
+    from server import compute as compute_module
+    from server.compute import ComputeExecutor, ComputeSaturated
+
+    executor = ComputeExecutor(max_workers=1, max_queue=1)
+    release  = threading.Event()
+    try:
+        running = executor.submit(release.wait, 5)
+        queued  = executor.submit(lambda: "queued")
+        with pytest.raises(ComputeSaturated) as full:
+            executor.submit(lambda: "rejected")
+        assert full.value.retry_after >= 1
+        assert executor.stats()["running"] + executor.stats()["queued"] == 2
+        assert executor.stats()["rejected"] == 1
+
+        release.set()
+        assert running.result(5) is True and queued.result(5) == "queued"
+        assert executor.stats()["completed"] == 2
+
+        async def call():
+            return await compute_module.run_compute(sum, [1, 2, 3])
+
+        compute_module.compute, previous = executor, compute_module.compute
+        try:
+            assert asyncio.run(call()) == 6
+            release.clear()
+            executor.submit(release.wait, 5)
+            executor.submit(release.wait, 5)
+            with pytest.raises(HTTPException) as busy:
+                asyncio.run(call())
+            assert busy.value.status_code == 503
+            assert int(busy.value.headers["Retry-After"]) >= 1
+        finally:
+            compute_module.compute = previous
+            release.set()
+    finally:
+        executor.shutdown()
+
+
+def test_map_compute_waits_for_slots_and_frees_cancelled_ones():
+    import threading
+
+    from server import compute as compute_module
+    from server.compute import ComputeExecutor, map_compute
+
+    executor = ComputeExecutor(max_workers=1, max_queue=1)
+    compute_module.compute, previous = executor, compute_module.compute
+    try:
+        assert sorted(map_compute(lambda x: x * x, [(i,) for i in range(6)], window=4)) == [
+            (i, i * i) for i in range(6)
+        ]
+
+        release = threading.Event()
+        results = map_compute(release.wait, [(5,)] * 6, window=2)
+        threading.Timer(0.05, release.set).start()
+        next(results)
+        results.close()
+        release.set()
+        executor._pool.submit(lambda: None).result(5)   # let the worker drain
+        assert executor.stats()["queued"] == 0 and executor.stats()["running"] == 0
+    finally:
+        compute_module.compute = previous
+        executor.shutdown()
@@ -0,0 +1,203 @@
+import asyncio
+import io
+import json
+
+import numpy as np
+from PIL import Image
+
+from model.palette import Color
+from server.api import items
+
+
+def _icon(seed, shape):
+    """24x24 item icon on the default bg: a filled square or a diagonal band in 6 colors."""
+    rng    = np.random.default_rng(seed)
+    colors = rng.integers(0, 256, (6, 3))
+    px     = np.zeros((24, 24, 4), dtype=np.uint8)
+    px[:, :] = (0x73, 0xC5, 0xA4, 255)
+    yy, xx = np.mgrid[:24, :24]
+    mask   = (abs(yy - 12) < 8) & (abs(xx - 12) < 8) if shape == "square" else abs(yy - xx) < 5
+    px[mask, :3] = colors[(yy + xx)[mask] % 6]
+    buf = io.BytesIO()
+    Image.fromarray(px, "RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _files():
+    shapes = ["square"] * 3 + ["band"] * 2
+    return [(f"icon_{i}.png", _icon(i, shape)) for i, shape in enumerate(shapes)]
+
+
+def test_pooled_grouping_matches_sequential(monkeypatch):
+    output_bg = Color(0x73, 0xC5, 0xA4)
+
+    monkeypatch.setattr(items, "ITEM_WORKERS", 1)
+    sequential = asyncio.run(items._build_groups(items._load_sprites(_files(), []), 8, output_bg))
+    monkeypatch.setattr(items, "ITEM_WORKERS", 4)
+    pooled = asyncio.run(items._build_groups(items._load_sprites(_files(), []), 8, output_bg))
+
+    assert [g["group_id"] for g in pooled] == ["shape_1", "shape_2"]
+    assert [len(g["results"]) for g in pooled] == [3, 2]
+    assert [items._public_group(g) for g in pooled] == [items._public_group(g) for g in sequential]
+
+
+def test_extract_streams_one_ndjson_line_per_group(monkeypatch, upload, drain):
+    monkeypatch.setattr(items, "ITEM_WORKERS", 2)
+    response = asyncio.run(items.extract_item_palettes(
+        files=[upload(name, data) for name, data in _files()],
+        n_colors=8, input_bg_colors="[]", output_bg_color=items.DEFAULT_BG,
+        shared_threshold=items.DEFAULT_THRESHOLD, group_assignments="{}", stream=True,
+    ))
+
+    assert response.media_type == "application/x-ndjson"
+    *groups, last = [json.loads(line) for line in drain(response).splitlines()]
+    assert sorted(g["group_id"] for g in groups) == ["shape_1", "shape_2"]
+    assert all("png_bytes" not in r for g in groups for r in g["results"])
+    assert set(last) == {"artifact_id"}
+
+
+def test_group_extraction_stays_on_the_shared_compute_pool(monkeypatch):
+    import threading
+
+    from server import compute as compute_module
+    from server.compute import ComputeExecutor
+
+    executor = ComputeExecutor(max_workers=2, max_queue=1)
+    monkeypatch.setattr(compute_module, "compute", executor)
+    monkeypatch.setattr(items, "ITEM_WORKERS", 4)
+    threads = set()
+    real    = items._extract_palette_for_sprite
+
+    def recording(*args):
+        threads.add(threading.current_thread().name)
+        return real(*args)
+
+    monkeypatch.setattr(items, "_extract_palette_for_sprite", recording)
+    try:
+        groups = asyncio.run(items._build_groups(items._load_sprites(_files(), []), 8, Color(0x73, 0xC5, 0xA4)))
+        assert [len(g["results"]) for g in groups] == [3, 2]
+        assert threads and all(name.startswith("compute") for name in threads)
+        # 5 extractions + 2 group renders + the grouping, all run despite the 3-slot pool
+        assert executor.stats()["completed"] == 8
+    finally:
+        executor.shutdown()
+
+
+def test_downloads_reuse_the_extract_artifact(monkeypatch, upload, read_zip):
+    preview = asyncio.run(items.extract_item_palettes(
+        files=[upload(name, data) for name, data in _files()],
+        n_colors=8, input_bg_colors="[]", output_bg_color=items.DEFAULT_BG,
+        shared_threshold=items.DEFAULT_THRESHOLD, group_assignments="{}", stream=False,
+    ))
+
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("download re-extracted a palette")
+
+    monkeypatch.setattr(items, "_extract_palette_for_sprite", no_extraction)
+    common = dict(
+        n_colors=8, input_bg_colors="[]", output_bg_color=items.DEFAULT_BG,
+        shared_threshold=items.DEFAULT_THRESHOLD, group_assignments="{}",
+    )
+
+    everything = read_zip(asyncio.run(items.download_all_item_palettes(
+        files=None, group_names=json.dumps({"shape_2": "bands"}),
+        artifact_id=preview["artifact_id"], **common,
+    )))
+    assert sorted(n for n in everything.namelist() if n.startswith("bands/")) == [
+        "bands/icon_3.pal", "bands/icon_4.pal",
+    ]
+
+    one = read_zip(asyncio.run(items.download_group_palettes(
+        files=None, group_name="squares", artifact_id=preview["artifact_id"], group_id="shape_1", **common,
+    )))
+    assert sorted(one.namelist()) == ["manifest.json"] + [
+        f"{kind}/icon_{i}.{ext}" for kind, ext in (("palettes", "pal"), ("sprites", "png")) for i in range(3)
+    ]
+    expected = preview["groups"][0]["results"][0]["pal_content"]
+    assert one.read("palettes/icon_0.pal").decode() == expected
+
+
+def test_download_with_unknown_artifact_is_404():
+    import pytest
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as missing:
+        asyncio.run(items.download_variants(
+            files=None, n_colors=8, input_bg_colors="[]", output_bg_color=items.DEFAULT_BG,
+            reference_index=0, artifact_id="nope",
+        ))
+    assert missing.value.status_code == 404
+
+
+def test_downloads_reject_settings_the_artifact_was_not_built_with(upload, read_zip):
+    import pytest
+    from fastapi import HTTPException
+
+    preview = asyncio.run(items.extract_item_palettes(
+        files=[upload(name, data) for name, data in _files()],
+        n_colors=8, input_bg_colors="[]", output_bg_color="#73c5a4",
+        shared_threshold=items.DEFAULT_THRESHOLD, group_assignments="{}", stream=False,
+    ))
+    grouping = {r["name"]: g["group_id"] for g in preview["groups"] for r in g["results"]}
+    unsent   = dict(n_colors=None, input_bg_colors=None, output_bg_color=None,
+                    shared_threshold=None, group_assignments=None)
+
+    def download_all(**sent):
+        return asyncio.run(items.download_all_item_palettes(
+            files=None, group_names="{}", artifact_id=preview["artifact_id"], **{**unsent, **sent},
+        ))
+
+    assert read_zip(download_all()).namelist()
+    assert read_zip(download_all(
+        n_colors=8, output_bg_color="73C5A4", input_bg_colors=json.dumps([items.DEFAULT_BG] * 5),
+        group_assignments=json.dumps(grouping),
+    )).namelist()
+
+    moved = {**grouping, "icon_0": "shape_2"}
+    for sent in (
+        {"n_colors": 6},
+        {"output_bg_color": "#000000"},
+        {"shared_threshold": 0.9},
+        {"input_bg_colors": json.dumps(["#000000"])},
+        {"group_assignments": json.dumps(moved)},
+    ):
+        with pytest.raises(HTTPException) as mismatch:
+            download_all(**sent)
+        assert mismatch.value.status_code == 409, sent
+
+    def download_group(**sent):
+        return asyncio.run(items.download_group_palettes(
+            files=None, group_name="squares", artifact_id=preview["artifact_id"], group_id="shape_2",
+            **{**unsent, **sent},
+        ))
+
+    band = {name: gid for name, gid in grouping.items() if gid == "shape_2"}
+    assert read_zip(download_group(
+        input_bg_colors=json.dumps([items.DEFAULT_BG] * len(band)), group_assignments=json.dumps(band),
+    )).namelist()
+    with pytest.raises(HTTPException) as mismatch:
+        download_group(group_assignments=json.dumps({**band, "icon_0": "shape_2"}))
+    assert mismatch.value.status_code == 409
+
+
+def test_variant_download_rejects_another_reference(upload, read_zip):
+    import pytest
+    from fastapi import HTTPException
+
+    files   = [(name, data) for name, data in _files() if name in ("icon_0.png", "icon_1.png")]
+    preview = asyncio.run(items.extract_variants(
+        files=[upload(name, data) for name, data in files],
+        n_colors=8, input_bg_colors="[]", output_bg_color=items.DEFAULT_BG, reference_index=1,
+    ))
+    assert preview["reference"] == "icon_1"
+
+    def download(**sent):
+        return asyncio.run(items.download_variants(
+            files=None, artifact_id=preview["artifact_id"],
+            **{**dict(n_colors=8, input_bg_colors=None, output_bg_color=None, reference_index=None), **sent},
+        ))
+
+    assert read_zip(download(reference_index=5)).read("manifest.json")
+    with pytest.raises(HTTPException) as mismatch:
+        download(reference_index=0)
+    assert mismatch.value.status_code == 409
@@ -7,8 +7,9 @@ Run with: pytest tests/
 
 import pytest
 from pathlib import Path
+from PIL import Image
 from model.palette import Color, Palette
-from model.image_manager import ImageManager
+from model.image_manager import ImageManager, best_indices, convert
 from model.palette_extractor import PaletteExtractor
 
 
@@ -101,6 +102,28 @@ class TestImageManager:
         with pytest.raises(ValueError, match="Unsupported format"):
             mgr.load_image(fake)
 
+    def test_load_in_memory_sources(self, simple_png, simple_palette):
+        from PIL import Image
+        import numpy as np
+        from_path = ImageManager()
+        from_path.load_image(simple_png)
+        expected = from_path.process_all_palettes([simple_palette])[0].image.tobytes()
+
+        decoded = Image.open(simple_png)
+        for source in (simple_png.read_bytes(), decoded, np.array(decoded.convert("RGBA"))):
+            mgr = ImageManager()
+            mgr.load_image(source)
+            assert mgr.current_image_path is None
+            assert mgr.process_all_palettes([simple_palette])[0].image.tobytes() == expected
+
+    def test_unsupported_in_memory_format(self):
+        from PIL import Image
+        import io
+        buf = io.BytesIO()
+        Image.new("RGB", (4, 4)).save(buf, format="TIFF")
+        with pytest.raises(ValueError, match="Unsupported format"):
+            ImageManager().load_image(buf.getvalue())
+
     def test_process_all_palettes(self, simple_png, simple_palette):
         mgr = ImageManager({})
         mgr.load_image(simple_png)
@@ -127,6 +150,257 @@ class TestImageManager:
         assert 0 in best
 
 
+# ---------- Conversion engines ----------
+
+class TestConversionEngines:
+    @pytest.fixture
+    def palettes(self):
+        import numpy as np
+        rng = np.random.default_rng(7)
+        return [
+            Palette(f"p{i}.pal", [Color(*map(int, c)) for c in rng.integers(0, 256, (16, 3))])
+            for i in range(4)
+        ] + [Palette("tiny.pal", [Color(0, 0, 0), Color(255, 255, 255)])]
+
+    @pytest.fixture
+    def noisy_png(self, tmp_path):
+        """64x48 sprite drawn from 40 random colors, with a transparent corner."""
+        from PIL import Image
+        import numpy as np
+        rng = np.random.default_rng(3)
+        colors = rng.integers(0, 256, (40, 3))
+        arr = np.concatenate(
+            [colors[rng.integers(0, 40, (48, 64))], np.full((48, 64, 1), 255)], axis=2
+        ).astype(np.uint8)
+        arr[:4, :4, 3] = 0
+        path = tmp_path / "noisy.png"
+        Image.fromarray(arr, "RGBA").save(path)
+        return path
+
+    @pytest.mark.parametrize("engine", ["lut", "unique"])
+    def test_engine_matches_dense(self, noisy_png, palettes, engine):
+        dense = ImageManager(engine="dense")
+        dense.load_image(noisy_png)
+        expected = dense.process_all_palettes(palettes)
+
+        mgr = ImageManager(engine=engine)
+        mgr.load_image(noisy_png)
+        for _ in range(2):   # second pass is served from the LUT cache
+            for want, got in zip(expected, mgr.process_all_palettes(palettes)):
+                assert got.image.tobytes() == want.image.tobytes()
+                assert got.image.getpalette() == want.image.getpalette()
+                assert got.used_indices == want.used_indices
+
+    def test_score_palettes_renders_lazily(self, noisy_png, palettes):
+        dense = ImageManager(engine="dense")
+        dense.load_image(noisy_png)
+        expected = dense.process_all_palettes(palettes)
+
+        mgr = ImageManager()
+        mgr.load_image(noisy_png)
+        scored = mgr.score_palettes(palettes)
+
+        assert not any(r.is_rendered for r in scored)
+        assert [r.colors_used for r in scored] == [r.colors_used for r in expected]
+        assert [r.used_indices for r in scored] == [r.used_indices for r in expected]
+        assert scored[1].image.tobytes() == expected[1].image.tobytes()
+        assert [r.is_rendered for r in scored] == [False, True, False, False, False]
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            ImageManager(engine="magic")
+        with pytest.raises(ValueError):
+            convert(Image.new("RGBA", (2, 2)), [], engine="magic")
+
+    def test_convert_is_reentrant(self, noisy_png, palettes):
+        """Concurrent convert() calls on different images and bg colors don't interfere."""
+        from concurrent.futures import ThreadPoolExecutor
+        import numpy as np
+
+        flipped = Image.fromarray(np.array(Image.open(noisy_png))[::-1].copy(), "RGBA")
+        jobs = [(noisy_png, None), (flipped, "#000000"), (noisy_png.read_bytes(), "#FFFFFF")] * 4
+
+        def run(job):
+            source, bg = job
+            mgr = ImageManager()
+            mgr.load_image(source, bg_color=bg)
+            expected = [r.image.tobytes() for r in mgr.process_all_palettes(palettes)]
+            return [r.image.tobytes() for r in convert(source, palettes, bg)] == expected
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            assert all(pool.map(run, jobs))
+
+    def test_convert_many_matches_convert(self, noisy_png, palettes):
+        import numpy as np
+        rng = np.random.default_rng(11)
+        other = rng.integers(0, 256, (20, 30, 4), dtype=np.uint8)
+        other[..., 3] = 255
+        images = [noisy_png, other, Image.open(noisy_png).rotate(90, expand=True)]
+        bgs    = [None, "#000000", None]
+
+        matrix, many = ImageManager.score_matrix(images, palettes, bgs)
+        assert matrix.shape == (3, len(palettes))
+        for image, bg, row, counts in zip(images, bgs, many, matrix):
+            single = convert(image, palettes, bg)
+            assert counts.tolist() == [r.colors_used for r in single]
+            assert [r.used_indices for r in row] == [r.used_indices for r in single]
+            assert [r.image.tobytes() for r in row] == [r.image.tobytes() for r in single]
+
+    def test_choose_best_tie_break(self, palettes):
+        from model.image_manager import ConversionResult, choose_best
+        results = [
+            ConversionResult(None, palettes[2], 5),
+            ConversionResult(None, palettes[0], 5),
+            ConversionResult(None, palettes[1], 3),
+        ]
+        chosen, tied, notes = choose_best(results)
+        assert chosen.palette.name == "p0.pal" and tied == ["p0.pal", "p2.pal"] and notes == ""
+        assert choose_best(results, "flag")[2] == "conflict: 2 palettes tied (p0.pal, p2.pal)"
+        assert choose_best(results[1:])[1:] == ([], "")
+        with pytest.raises(ValueError):
+            choose_best(results, "coin_flip")
+
+    def test_best_indices(self, noisy_png, palettes):
+        results = convert(noisy_png, palettes)
+        best = best_indices(results)
+        assert best and all(results[i].colors_used == max(r.colors_used for r in results) for i in best)
+        assert best_indices([]) == []
+
+
+# ---------- Oklab memoization ----------
+
+class TestOklabUnique:
+    def test_matches_uncached_conversion(self, monkeypatch):
+        import numpy as np
+        from model import palette_extractor
+        from model.palette_extractor import _srgb_to_linear, _W, rgb_to_oklab, rgb_to_oklab_unique
+
+        monkeypatch.setattr(palette_extractor, "UNIQUE_REDUCE_MIN_PIXELS", 0)
+
+        rng = np.random.default_rng(11)
+        pixels = rng.integers(0, 256, (40, 3), dtype=np.uint8)[rng.integers(0, 40, 5000)]
+        lin = _srgb_to_linear(pixels.astype(np.float32) / 255.0)
+        legacy = (np.cbrt(np.maximum(lin @ _W["rgb_to_lms"].T, 0)) @ _W["lms_to_oklab"].T).astype(np.float32)
+
+        assert np.array_equal(rgb_to_oklab(pixels), legacy)
+        assert np.array_equal(rgb_to_oklab_unique(pixels), legacy)
+        assert np.array_equal(rgb_to_oklab_unique(pixels[:1000]), legacy[:1000])
+        assert rgb_to_oklab_unique(pixels[:0]).shape == (0, 3)
+
+    def test_mostly_distinct_colors_skip_the_reduce(self, monkeypatch):
+        import numpy as np
+        from model import palette_extractor
+
+        monkeypatch.setattr(palette_extractor, "UNIQUE_REDUCE_MIN_PIXELS", 0)
+        monkeypatch.setattr(palette_extractor, "unique_keys", None)
+        pixels = np.random.default_rng(13).integers(0, 256, (5000, 3), dtype=np.uint8)
+        assert np.array_equal(palette_extractor.rgb_to_oklab_unique(pixels), palette_extractor.rgb_to_oklab(pixels))
+
+    def test_single_row_matches_batched(self):
+        import numpy as np
+        from model.palette_extractor import rgb_to_oklab, rgb_to_oklab_unique
+
+        rng = np.random.default_rng(12)
+        pixels = rng.integers(0, 256, (64, 3), dtype=np.uint8)
+        batched = rgb_to_oklab(pixels)
+        for i in range(len(pixels)):
+            assert np.array_equal(rgb_to_oklab(pixels[i:i + 1]), batched[i:i + 1])
+            assert np.array_equal(rgb_to_oklab_unique(pixels[[i, i]]), batched[[i, i]])
+
+
+# ---------- Slot maps ----------
+
+class TestSlotMap:
+    @staticmethod
+    def reference_slots(px, bg, slot_map):
+        """The per-pixel loop the items routes used to run."""
+        import numpy as np
+        h, w = px.shape[:2]
+        out = np.zeros((h, w), dtype=np.int32)
+        for row in range(h):
+            for col in range(w):
+                rgb = tuple(int(v) for v in px[row, col, :3])
+                if px[row, col, 3] < 255 or rgb == tuple(bg):
+                    continue
+                if rgb in slot_map:
+                    out[row, col] = slot_map[rgb]
+                    continue
+                best_slot, best_dist = 1, float("inf")
+                for mapped, slot in slot_map.items():
+                    d = sum((a - b) ** 2 for a, b in zip(rgb, mapped))
+                    if d < best_dist:
+                        best_dist, best_slot = d, slot
+                out[row, col] = best_slot
+        return out
+
+    @pytest.fixture
+    def sprite(self):
+        """24x24 item icon: 12 colors, some noise, a transparent border and bg pixels."""
+        import numpy as np
+        rng = np.random.default_rng(5)
+        base = rng.integers(0, 256, (12, 3))
+        rgb = base[rng.integers(0, 12, (24, 24))]
+        rgb[rng.random((24, 24)) < 0.2] += rng.integers(-3, 4, (3,))
+        px = np.dstack([np.clip(rgb, 0, 255), np.full((24, 24), 255)]).astype(np.uint8)
+        px[0, :, 3] = 0
+        px[5:8, 5:8, :3] = (0x73, 0xC5, 0xA4)
+        return px, [tuple(int(v) for v in c) for c in base]
+
+    def test_render_slots_matches_reference(self, sprite):
+        import numpy as np
+        from model.slot_map import render_slots
+        px, colors = sprite
+        bg = (0x73, 0xC5, 0xA4)
+        # Several colors sharing a slot, plus a color no pixel uses
+        slot_map = {c: i % 7 + 1 for i, c in enumerate(colors[:9])}
+        slot_map[(0, 0, 0)] = 3
+
+        got = render_slots(px, np.array(bg, dtype=np.uint8), slot_map)
+        assert np.array_equal(got, self.reference_slots(px, bg, slot_map))
+        assert render_slots(px, bg, {}).max() == 1
+
+    def test_render_slots_tie_goes_to_first_map_entry(self):
+        import numpy as np
+        from model.slot_map import render_slots
+        px = np.array([[[5, 5, 0, 255]]], dtype=np.uint8)
+        assert render_slots(px, (0, 0, 0), {(10, 0, 0): 2, (0, 10, 0): 5}).tolist() == [[2]]
+        assert render_slots(px, (0, 0, 0), {(0, 10, 0): 5, (10, 0, 0): 2}).tolist() == [[5]]
+
+    def test_majority_colors_matches_reference(self, sprite):
+        import numpy as np
+        from model.slot_map import majority_colors, render_slots
+        px, colors = sprite
+        bg = (0x73, 0xC5, 0xA4)
+        slot_image = render_slots(px, bg, {c: i + 1 for i, c in enumerate(colors[:6])})
+
+        expected = []
+        for slot in range(1, 9):
+            freq = {}
+            for row in range(24):
+                for col in range(24):
+                    rgb = tuple(int(v) for v in px[row, col, :3])
+                    if slot_image[row, col] == slot and px[row, col, 3] == 255 and rgb != bg:
+                        freq[rgb] = freq.get(rgb, 0) + 1
+            expected.append(max(freq, key=freq.get) if freq else None)
+
+        assert majority_colors(px, bg, slot_image, 8) == expected
+        assert expected[-1] is None
+
+    def test_majority_colors_tie_goes_to_first_seen(self):
+        import numpy as np
+        from model.slot_map import majority_colors
+        px = np.array([[[9, 9, 9, 255], [1, 1, 1, 255], [1, 1, 1, 255], [9, 9, 9, 255]]], dtype=np.uint8)
+        assert majority_colors(px, (0, 0, 0), np.ones((1, 4), dtype=np.int32), 1) == [(9, 9, 9)]
+
+    def test_indexed_image(self):
+        import numpy as np
+        from model.slot_map import indexed_image
+        img = indexed_image(np.array([[0, 1], [2, 1]]), [Color(1, 2, 3), Color(4, 5, 6), Color(7, 8, 9)])
+        assert img.mode == "P" and img.info["transparency"] == 0
+        assert np.array(img).tolist() == [[0, 1], [2, 1]]
+        assert img.getpalette()[:9] == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+
+
 # ---------- PaletteExtractor ----------
 
 class TestPaletteExtractor:
@@ -170,3 +444,185 @@ class TestPaletteExtractor:
         assert out.exists()
         loaded = Palette.from_jasc_pal(out)
         assert loaded.colors == p.colors
+
+    @pytest.mark.parametrize("color_space", ["oklab", "rgb"])
+    def test_histogram_mode_matches_pixel_mode(self, tmp_path, color_space):
+        from PIL import Image
+        import numpy as np
+        rng = np.random.default_rng(21)
+        for i, n_distinct in enumerate((6, 40, 300)):
+            colors = rng.integers(0, 256, (n_distinct, 3))
+            arr = np.concatenate(
+                [colors[rng.integers(0, n_distinct, (40, 56))], np.full((40, 56, 1), 255)], axis=2
+            ).astype(np.uint8)
+            arr[:3, :3, 3] = 0
+            path = tmp_path / f"sprite_{i}.png"
+            Image.fromarray(arr, "RGBA").save(path)
+
+            ext = PaletteExtractor()
+            by_pixel, _ = ext.extract(path, color_space=color_space, kmeans_mode="pixels")
+            by_histogram, _ = ext.extract(path, color_space=color_space, kmeans_mode="histogram")
+            assert by_histogram.colors == by_pixel.colors
+
+    def test_extract_in_memory_sources(self, gradient_png):
+        from PIL import Image
+        import numpy as np
+        ext = PaletteExtractor()
+        expected, _ = ext.extract(gradient_png)
+        decoded = Image.open(gradient_png)
+        for source in (gradient_png.read_bytes(), decoded, np.array(decoded)):
+            p, method = ext.extract(source, name="gradient")
+            assert method == "kmeans"
+            assert p.name == "gradient"
+            assert p.colors == expected.colors
+
+    def test_extract_invalid_kmeans_mode(self, gradient_png):
+        with pytest.raises(ValueError):
+            PaletteExtractor().extract(gradient_png, kmeans_mode="fancy")
+
+    def test_minibatch_mode(self, gradient_png):
+        p, method = PaletteExtractor(batch_size=64).extract(gradient_png, n_colors=8, kmeans_mode="minibatch")
+        assert method == "kmeans"
+        assert len(p.colors) == 9
+        assert len(set(p.colors[1:])) == 8
+
+    def test_chunked_assignment_respects_ceiling(self):
+        import numpy as np
+        from model.palette_extractor import _assign_chunked
+        rng = np.random.default_rng(0)
+        points = rng.random((1000, 3), dtype=np.float32)
+        centers = rng.random((15, 3), dtype=np.float32)
+        full = np.argmin(((points[:, None, :] - centers[None]) ** 2).sum(axis=2), axis=1)
+        labels, _ = _assign_chunked(points, centers, max_bytes=15 * 3 * 4 * 7)
+        assert np.array_equal(labels, full)
+
+
+# ---------- Extraction cache ----------
+
+class TestExtractionCache:
+    @pytest.fixture
+    def sprite_png(self, tmp_path):
+        from PIL import Image
+        import numpy as np
+        rng = np.random.default_rng(9)
+        arr = rng.integers(0, 256, (20, 3))[rng.integers(0, 20, (16, 16))]
+        arr = np.dstack([arr, np.full((16, 16), 255)]).astype(np.uint8)
+        path = tmp_path / "sprite.png"
+        Image.fromarray(arr, "RGBA").save(path)
+        return path
+
+    def test_hits_across_sources_and_names(self, sprite_png):
+        from model.extract_cache import ExtractionCache
+        cache = ExtractionCache()
+        extractor = PaletteExtractor(cache=cache)
+
+        first, method = extractor.extract(sprite_png, n_colors=6)
+        again, again_method = extractor.extract(sprite_png.read_bytes(), n_colors=6, name="renamed")
+
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert again.colors == first.colors and again_method == method
+        assert again.name == "renamed"
+        assert first.colors == PaletteExtractor().extract(sprite_png, n_colors=6)[0].colors
+
+        extractor.extract(sprite_png, n_colors=7)
+        extractor.extract(sprite_png, n_colors=6, color_space="rgb")
+        extractor.extract(sprite_png, n_colors=6, bg_color="#000000")
+        assert cache.misses == 4
+
+    def test_disk_tier_survives_new_cache(self, sprite_png, tmp_path):
+        from model.extract_cache import ExtractionCache
+        disk = tmp_path / "extract_cache"
+        expected, _ = PaletteExtractor(cache=ExtractionCache(disk_dir=disk)).extract(sprite_png, n_colors=5)
+
+        cache = ExtractionCache(disk_dir=disk)
+        palette, method = PaletteExtractor(cache=cache).extract(sprite_png, n_colors=5)
+        assert palette.colors == expected.colors and method == "kmeans"
+        assert cache.stats()["disk_hits"] == 1 and cache.misses == 0
+
+    def test_lru_bound(self, sprite_png):
+        from model.extract_cache import ExtractionCache
+        cache = ExtractionCache(maxsize=2)
+        extractor = PaletteExtractor(cache=cache)
+        for n in (3, 4, 5, 3):
+            extractor.extract(sprite_png, n_colors=n)
+        assert len(cache) == 2
+        assert cache.misses == 4
+
+    def test_disk_tier_is_pruned_least_recently_used_first(self, tmp_path):
+        import os
+        from model.extract_cache import ExtractionCache
+        disk  = tmp_path / "extract_cache"
+        cache = ExtractionCache(disk_dir=disk, disk_maxsize=10)
+        keys  = [f"{i:064x}" for i in range(30)]
+        for i, key in enumerate(keys):
+            cache.put(key, [Color(i, i, i)], "kmeans")
+            os.utime(cache._disk_path(key), (i, i))
+        assert len(list(disk.glob("*/*.json"))) == 10
+
+        reread = ExtractionCache(disk_dir=disk, disk_maxsize=10)
+        survivors = sorted(p.stem for p in disk.glob("*/*.json"))
+        assert reread.get(survivors[0]) is not None     # a disk hit refreshes its recency
+        cache.put(f"{99:064x}", [Color(1, 2, 3)], "kmeans")
+        cache.prune()
+        remaining = {p.stem for p in disk.glob("*/*.json")}
+        assert len(remaining) == 10 and survivors[0] in remaining and f"{99:064x}" in remaining
+
+    def test_minibatch_key_includes_memory_budget(self, sprite_png):
+        from model.extract_cache import ExtractionCache
+        cache = ExtractionCache()
+        for budget in (64 << 20, 1 << 10, 64 << 20):
+            PaletteExtractor(max_memory_bytes=budget, cache=cache).extract(
+                sprite_png, n_colors=6, kmeans_mode="minibatch",
+            )
+        assert (cache.hits, cache.misses) == (1, 2)
+
+
+# ---------- Palette manager ----------
+
+class TestPaletteManager:
+    @pytest.fixture
+    def library(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.delenv("PORYPAL_BUNDLE_DIR", raising=False)
+        for rel, color in [("defaults/a.pal", Color(1, 1, 1)), ("user/b.pal", Color(2, 2, 2)),
+                           ("user/x/c.pal", Color(3, 3, 3)), ("z.pal", Color(4, 4, 4))]:
+            path = Path("palettes") / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            Palette(rel, [Color(0, 0, 0), color]).to_jasc_pal(path)
+        return Path("palettes")
+
+    @staticmethod
+    def _snapshot(manager):
+        return [(p.name, p.colors, manager.get_meta(p.name)) for p in manager.get_palettes()]
+
+    def test_sync_matches_full_reload(self, library):
+        from model.palette_manager import PaletteManager
+        manager = PaletteManager()
+        assert [p.name for p in manager.get_palettes()] == ["a.pal", "b.pal", "x/c.pal", "z.pal"]
+
+        Palette("new", [Color(0, 0, 0), Color(9, 9, 9)]).to_jasc_pal(library / "user" / "a_new.pal")
+        Palette("b", [Color(0, 0, 0), Color(8, 8, 8)]).to_jasc_pal(library / "user" / "b.pal")
+        (library / "user" / "x" / "c.pal").unlink()
+        Palette("shadowed", [Color(0, 0, 0)]).to_jasc_pal(library / "user" / "a.pal")   # default wins
+        with manager.batch():
+            for path in ["user/a_new.pal", "user/b.pal", "user/x/c.pal", "user/a.pal"]:
+                manager.sync_path(library / path)
+            assert "a_new.pal" not in [p.name for p in manager.get_palettes()]   # published at the end
+
+        assert self._snapshot(manager) == self._snapshot(PaletteManager())
+        assert manager.get_palette_by_name("b.pal").colors[1] == Color(8, 8, 8)
+        assert manager.get_palette_by_name("x/c.pal") is None
+
+        (library / "defaults" / "a.pal").unlink()          # the user file takes over the name
+        manager.sync("a.pal")
+        assert manager.get_meta("a.pal")["source"] == "user"
+        assert self._snapshot(manager) == self._snapshot(PaletteManager())
+
+    def test_sync_path_ignores_files_outside_the_library(self, library, tmp_path):
+        from model.palette_manager import PaletteManager
+        manager = PaletteManager()
+        outside = tmp_path / "elsewhere" / "d.pal"
+        outside.parent.mkdir()
+        Palette("d", [Color(0, 0, 0)]).to_jasc_pal(outside)
+        assert manager.sync_path(outside) is None
+        assert len(manager.get_palettes()) == 4
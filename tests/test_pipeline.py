@@ -2,9 +2,9 @@ import asyncio
 import io
 import json
 import shutil
-import zipfile
 from pathlib import Path
 
+import pytest
 from PIL import Image
 
 from model.image_manager import detect_background_color
@@ -12,6 +12,17 @@ from model.palette import Color, Palette
 from server.api import pipeline
 
 
+@pytest.fixture(autouse=True)
+def job_store(tmp_path, monkeypatch):
+    """Every test gets its own job database instead of ./pipeline_jobs.db."""
+    from server.job_store import JobStore
+
+    store = JobStore(tmp_path / "jobs.db")
+    monkeypatch.setattr(pipeline, "job_store", store)
+    yield store
+    store.close()
+
+
 def _sample_sprite(bg=(0x11, 0x22, 0x33), fg=(0xAA, 0xAA, 0xAA)):
     img = Image.new("RGBA", (3, 3), (*bg, 255))
     img.putpixel((1, 1), (*fg, 255))
@@ -24,13 +35,14 @@ def _png_bytes(img):
     return buf.getvalue()
 
 
-class _FakeUploadFile:
-    def __init__(self, filename, data):
-        self.filename = filename
-        self._data = data
-
-    async def read(self):
-        return self._data
+def _start_job(tasks, files, steps, **limits):
+    """Call /run directly (Form defaults only apply through FastAPI)."""
+    kwargs = {name: None for name in ("max_files", "max_pixels", "max_seconds", "max_work_mb")}
+    kwargs.update(limits)
+    return asyncio.run(pipeline.run_pipeline(
+        background_tasks=tasks, files=files, steps=json.dumps(steps),
+        filename_template="<name>", palette_template="<name>_<cs>", **kwargs,
+    ))
 
 
 def test_detect_background_color_prefers_alpha_pixel():
@@ -197,9 +209,42 @@ def test_background_step_can_run_after_convert(monkeypatch):
     assert removed.getpixel((1, 1)) == (0xAA, 0xAA, 0xAA, 255)
 
 
-def test_preview_pipeline_returns_background_preview():
+def test_tileset_step_in_memory_matches_png_round_trip(tmp_path):
+    import numpy as np
+    from model.tileset_manager import TilesetManager
+    from server.helpers import save_png
+
+    preset = {"tile_w": 8, "tile_h": 8, "cols": 3, "rows": 1, "slots": [2, None, 0]}
+    rng    = np.random.default_rng(5)
+    rgba   = Image.fromarray(rng.integers(0, 256, (8, 24, 4), dtype=np.uint8), "RGBA")
+    paletted = Image.fromarray(rng.integers(0, 12, (8, 24), dtype=np.uint8), "P")
+    paletted.putpalette(list(rng.integers(0, 256, 48, dtype=np.uint8)))
+    paletted.info["transparency"] = 0
+
+    for img in (rgba, paletted):
+        via_disk = tmp_path / "tileset.png"
+        via_disk.write_bytes(save_png(img))
+        mgr = TilesetManager({
+            "tileset": {
+                "input_sprite_size": {"width": 8, "height": 8},
+                "output_sprite_size": {"width": 8, "height": 8},
+                "sprite_order": preset["slots"],
+            },
+            "output": {"output_width": 24, "output_height": 8},
+        })
+        assert mgr.load(via_disk)
+        expected = mgr.get_processed()
+
+        got = pipeline._run_tileset_step(img, {}, preset)
+        assert got.mode == expected.mode
+        assert got.tobytes() == expected.tobytes()
+        if got.mode == "P":
+            assert got.getpalette()[:36] == expected.getpalette()[:36]
+
+
+def test_preview_pipeline_returns_background_preview(upload):
     response = asyncio.run(pipeline.preview_pipeline(
-        file=_FakeUploadFile("sprite.png", _png_bytes(_sample_sprite())),
+        file=upload("sprite.png", _png_bytes(_sample_sprite())),
         steps=json.dumps([{"type": "background", "action": "remove"}]),
     ))
 
@@ -209,7 +254,7 @@ def test_preview_pipeline_returns_background_preview():
     assert response["previews"][1]["image"]
 
 
-def test_execute_job_forces_png_output_when_background_step():
+def test_execute_job_forces_png_output_when_background_step(read_zip):
     job_id = "job-background-output"
     pipeline._jobs[job_id] = {
         "status": "running",
@@ -217,7 +262,7 @@ def test_execute_job_forces_png_output_when_background_step():
         "done": 0,
         "current_file": "",
         "results": [],
-        "zip_path": None,
+        "entries": [],
         "work_dir": None,
     }
 
@@ -228,12 +273,11 @@ def test_execute_job_forces_png_output_when_background_step():
             [{"type": "background", "action": "remove"}],
         )
 
-        job = pipeline._jobs[job_id]
-        zip_path = Path(job["zip_path"])
-        with zipfile.ZipFile(zip_path, "r") as zf:
+        with read_zip(pipeline.download_results(job_id)) as zf:
             assert "sprites/sprite.png" in zf.namelist()
             manifest = json.loads(zf.read("manifest.json"))
             assert manifest["steps"][0]["type"] == "background"
+            assert manifest["complete"] is True
 
             out = Image.open(io.BytesIO(zf.read("sprites/sprite.png"))).convert("RGBA")
             assert out.getpixel((0, 0))[3] == 0
@@ -242,3 +286,616 @@ def test_execute_job_forces_png_output_when_background_step():
         if work_dir:
             shutil.rmtree(work_dir, ignore_errors=True)
         pipeline._jobs.pop(job_id, None)
+
+
+def _hang_in_worker(index, filename, raw_bytes):
+    import time
+    time.sleep(60)
+
+
+def test_cancel_ends_a_pool_job_whose_worker_hangs(monkeypatch):
+    import threading
+    import time
+
+    monkeypatch.setattr(pipeline, "_process_in_worker", _hang_in_worker)
+    monkeypatch.setattr(pipeline, "POOL_POLL_S", 0.05)
+    monkeypatch.setattr(pipeline, "CANCEL_GRACE_S", 0.2)
+    ctx = pipeline._JobContext("job-hang", pipeline.compile_plan([{"type": "background", "action": "remove"}]), pipeline._MP_CONTEXT.Event())
+    files = [(f"s{i}.png", _png_bytes(_sample_sprite())) for i in range(3)]
+
+    threading.Timer(1.0, ctx.cancel_event.set).start()
+    started = time.monotonic()
+    assert list(pipeline._iter_outcomes(ctx, files, 2, lambda name: None)) == []
+    assert time.monotonic() - started < 30
+    assert pipeline._pool_slots.acquire(blocking=False)   # the slot was given back
+    pipeline._pool_slots.release()
+
+
+def test_pool_jobs_wait_for_a_slot_and_honour_cancel(monkeypatch):
+    monkeypatch.setattr(pipeline, "POOL_POLL_S", 0.05)
+    ctx = pipeline._JobContext("job-queued", pipeline.compile_plan([{"type": "background", "action": "remove"}]), pipeline._MP_CONTEXT.Event())
+    ctx.cancel_event.set()
+    assert pipeline._pool_slots.acquire(blocking=False)
+    try:
+        waiting = []
+        outcomes = pipeline._iter_outcomes(ctx, [("s.png", b"")], 2, waiting.append)
+        assert list(outcomes) == [] and waiting == [""]
+    finally:
+        pipeline._pool_slots.release()
+
+
+def test_execute_job_pool_keeps_input_order_and_dedup(monkeypatch, read_zip):
+    palette = Palette("winner.pal", [
+        Color(0x11, 0x22, 0x33),
+        Color(0xAA, 0xAA, 0xAA),
+    ])
+    monkeypatch.setattr(
+        pipeline.state.palette_manager,
+        "get_palette_by_name",
+        lambda name: palette if name == "winner.pal" else None,
+    )
+
+    job_id = "job-pool-order"
+    pipeline._jobs[job_id] = {
+        "status": "running",
+        "total": 4,
+        "done": 0,
+        "current_file": "",
+        "results": [],
+        "entries": [],
+        "work_dir": None,
+    }
+    files = [
+        ("a/sprite.png", _png_bytes(_sample_sprite())),
+        ("broken.png", b"not an image"),
+        ("b/sprite.png", _png_bytes(_sample_sprite(fg=(0xAB, 0xAB, 0xAB)))),
+        ("other.png", _png_bytes(_sample_sprite())),
+    ]
+    steps = [{
+        "type": "convert",
+        "palette_source": "loaded",
+        "selected_palettes": ["winner.pal"],
+        "conflict_mode": "auto_first",
+    }]
+
+    try:
+        pipeline._execute_job(job_id, files, steps, workers=2)
+
+        job = pipeline._jobs[job_id]
+        assert [r["file"] for r in job["results"]] == [name for name, _ in files]
+        assert [r["status"] for r in job["results"]] == ["ok", "error", "ok", "ok"]
+        assert job["done"] == 4
+        with read_zip(pipeline.download_results(job_id)) as zf:
+            names = zf.namelist()
+            assert {"sprites/sprite.png", "sprites/sprite_1.png", "sprites/other.png"} <= set(names)
+            first = Image.open(io.BytesIO(zf.read("sprites/sprite.png"))).convert("RGBA")
+            assert first.getpixel((1, 1)) == (0xAA, 0xAA, 0xAA, 255)
+    finally:
+        work_dir = pipeline._jobs.get(job_id, {}).get("work_dir")
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        pipeline._jobs.pop(job_id, None)
+
+
+def test_execute_job_computes_pixel_identical_inputs_once(monkeypatch, read_zip):
+    calls = []
+    process_file = pipeline._process_file
+
+    def counting(ctx, filename, raw_bytes):
+        calls.append(filename)
+        return process_file(ctx, filename, raw_bytes)
+
+    monkeypatch.setattr(pipeline, "_process_file", counting)
+    recompressed = io.BytesIO()
+    _sample_sprite().save(recompressed, format="PNG", compress_level=0)
+    files = [
+        ("a.png", _png_bytes(_sample_sprite())),
+        ("b.png", _png_bytes(_sample_sprite(fg=(0xAB, 0xAB, 0xAB)))),
+        ("a_copy.png", _png_bytes(_sample_sprite())),     # byte-identical
+        ("a_form.png", recompressed.getvalue()),          # same pixels, other bytes
+    ]
+    steps = [{"type": "extract", "n_colors": 2, "bg_mode": "default"},
+             {"type": "background", "action": "remove"}]
+    job_id = "job-dedup"
+    pipeline._jobs[job_id] = {"status": "running", "total": 4, "done": 0, "current_file": "",
+                              "results": [], "entries": [], "work_dir": None}
+    try:
+        pipeline._execute_job(job_id, files, steps, workers=1)
+
+        assert calls == ["a.png", "b.png"]
+        results = pipeline._jobs[job_id]["results"]
+        assert [r.get("deduplicated_from") for r in results] == [None, None, "a.png", "a.png"]
+        with read_zip(pipeline.download_results(job_id)) as zf:
+            names = set(zf.namelist())
+            assert {f"sprites/{s}.png" for s in ("a", "b", "a_copy", "a_form")} <= names
+            assert {f"palettes/{s}_oklab.pal" for s in ("a", "b", "a_copy", "a_form")} <= names
+            assert zf.read("sprites/a_form.png") == zf.read("sprites/a.png")
+            summary = json.loads(zf.read("manifest.json"))["summary"]
+        assert summary["deduplicated"] == 2 and summary["ok"] == 4
+        assert summary["compute_saved_ms"] == round(2 * results[0]["elapsed_ms"], 1)
+        assert pipeline.get_status(job_id)["deduplicated"] == 2
+    finally:
+        pipeline.cleanup_job(job_id)
+
+
+def test_dedupe_decodes_only_files_that_could_share_pixels(monkeypatch):
+    decoded = []
+    pixel_digest = pipeline.pixel_digest
+
+    def counting(img):
+        decoded.append(img.size)
+        return pixel_digest(img)
+
+    monkeypatch.setattr(pipeline, "pixel_digest", counting)
+    recompressed = io.BytesIO()
+    _sample_sprite().save(recompressed, format="PNG", compress_level=0)
+    files = [
+        ("a.png", _png_bytes(_sample_sprite())),
+        ("wide.png", _png_bytes(Image.new("RGBA", (5, 3), (1, 2, 3, 255)))),
+        ("a_copy.png", _png_bytes(_sample_sprite())),
+        ("a_form.png", recompressed.getvalue()),
+        ("broken.png", b"not an image"),
+        ("broken_copy.png", b"not an image"),
+    ]
+
+    assert pipeline._dedupe_inputs(files, threads=2) == [0, 1, 0, 0, 4, 5]
+    assert decoded == [(3, 3), (3, 3)]       # a and a_form; wide has a size of its own
+
+
+def _project_runner(tmp_path, monkeypatch, sprites):
+    """
+    A loaded project folder "emerald/pokemon" holding sprites {relative path: image}
+    and a run(steps, force=False) -> (response, files computed) helper for it.
+    """
+    from fastapi import BackgroundTasks
+    from server.api import library
+    from server.build_cache import BuildCache
+
+    folder = tmp_path / "graphics" / "pokemon"
+    for rel, img in sprites.items():
+        (folder / rel).parent.mkdir(parents=True, exist_ok=True)
+        img.save(folder / rel)
+    projects = tmp_path / "projects.json"
+    projects.write_text(json.dumps([{"name": "emerald", "root": str(tmp_path), "folders": [
+        {"id": "emerald/pokemon", "name": "pokemon", "abs_path": str(folder), "smart_type": "pokemon"},
+    ]}]))
+    monkeypatch.setattr(library, "PROJECTS_FILE", projects)
+    monkeypatch.setattr(pipeline, "build_cache", BuildCache(tmp_path / "build_cache"))
+
+    computed = []
+    process_file = pipeline._process_file
+
+    def counting(ctx, filename, raw_bytes):
+        computed.append(filename)
+        return process_file(ctx, filename, raw_bytes)
+
+    monkeypatch.setattr(pipeline, "_process_file", counting)
+
+    def run(steps, force=False):
+        tasks = BackgroundTasks()
+        started = asyncio.run(pipeline.run_project_pipeline(
+            background_tasks=tasks, path="emerald/pokemon", steps=json.dumps(steps),
+            filename_template="<name>", palette_template="<name>_<cs>", force=force,
+        ))
+        for task in tasks.tasks:
+            task.func(*task.args, **task.kwargs)
+        computed_now = list(computed)
+        computed.clear()
+        return started, computed_now
+
+    return folder, run
+
+
+def _cleanup_project_jobs():
+    for job_id, job in list(pipeline._jobs.items()):
+        if job.get("project_path"):
+            pipeline.cleanup_job(job_id)
+
+
+def test_project_run_only_rebuilds_changed_files(tmp_path, monkeypatch, read_zip):
+    folder, run = _project_runner(tmp_path, monkeypatch, {
+        "a/front.png": _sample_sprite(fg=(0xAA, 0xAA, 0xAA)),
+        "b/front.png": _sample_sprite(fg=(0xBB, 0xBB, 0xBB)),
+    })
+
+    remove = [{"type": "background", "action": "remove"}]
+    try:
+        started, ran = run(remove)
+        assert (started["to_build"], started["skipped"], ran) == (2, [], ["a/front.png", "b/front.png"])
+        with read_zip(pipeline.download_results(started["job_id"])) as zf:
+            assert {"sprites/a/front.png", "sprites/b/front.png"} <= set(zf.namelist())
+            first_a = zf.read("sprites/a/front.png")
+
+        _sample_sprite(fg=(0xB0, 0xB0, 0xB0)).save(folder / "b" / "front.png")
+        started, ran = run(remove)
+        assert started["skipped"] == ["a/front.png"] and ran == ["b/front.png"]
+        results = pipeline.get_status(started["job_id"])["results"]
+        assert [r.get("cached", False) for r in results] == [True, False]
+        with read_zip(pipeline.download_results(started["job_id"])) as zf:
+            assert zf.read("sprites/a/front.png") == first_a
+            assert json.loads(zf.read("manifest.json"))["summary"]["skipped"] == 1
+
+        set_bg = [{"type": "background", "action": "set", "target_mode": "default"}]
+        assert run(set_bg)[0]["to_build"] == 2        # different steps → different fingerprints
+        started, ran = run(remove, force=True)
+        assert started["skipped"] == [] and len(ran) == 2
+    finally:
+        _cleanup_project_jobs()
+
+
+def test_project_counts_a_duplicate_of_a_cached_file_once(tmp_path, monkeypatch, read_zip):
+    sprite = _sample_sprite(fg=(0xAA, 0xAA, 0xAA))
+    _folder, run = _project_runner(tmp_path, monkeypatch, {"a/front.png": sprite, "b/front.png": sprite})
+    remove = [{"type": "background", "action": "remove"}]
+    try:
+        run(remove)
+        started, ran = run(remove)
+        assert ran == []
+        results = pipeline.get_status(started["job_id"])["results"]
+        assert [(r.get("cached", False), r.get("deduplicated_from")) for r in results] == [
+            (True, None), (False, "a/front.png"),
+        ]
+        assert results[1]["saved_ms"] == results[0]["saved_ms"]
+        with read_zip(pipeline.download_results(started["job_id"])) as zf:
+            summary = json.loads(zf.read("manifest.json"))["summary"]
+        assert (summary["total"], summary["skipped"], summary["deduplicated"]) == (2, 1, 1)
+    finally:
+        _cleanup_project_jobs()
+
+
+def test_download_streams_partial_archive_while_running(tmp_path, read_zip):
+    job_id = "job-partial-download"
+    sprite = tmp_path / "done.png"
+    sprite.write_bytes(_png_bytes(_sample_sprite()))
+    pipeline._jobs[job_id] = {
+        "status": "running",
+        "total": 2,
+        "done": 1,
+        "current_file": "later.png",
+        "results": [{"file": "done.png", "status": "ok", "notes": ""}],
+        "entries": [("sprites/done.png", str(sprite))],
+        "work_dir": None,
+    }
+
+    try:
+        with read_zip(pipeline.download_results(job_id)) as zf:
+            assert zf.namelist() == ["sprites/done.png", "manifest.json"]
+            assert zf.read("sprites/done.png") == sprite.read_bytes()
+            manifest = json.loads(zf.read("manifest.json"))
+            assert manifest["complete"] is False
+            assert manifest["summary"]["total"] == 1
+    finally:
+        pipeline._jobs.pop(job_id, None)
+
+
+def test_job_store_round_trip_and_expiry(tmp_path):
+    from server.job_store import JobStore
+
+    store = JobStore(tmp_path / "jobs.db")
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    store.create_job("job-a", ["a.png", "b.png"], [{"type": "background"}], "<name>", "<name>_<cs>", str(work_dir))
+    store.record_file("job-a", 0, {"file": "a.png", "status": "ok", "notes": ""}, [["sprites/a.png", "x"]])
+
+    job = store.load_job("job-a")
+    assert job["status"] == "running"
+    assert job["done"] == 1 and job["next_index"] == 1
+    assert job["entries"] == [("sprites/a.png", "x")]
+    assert job["filenames"] == ["a.png", "b.png"]
+
+    assert store.mark_interrupted() == 1
+    assert store.load_job("job-a")["status"] == "interrupted"
+
+    assert store.expire(max_age_hours=0) == ["job-a"]
+    assert store.load_job("job-a") is None
+    assert not work_dir.exists()
+    store.close()
+
+
+def test_job_store_adds_the_limits_column_to_older_databases(tmp_path):
+    import sqlite3
+    from server.job_store import JobStore
+
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as db:
+        db.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL, total INTEGER NOT NULL, steps TEXT NOT NULL,"
+            " filename_template TEXT NOT NULL, palette_template TEXT NOT NULL, work_dir TEXT, extra_entries TEXT)"
+        )
+        db.execute("INSERT INTO jobs VALUES ('old', 'done', 0, 0, 0, '[]', '<name>', '<name>', NULL, NULL)")
+    db.close()
+
+    store = JobStore(path)
+    assert store.load_job("old")["limits"] is None
+    store.create_job("new", ["a.png"], [], "<name>", "<name>", "", {"max_files": 1})
+    assert store.load_job("new")["limits"] == {"max_files": 1}
+    store.close()
+
+
+def test_interrupted_job_resumes_from_first_unprocessed_file(job_store, read_zip, upload):
+    from fastapi import BackgroundTasks
+
+    store = job_store
+    files = [
+        upload(f"sprite_{i}.png", _png_bytes(_sample_sprite(fg=(0xA0 + i, 0xA0, 0xA0))))
+        for i in range(3)
+    ]
+    steps = [{"type": "background", "action": "remove"}]
+
+    tasks = BackgroundTasks()
+    job_id = _start_job(tasks, files, steps)["job_id"]
+    try:
+        # Only the first file finishes before the "crash"
+        first = [(files[0].filename, files[0]._data)]
+        pipeline._execute_job(job_id, first, steps, workers=1)
+        store.set_status(job_id, "interrupted")
+        pipeline._jobs.pop(job_id)
+
+        assert pipeline.get_status(job_id)["status"] == "interrupted"
+        tasks = BackgroundTasks()
+        resumed = pipeline.resume_pipeline(job_id, tasks)
+        assert resumed["resumed_from"] == 1 and resumed["remaining"] == 2
+        for task in tasks.tasks:
+            task.func(*task.args, **task.kwargs)
+
+        status = pipeline.get_status(job_id)
+        assert status["status"] == "done"
+        assert [r["file"] for r in status["results"]] == [f.filename for f in files]
+        assert store.load_job(job_id)["done"] == 3
+        with read_zip(pipeline.download_results(job_id)) as zf:
+            assert sorted(n for n in zf.namelist() if n.startswith("sprites/")) == [
+                "sprites/sprite_0.png", "sprites/sprite_1.png", "sprites/sprite_2.png",
+            ]
+    finally:
+        pipeline.cleanup_job(job_id)
+
+
+def test_pipeline_limits_can_only_be_tightened():
+    server = pipeline.PipelineLimits(max_files=10, max_pixels=0, max_seconds=60.0, max_work_bytes=0)
+    limits = server.tightened(max_files=50, max_pixels=1000, max_seconds=5, max_work_bytes=None)
+    assert limits.max_files == 10        # cannot raise
+    assert limits.max_pixels == 1000     # unlimited server value can be limited
+    assert limits.max_seconds == 5.0
+    assert limits.max_work_bytes == 0
+
+
+def test_run_rejects_jobs_over_the_limits(monkeypatch, upload):
+    from fastapi import BackgroundTasks, HTTPException
+
+    monkeypatch.setenv("PORYPAL_PIPELINE_MAX_FILES", "2")
+    files = [upload(f"s{i}.png", _png_bytes(_sample_sprite())) for i in range(3)]
+    steps = [{"type": "background", "action": "remove"}]
+
+    with pytest.raises(HTTPException) as too_many:
+        _start_job(BackgroundTasks(), files, steps)
+    assert too_many.value.status_code == 400
+
+    with pytest.raises(HTTPException) as too_big:   # 2 × 3×3 sprites = 18 px
+        _start_job(BackgroundTasks(), files[:2], steps, max_pixels=17)
+    assert "pixels" in too_big.value.detail
+    assert not pipeline._jobs or all(j["status"] != "running" for j in pipeline._jobs.values())
+
+
+def test_run_rejects_invalid_steps_before_storing_anything(upload):
+    from fastapi import BackgroundTasks, HTTPException
+
+    files = [upload("s.png", _png_bytes(_sample_sprite()))]
+    bad_steps = [
+        [{"type": "convert", "palette_source": "loaded", "selected_palettes": ["x.pal"], "conflict_mode": "vote"}],
+        [{"type": "convert", "palette_source": "extracted"}],
+        [{"type": "extract", "n_colors": 99}],
+        [{"type": "extract", "bg_mode": "fixed", "bg_color": "green"}],
+        [{"type": "background", "action": "set", "target_mode": "custom", "target_color": "#12"}],
+        [{"type": "tileset", "preset_id": "no-such-preset"}],
+        [{"type": "sharpen"}],
+    ]
+    jobs_before = dict(pipeline._jobs)
+    for steps in bad_steps:
+        with pytest.raises(HTTPException) as bad:
+            _start_job(BackgroundTasks(), files, steps)
+        assert bad.value.status_code == 400, steps
+        assert bad.value.detail.startswith("step 1"), bad.value.detail
+    assert pipeline._jobs == jobs_before
+
+
+def test_extract_step_uses_the_shared_extraction_cache(monkeypatch):
+    from model.extract_cache import ExtractionCache
+    from model.palette_extractor import PaletteExtractor
+
+    cache = ExtractionCache()
+    monkeypatch.setattr(pipeline.state, "extractor", PaletteExtractor(cache=cache))
+    step = {"type": "extract", "bg_mode": "default", "n_colors": 4}
+    _img, first = pipeline._run_extract_step(_sample_sprite(), "a", step)
+    _img, again = pipeline._run_extract_step(_sample_sprite(), "b", step)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert again.colors == first.colors and again.name == "b"
+
+
+def test_plan_accepts_the_batch_tab_step_defaults():
+    plan = pipeline.compile_plan([
+        {"type": "extract", "n_colors": 15, "color_space": "oklab", "bg_mode": "fixed",
+         "bg_color": "#73c5a4", "save_palette": True},
+        {"type": "background", "action": "set", "target_mode": "default", "target_color": "#73C5A4"},
+        {"type": "convert", "palette_source": "extracted", "selected_palettes": [], "conflict_mode": "flag"},
+    ])
+    assert plan.steps[0].params["bg_color"] == "#73C5A4"
+    assert plan.force_png_output
+
+
+def test_plan_resolves_palettes_once_per_job(monkeypatch):
+    alpha = Palette("alpha.pal", [Color(0x11, 0x22, 0x33), Color(0xAA, 0xAA, 0xAA)])
+    beta  = Palette("beta.pal",  [Color(0x11, 0x22, 0x33), Color(0xA0, 0xA0, 0xA0)])
+    lookups = []
+
+    def get_palette_by_name(name):
+        lookups.append(name)
+        return {"alpha.pal": alpha, "beta.pal": beta}.get(name)
+
+    monkeypatch.setattr(pipeline.state.palette_manager, "get_palette_by_name", get_palette_by_name)
+    step = {"type": "convert", "palette_source": "loaded",
+            "selected_palettes": ["beta.pal", "alpha.pal", "gone.pal"], "conflict_mode": "auto_first"}
+    plan = pipeline.compile_plan([step])
+    assert [p.name for p in plan.steps[0].palettes] == ["beta.pal", "alpha.pal"]
+    assert len(plan.steps[0].palettes_lab) == 2      # stacked once, reused for every file
+
+    ctx = pipeline._JobContext(job_id="plan", plan=plan)
+    outcomes = [
+        pipeline._process_file(ctx, f"s{i}.png", _png_bytes(_sample_sprite(fg=(0xA0 + i, 0xA0, 0xA0))))
+        for i in range(3)
+    ]
+    assert len(lookups) == 3                      # one per selected name, not per file
+    for i, outcome in enumerate(outcomes):
+        expected, _notes, name = pipeline._run_convert_step(
+            _sample_sprite(fg=(0xA0 + i, 0xA0, 0xA0)), step, extracted_palette=None,
+        )
+        assert outcome.result["palette"] == name
+        assert Image.open(io.BytesIO(outcome.out_bytes)).tobytes() == expected.tobytes()
+
+
+def test_cancel_stops_job_between_files(job_store, monkeypatch, upload):
+    from fastapi import BackgroundTasks
+
+    store = job_store
+    files = [upload(f"s{i}.png", _png_bytes(_sample_sprite())) for i in range(4)]
+    steps = [{"type": "background", "action": "remove"}]
+
+    tasks = BackgroundTasks()
+    job_id = _start_job(tasks, files, steps, max_seconds=30)["job_id"]
+    commit = pipeline._commit_outcome
+
+    def commit_then_cancel(*args):
+        written = commit(*args)
+        pipeline.cancel_job(job_id)
+        return written
+
+    monkeypatch.setattr(pipeline, "_commit_outcome", commit_then_cancel)
+    try:
+        for task in tasks.tasks:
+            task.func(*task.args, **task.kwargs)
+        status = pipeline.get_status(job_id)
+        assert status["status"] == "cancelled"
+        assert status["reason"] == "cancelled by request"
+        assert [r["file"] for r in status["results"]] == ["s0.png"]
+        assert store.load_job(job_id)["status"] == "cancelled"
+
+        tasks = BackgroundTasks()
+        resumed = pipeline.resume_pipeline(job_id, tasks)
+        assert resumed["resumed_from"] == 1 and resumed["remaining"] == 3
+        limits = tasks.tasks[0].args[7]
+        assert limits.max_seconds == 30.0     # the limit /run tightened, not the server default
+        assert limits.max_files == pipeline.PipelineLimits.from_env().max_files
+    finally:
+        pipeline._jobs[job_id]["status"] = "cancelled"
+        pipeline.cleanup_job(job_id)
+
+
+def test_delete_while_running_leaves_cleanup_to_the_job(monkeypatch, upload):
+    from fastapi import BackgroundTasks
+
+    files = [upload(f"s{i}.png", _png_bytes(_sample_sprite())) for i in range(2)]
+    tasks = BackgroundTasks()
+    job_id = _start_job(tasks, files, [{"type": "background", "action": "remove"}])["job_id"]
+    work_dir = Path(pipeline._jobs[job_id]["work_dir"])
+    commit = pipeline._commit_outcome
+
+    def commit_then_delete(*args):
+        written = commit(*args)
+        if job_id in pipeline._jobs:
+            pipeline.cleanup_job(job_id)
+            assert work_dir.exists()   # still owned by the running job
+        return written
+
+    monkeypatch.setattr(pipeline, "_commit_outcome", commit_then_delete)
+    for task in tasks.tasks:
+        task.func(*task.args, **task.kwargs)
+    assert not work_dir.exists()
+    assert job_id not in pipeline._jobs
+
+
+class _FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+    async def is_disconnected(self):
+        return False
+
+
+def _finished_job(job_id, n):
+    pipeline._jobs[job_id] = {
+        "status": "done",
+        "total": n,
+        "done": n,
+        "current_file": "",
+        "results": [
+            {"file": f"s{i}.png", "status": "ok", "notes": "", "elapsed_ms": 1.0} for i in range(n)
+        ],
+        "entries": [],
+        "work_dir": None,
+    }
+
+
+def test_status_since_returns_only_new_results():
+    _finished_job("job-since", 5)
+    try:
+        status = pipeline.get_status("job-since", since=3)
+        assert [r["file"] for r in status["results"]] == ["s3.png", "s4.png"]
+        assert status["next"] == 5
+        assert len(pipeline.get_status("job-since")["results"]) == 5
+    finally:
+        pipeline._jobs.pop("job-since", None)
+
+
+def test_progress_wait_is_woken_by_the_job_thread_without_a_thread_of_its_own():
+    import threading
+    import time
+
+    pipeline._jobs["job-wait"] = {
+        "status": "running", "total": 2, "done": 0, "current_file": "", "results": [], "entries": [],
+    }
+
+    def finish_one():
+        with pipeline._jobs_lock:
+            pipeline._jobs["job-wait"]["results"].append({"file": "s0.png", "status": "ok", "notes": ""})
+            pipeline._jobs["job-wait"]["done"] = 1
+            pipeline._notify_progress("job-wait")
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    class _NoThreads(ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            raise AssertionError("progress wait handed work to a thread")
+
+    async def wait():
+        asyncio.get_running_loop().set_default_executor(_NoThreads())
+        waiting = asyncio.ensure_future(pipeline._wait_for_progress("job-wait", 0, timeout=30))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        threading.Timer(0.05, finish_one).start()
+        started = time.monotonic()
+        results, info = await waiting
+        return results, info, time.monotonic() - started
+
+    try:
+        results, info, waited = asyncio.run(wait())
+        assert [r["file"] for r in results] == ["s0.png"] and info["done"] == 1
+        assert waited < 5
+        assert "job-wait" not in pipeline._progress_waiters
+    finally:
+        pipeline._jobs.pop("job-wait", None)
+
+
+def test_events_stream_file_events_then_end(drain):
+    _finished_job("job-events", 3)
+    try:
+        response = asyncio.run(pipeline.job_events(
+            "job-events", _FakeRequest({"last-event-id": "1"}), since=0,
+        ))
+
+        events = [block for block in drain(response).split("\n\n") if block]
+        assert [e.splitlines()[0] for e in events] == ["id: 2", "id: 3", "event: end"]
+        first = json.loads(events[0].splitlines()[2][len("data: "):])
+        assert first["file"] == "s1.png" and first["done"] == 2 and first["elapsed_ms"] == 1.0
+        assert json.loads(events[-1].splitlines()[1][len("data: "):])["status"] == "done"
+    finally:
+        pipeline._jobs.pop("job-events", None)
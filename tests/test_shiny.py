@@ -0,0 +1,108 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from model.palette import Color
+from server.api.shiny import _remap_sprite
+
+
+HELP_SPRITES = sorted((Path(__file__).parent.parent / "frontend/public/img/help").rglob("*.png"))
+
+
+def _legacy_remap_indices(sprite_px, normal_colors, shiny_colors):
+    """The original per-pixel loop, kept as the reference for the vectorized remap."""
+    h, w = sprite_px.shape[:2]
+    flat_rgb   = sprite_px[:, :, :3].reshape(-1, 3)
+    flat_alpha = sprite_px[:, :, 3].flatten()
+    normal_rgb = np.array([c.to_tuple() for c in normal_colors], dtype=np.uint8)
+    index_flat = np.zeros(h * w, dtype=np.uint8)
+    for i in range(h * w):
+        if flat_alpha[i] < 128:
+            continue
+        px = flat_rgb[i]
+        if np.all(px == normal_rgb[0]):
+            continue
+        dists = ((normal_rgb[1:].astype(np.int32) - px.astype(np.int32)) ** 2).sum(axis=1)
+        idx   = int(dists.argmin()) + 1
+        index_flat[i] = idx if idx < len(shiny_colors) else 0
+    return index_flat.reshape(h, w)
+
+
+def _random_palette(rng, n):
+    return [Color(*map(int, rgb)) for rgb in rng.integers(0, 256, (n, 3))]
+
+
+def _random_sprite(rng, normal_colors, size=(40, 32)):
+    """Palette colors plus noise, a transparent border and some pixels in the bg color."""
+    h, w  = size
+    base  = np.array([c.to_tuple() for c in normal_colors], dtype=np.int32)
+    rgb   = base[rng.integers(0, len(base), (h, w))] + rng.integers(-12, 13, (h, w, 3))
+    rgba  = np.dstack([np.clip(rgb, 0, 255), np.full((h, w), 255)]).astype(np.uint8)
+    rgba[:3, :, 3] = rng.integers(0, 256, (3, w))
+    rgba[-2:, -5:, :3] = base[0]
+    return rgba
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_remap_sprite_matches_legacy_loop(seed):
+    rng    = np.random.default_rng(seed)
+    normal = _random_palette(rng, 16)
+    shiny  = _random_palette(rng, 16 if seed % 2 else 9)   # short shiny palette → slot 0 fallback
+    sprite = _random_sprite(rng, normal)
+
+    out = _remap_sprite(sprite, normal, shiny)
+
+    assert out.mode == "P" and out.info["transparency"] == 0
+    assert np.array_equal(np.array(out), _legacy_remap_indices(sprite, normal, shiny))
+    assert out.getpalette()[:3 * len(shiny)] == [v for c in shiny for v in c.to_tuple()]
+
+
+@pytest.mark.parametrize("path", HELP_SPRITES, ids=lambda p: p.name)
+def test_remap_sprite_matches_legacy_loop_on_sample_sprites(path):
+    img = Image.open(path).convert("RGBA")
+    img.thumbnail((96, 96))   # keep the reference loop quick
+    sprite = np.array(img)
+    quantized = img.convert("RGB").quantize(16).convert("RGB")
+    normal = [Color(*rgb) for _, rgb in quantized.getcolors()]
+
+    out = _remap_sprite(sprite, normal, normal)
+
+    assert np.array_equal(np.array(out), _legacy_remap_indices(sprite, normal, normal))
+
+
+def test_matched_download_rejects_settings_the_artifact_was_not_built_with(upload, read_zip):
+    import asyncio
+    import io
+
+    from fastapi import HTTPException
+    from server.api import shiny
+
+    rng    = np.random.default_rng(5)
+    normal = _random_sprite(rng, [Color(0x73, 0xC5, 0xA4)] + _random_palette(rng, 6))
+    shiny_px = normal.copy()
+    shiny_px[..., :3] = 255 - shiny_px[..., :3]
+
+    def png(px):
+        buf = io.BytesIO()
+        Image.fromarray(px, "RGBA").save(buf, format="PNG")
+        return buf.getvalue()
+
+    preview = asyncio.run(shiny.extract_matched_palettes(
+        normal_file=upload("mon.png", png(normal)),
+        shiny_file=upload("mon_s.png", png(shiny_px)),
+        n_colors=8, bg_color="#73c5a4",
+    ))
+
+    def download(**sent):
+        return read_zip(asyncio.run(shiny.download_matched_palettes(
+            normal_file=None, shiny_file=None, artifact_id=preview["artifact_id"],
+            **{**dict(n_colors=None, bg_color=None), **sent},
+        )))
+
+    assert "manifest.json" in download(n_colors=8, bg_color="73C5A4").namelist()
+    for sent in ({"n_colors": 15}, {"bg_color": "#000000"}):
+        with pytest.raises(HTTPException) as mismatch:
+            download(**sent)
+        assert mismatch.value.status_code == 409